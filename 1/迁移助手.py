@@ -6,36 +6,28 @@ sudo apt install python3 python3-tk
 """
 
 import os
-import shutil
-import hashlib
+import sys
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
 
-# 定义支持的文件类型
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
-VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv'}
-OFFICE_EXTENSIONS = {'.docx', '.xlsx', '.pptx'}
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 引入仓库根目录下的 organizer_core
+from organizer_core.categories import classify_many, get_extension_map
+from organizer_core.fastcopy import copy_file
+from organizer_core.hashing import cached_hash_file
+from organizer_core.dest_index import DestinationIndex
+from organizer_core.journal import MigrationJournal
+from organizer_core.logsink import attach_tk
+from organizer_core.space import SpaceManager
 
-# 文件夹映射，用于分类存储
-FOLDER_MAP = {
-    'images': IMAGE_EXTENSIONS,
-    'videos': VIDEO_EXTENSIONS,
-    'office': OFFICE_EXTENSIONS
-}
+# 文件后缀 -> 分类存储的子文件夹，见 organizer_core/categories.json 的 migration 方案
+FOLDER_MAP = get_extension_map('migration')
 
 # ------------------------------------
 # 计算文件的哈希值
 def calculate_hash(file_path):
-    hash_algo = hashlib.blake2b()  # 使用 BLAKE2b 算法
-    with open(file_path, 'rb') as file:
-        while True:
-            chunk = file.read(8192)
-            if not chunk:
-                break
-            hash_algo.update(chunk)
-    return hash_algo.hexdigest()
+    return cached_hash_file(file_path)  # 算法见 organizer_core.hashing，未变化的文件直接取缓存
 
 # ------------------------------------
 # 查找目录中的重复文件
@@ -113,6 +105,7 @@ class FileManagementApp:
 
         self.status_text = tk.Text(self.migration_frame, width=90, height=10, font=("Arial", 10), state='disabled')
         self.status_text.pack(padx=10, pady=5)
+        self.status_log = attach_tk(self.status_text)  # 定时批量刷新，只保留最近的若干行
 
     # ------------------------------------
     # 初始化查找重复文件选项卡
@@ -132,6 +125,7 @@ class FileManagementApp:
 
         self.dup_status_text = tk.Text(self.duplicate_frame, width=90, height=10, font=("Arial", 10), state='disabled')
         self.dup_status_text.pack(padx=10, pady=5)
+        self.dup_status_log = attach_tk(self.dup_status_text)
 
     # ------------------------------------
     # 添加源目录
@@ -194,10 +188,7 @@ class FileManagementApp:
     # ------------------------------------
     # 更新状态文本
     def update_status(self, message):
-        self.status_text.config(state='normal')
-        self.status_text.insert(tk.END, message + "\n")
-        self.status_text.see(tk.END)
-        self.status_text.config(state='disabled')
+        self.status_log.write(message)  # 可在迁移线程中调用，界面线程定时批量刷新
 
     # ------------------------------------
     # 选择重复文件检查目录
@@ -279,40 +270,41 @@ class FileManagementApp:
     # ------------------------------------
     # 更新重复文件查找状态
     def update_dup_status(self, message):
-        self.dup_status_text.config(state='normal')
-        self.dup_status_text.insert(tk.END, message + "\n")
-        self.dup_status_text.see(tk.END)
-        self.dup_status_text.config(state='disabled')
+        self.dup_status_log.write(message)
 
     # ------------------------------------
     # 复制文件
     def copy_files(self, src_paths, dest_path, update_status):
         duplicates = []
-
-        existing_files_hash = {}
-        for root_dir, sub_dirs, files in os.walk(dest_path):
-            for file in files:
-                file_path = os.path.join(root_dir, file)
-                file_hash = calculate_hash(file_path)
-                existing_files_hash[file_hash] = file_path
-
-        for src_path in src_paths:
-            for root_dir, sub_dirs, files in os.walk(src_path):
-                for file in files:
-                    file_ext = os.path.splitext(file)[-1].lower()
-                    for folder, extensions in FOLDER_MAP.items():
-                        if file_ext in extensions:
+        # 迁移日志：中断后重新运行时跳过已完成的文件
+        # 目标目录的内容索引：只扫描元数据，哈希在源文件大小与已有文件相同时才计算
+        # 用 with 打开：索引扫描失败或迁移中出错时日志也会写回并关闭
+        with MigrationJournal(dest_path) as journal, DestinationIndex(dest_path) as dest_index:
+            if journal.resumed:
+                update_status(f"Resuming: {journal.resumed} files already migrated")
+
+            for src_path in src_paths:
+                for root_dir, sub_dirs, files in os.walk(src_path):
+                    for file in files:
+                        folder = FOLDER_MAP.get(os.path.splitext(file)[-1].lower())
+                        if folder:
+                            file_path = os.path.join(root_dir, file)
+                            st = os.stat(file_path)
+                            if journal.is_done(file_path, st.st_size, st.st_mtime_ns):
+                                continue
                             subfolder_path = os.path.join(dest_path, folder)
                             if not os.path.exists(subfolder_path):
                                 os.makedirs(subfolder_path)
-                            file_path = os.path.join(root_dir, file)
-                            file_hash = calculate_hash(file_path)
+                            duplicate, file_hash = dest_index.find_duplicate(file_path, st.st_size)
 
-                            if file_hash in existing_files_hash:
+                            if duplicate:
                                 duplicates.append(file_path)
+                                journal.record(file_path, file_hash, st=st)
                             else:
-                                shutil.copy2(file_path, subfolder_path)
+                                dest_file = copy_file(file_path, os.path.join(subfolder_path, file))
                                 update_status(f"Copied: {file_path}")
+                                dest_index.add(dest_file, file_hash)
+                                journal.record(file_path, file_hash, dest_file, st)
 
         update_status("File migration completed successfully!")
         if duplicates:
@@ -326,8 +318,8 @@ class FileManagementApp:
         total_size = 0
         for src_path in src_paths:
             for root_dir, sub_dirs, files in os.walk(src_path):
-                for file in files:
-                    if file.endswith(tuple(IMAGE_EXTENSIONS | VIDEO_EXTENSIONS | OFFICE_EXTENSIONS)):
+                for file, folder in zip(files, classify_many(files, 'migration')):
+                    if folder:
                         file_count += 1
                         file_path = os.path.join(root_dir, file)
                         total_size += os.path.getsize(file_path)
@@ -336,8 +328,7 @@ class FileManagementApp:
     # ------------------------------------
     # 检查可用空间
     def check_space_needed(self, total_size, dest_path):
-        stats = shutil.disk_usage(dest_path)
-        return total_size <= stats.free
+        return SpaceManager().fits(dest_path, total_size)
 
 # ------------------------------------
 # 程序入口
@@ -9,32 +9,31 @@ from PyQt5.QtWidgets import (QFileDialog, QMessageBox,
                              QApplication, QProgressBar)
 from PyQt5.QtCore import QThread, pyqtSignal
 import os
-import shutil
-import hashlib
+import sys
 import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 引入仓库根目录下的 organizer_core
+from organizer_core.categories import classify, get_extension_map
+from organizer_core.fastcopy import copy_file
+from organizer_core.hashing import cached_hash_file
+from organizer_core.dest_index import DestinationIndex
+from organizer_core.journal import MigrationJournal
+from organizer_core.linkdedup import link_duplicates as link_duplicate_groups
+from organizer_core.logsink import attach_qt
+from organizer_core.prune import prune_empty_dirs
+from organizer_core.space import SpaceManager
+from organizer_core.scanner import scan_tree
 
 # ------------------------------------
-# 文件类型后缀定义
-IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
-VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv'}
-OFFICE_EXTENSIONS = {'.docx', '.xlsx', '.pptx'}
-FOLDER_MAP = {
-    'images': IMAGE_EXTENSIONS,
-    'videos': VIDEO_EXTENSIONS,
-    'office': OFFICE_EXTENSIONS
-}
+# 文件后缀 -> 目标子文件夹，见 organizer_core/categories.json 的 migration 方案
+FOLDER_MAP = get_extension_map('migration')
+PROGRESS_INTERVAL = 0.1  # 进度条最多每 0.1 秒（10 Hz）刷新一次
 # ------------------------------------
 # 计算文件的哈希值
 def calculate_hash(file_path):
-    hash_algo = hashlib.blake2b()  # 使用 BLAKE2b 算法
     try:
-        with open(file_path, 'rb') as file:
-            while True:
-                chunk = file.read(8192)
-                if not chunk:
-                    break
-                hash_algo.update(chunk)
-        return hash_algo.hexdigest()
+        return cached_hash_file(file_path)  # 算法见 organizer_core.hashing，未变化的文件直接取缓存
     except Exception as e:
         # 若文件不可读，返回 None
         return None
@@ -58,32 +57,68 @@ def find_duplicates(directory):
     return files_hash, duplicate_files
 # ------------------------------------
 # 删除重复文件
-def delete_duplicates(duplicate_files_list, update_status):
+def delete_duplicates(duplicate_files_list, update_status):  # 返回已删除的文件路径，供 clear_empty_dirs 只检查这些目录
+    deleted = []
     for file_path, _ in duplicate_files_list:
         try:
             os.remove(file_path)
+            deleted.append(file_path)
             update_status(f"Deleted: {file_path}")
         except Exception as e:
             update_status(f"Error deleting {file_path}: {e}")
+    return deleted
+# ------------------------------------
+# 把重复文件替换为指向保留文件的硬链接：路径保持有效，空间同样释放；替换前逐字节比较，哈希碰撞也不会丢数据
+def link_duplicates(duplicate_files_list, files_hash, update_status):
+    groups = {}
+    for file_path, file_hash in duplicate_files_list:
+        groups.setdefault(file_hash, [files_hash[file_hash]]).append(file_path)
+    stats = link_duplicate_groups(
+        groups, verify=True,
+        on_linked=lambda path, canonical, reclaimed: update_status(f"Linked: {path} -> {canonical}"),
+        on_error=lambda path, e: update_status(f"Error linking {path}: {e}"))
+    update_status(f"Linked {stats.linked} duplicates, reclaimed {stats.reclaimed / (1024 * 1024):.2f} MB "
+                  f"({stats.mismatched} content mismatches skipped, {stats.failed} failed).")
+    return stats
 # ------------------------------------
 # 清除指定目录下的所有空白文件夹（递归）
-def clear_empty_dirs(directory, update_status):
-    removed = 0
-    # 递归遍历目录，从底层开始清理
-    for root, dirs, files in os.walk(directory, topdown=False):
-        # 如果目录下既没有文件，也没有非空的子目录，则移除该目录
-        if not dirs and not files:
-            try:
-                os.rmdir(root)
-                removed += 1
-                update_status(f"Removed empty folder: {root}")
-            except Exception as e:
-                update_status(f"Error removing folder {root}: {e}")
+# 一次遍历记下每个目录的子项数，自底向上删除，子目录删掉后变空的父目录也一并删除；
+# touched 为刚删除的文件路径时只检查这些文件所在的目录及其上级
+def clear_empty_dirs(directory, update_status, touched=None):
+    removed = prune_empty_dirs(directory, touched,
+                               on_removed=lambda path: update_status(f"Removed empty folder: {path}"),
+                               on_error=lambda path, e: update_status(f"Error removing folder {path}: {e}"))
     if removed == 0:
         update_status("No empty folders found to remove.")
     else:
         update_status(f"Total {removed} empty folders removed.")
 # ------------------------------------
+# 按已传输的字节数计算迁移进度，限制界面刷新频率
+class MigrationProgress:
+    def __init__(self, total_bytes, emit):
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.emit = emit  # 接收 0-100 的百分比，通常是一个 Qt 信号的 emit
+        self._last_emit = 0.0
+        self._last_percent = -1
+
+    def advance(self, nbytes):  # 复制循环中每写入一段数据调用一次
+        self.done_bytes += nbytes
+        now = time.monotonic()
+        if now - self._last_emit >= PROGRESS_INTERVAL:
+            self._last_emit = now
+            self._emit_percent()
+
+    def finish(self):
+        self.done_bytes = self.total_bytes
+        self._emit_percent()
+
+    def _emit_percent(self):
+        percent = min(100, int(self.done_bytes * 100 / self.total_bytes)) if self.total_bytes else 100
+        if percent != self._last_percent:  # 百分比不变时不发信号，避免无谓的重绘
+            self._last_percent = percent
+            self.emit(percent)
+# ------------------------------------
 # 用 QThread 处理重复文件查找任务
 class DuplicateFinderThread(QThread):
     duplicatesFound = pyqtSignal(dict, list)  # 发射哈希集合和重复文件列表
@@ -98,11 +133,14 @@ class DuplicateFinderThread(QThread):
 # ------------------------------------
 # 文件管理应用类
 class FileManagementApp(QtWidgets.QMainWindow):
+    migrationProgress = pyqtSignal(int)  # 迁移线程发出的进度百分比，在界面线程中更新进度条
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Enhanced File Management App")
         self.setGeometry(300, 100, 1000, 700)
         self.initUI()
+        self.migrationProgress.connect(self.progress_bar.setValue)
 
     # ------------------------------------
     # 初始化UI组件
@@ -194,6 +232,7 @@ class FileManagementApp(QtWidgets.QMainWindow):
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
         layout.addWidget(self.status_text)
+        self.status_log = attach_qt(self.status_text)  # 定时批量刷新，只保留最近的若干行
 
         self.progress_bar = QProgressBar()
         layout.addWidget(self.progress_bar)
@@ -228,6 +267,7 @@ class FileManagementApp(QtWidgets.QMainWindow):
         self.dup_status_text = QTextEdit()
         self.dup_status_text.setReadOnly(True)
         layout.addWidget(self.dup_status_text)
+        self.dup_status_log = attach_qt(self.dup_status_text)
 
         self.duplicate_tab.setLayout(layout)
 
@@ -255,7 +295,8 @@ class FileManagementApp(QtWidgets.QMainWindow):
             QMessageBox.warning(self, "Warning", "Please specify source and destination paths.")
             return
 
-        total_files, total_size = self.count_files_and_size(src_paths)
+        work_list = self.scan_sources(src_paths)  # 扫描结果同时作为迁移线程的任务列表，不再重复遍历
+        total_files, total_size = len(work_list), sum(entry.size for entry in work_list)
         path_info = "Source Paths:\n" + "\n".join(src_paths) + "\n\nDestination Path:\n" + dest_path
         path_confirmation = QMessageBox.question(self, "Confirm Paths", path_info + "\n\nProceed with these paths?")
         if path_confirmation == QMessageBox.No:
@@ -276,77 +317,71 @@ class FileManagementApp(QtWidgets.QMainWindow):
         self.progress_bar.setValue(0)
 
         # 使用线程处理文件迁移任务
-        thread = threading.Thread(target=self.start_migration, args=(src_paths, dest_path), daemon=True)
+        thread = threading.Thread(target=self.start_migration, args=(work_list, dest_path, total_size), daemon=True)
         thread.start()
 
     # ------------------------------------
     # 执行文件迁移
-    def start_migration(self, src_paths, dest_path):
+    def start_migration(self, work_list, dest_path, total_size):
         self.update_status("Starting file migration...")
-        total_files, total_size = self.count_files_and_size(src_paths)
-        processed_size = 0
-
-        existing_files_hash = self.prepare_existing_files_hash(dest_path)
-
-        for src_path in src_paths:
-            for root_dir, sub_dirs, files in os.walk(src_path):
-                for file in files:
-                    file_ext = os.path.splitext(file)[-1].lower()
-                    # 只对指定扩展名的文件进行处理
-                    if not any(file_ext in ext for ext in FOLDER_MAP.values()):
-                        continue
-
-                    self.migrate_file(file, root_dir, dest_path, existing_files_hash)
-                    file_path = os.path.join(root_dir, file)
-                    try:
-                        processed_size += os.path.getsize(file_path)
-                    except Exception:
-                        pass
-                    progress_percentage = int((processed_size / total_size) * 100)
-                    self.progress_bar.setValue(progress_percentage)
+        progress = MigrationProgress(total_size, self.migrationProgress.emit)
+
+        # 迁移日志：中断后重新运行时跳过已完成的文件
+        with MigrationJournal(dest_path) as journal, self.prepare_existing_files_hash(dest_path) as dest_index:
+            if journal.resumed:
+                self.update_status(f"Resuming: {journal.resumed} files already migrated")
+
+            for entry in work_list:
+                before = progress.done_bytes
+                if not journal.is_done(entry.path, entry.size, entry.mtime_ns):
+                    self.migrate_file(entry.name, os.path.dirname(entry.path), dest_path, dest_index, journal,
+                                      entry.size, progress.advance)
+                # 跳过、出错或复制期间大小有变化的文件，按扫描时的大小补齐进度
+                progress.advance(entry.size - (progress.done_bytes - before))
+        progress.finish()
         self.update_status("File migration completed successfully!")
 
     # ------------------------------------
-    # 准备目标目录中已存在文件的哈希
+    # 打开目标目录的内容索引：只扫描元数据，哈希在源文件大小与已有文件相同时才计算
     def prepare_existing_files_hash(self, dest_path):
-        existing_files_hash = {}
-        for root_dir, sub_dirs, files in os.walk(dest_path):
-            for file in files:
-                file_path = os.path.join(root_dir, file)
-                file_hash = calculate_hash(file_path)
-                if file_hash is None:
-                    continue
-                existing_files_hash[file_hash] = file_path
-        return existing_files_hash
+        dest_index = DestinationIndex(dest_path, on_error=lambda path, e: self.update_status(f"Failed to read: {path}"))
+        self.update_status(f"Destination index: {len(dest_index)} files "
+                           f"({dest_index.added} new, {dest_index.changed} changed, {dest_index.removed} removed)")
+        return dest_index
 
     # ------------------------------------
     # 迁移单个文件
-    def migrate_file(self, file, root_dir, dest_path, existing_files_hash):
+    def migrate_file(self, file, root_dir, dest_path, dest_index, journal=None, file_size=None, progress=None):
         file_path = os.path.join(root_dir, file)
-        file_hash = calculate_hash(file_path)
-        if file_hash is None:
+        try:
+            duplicate, file_hash = dest_index.find_duplicate(file_path, file_size)
+        except OSError:
             self.update_status(f"Failed to read: {file_path}")
             return
 
-        if file_hash in existing_files_hash:
+        if duplicate:
             self.update_status(f"Skipped (duplicate): {file_path}")
+            if journal is not None:
+                journal.record(file_path, file_hash)
         else:
-            file_ext = os.path.splitext(file)[-1].lower()
-            for folder, extensions in FOLDER_MAP.items():
-                if file_ext in extensions:
-                    subfolder_path = os.path.join(dest_path, folder)
-                    if not os.path.exists(subfolder_path):
-                        os.makedirs(subfolder_path)
-                    try:
-                        shutil.copy2(file_path, subfolder_path)
-                        self.update_status(f"Copied: {file_path}")
-                    except Exception as e:
-                        self.update_status(f"Error copying {file_path}: {e}")
+            folder = FOLDER_MAP.get(os.path.splitext(file)[-1].lower())
+            if folder:
+                subfolder_path = os.path.join(dest_path, folder)
+                if not os.path.exists(subfolder_path):
+                    os.makedirs(subfolder_path)
+                try:
+                    dest_file = copy_file(file_path, os.path.join(subfolder_path, file), progress)
+                    self.update_status(f"Copied: {file_path}")
+                    dest_index.add(dest_file, file_hash)
+                    if journal is not None:
+                        journal.record(file_path, file_hash, dest_file)
+                except Exception as e:
+                    self.update_status(f"Error copying {file_path}: {e}")
 
     # ------------------------------------
     # 更新状态显示
     def update_status(self, message):
-        self.status_text.append(message)
+        self.status_log.write(message)  # 可在迁移线程中调用，界面线程定时批量刷新
 
     # ------------------------------------
     # 选择查找重复文件的目录
@@ -388,11 +423,11 @@ class FileManagementApp(QtWidgets.QMainWindow):
             f"Duplicates details:\n{detailed_info}\n\nOpen detailed view?"
         )
         if open_window == QMessageBox.Yes:
-            self.show_duplicate_window(duplicate_files_list)
+            self.show_duplicate_window(duplicate_files_list, files_hash)
 
     # ------------------------------------
     # 显示重复文件窗口
-    def show_duplicate_window(self, duplicate_files_list):
+    def show_duplicate_window(self, duplicate_files_list, files_hash):
         duplicate_window = QtWidgets.QDialog(self)
         duplicate_window.setWindowTitle("Duplicate Files")
         duplicate_window.setGeometry(400, 200, 600, 400)
@@ -409,6 +444,12 @@ class FileManagementApp(QtWidgets.QMainWindow):
         confirm_delete.clicked.connect(lambda: self.confirm_delete_duplicates(duplicate_files_list, duplicate_window))
         layout.addWidget(confirm_delete)
 
+        # 替换为硬链接：不删除任何路径
+        confirm_link = QPushButton("Replace Duplicates With Hardlinks")
+        confirm_link.clicked.connect(
+            lambda: self.confirm_link_duplicates(duplicate_files_list, files_hash, duplicate_window))
+        layout.addWidget(confirm_link)
+
         duplicate_window.exec_()
 
     # ------------------------------------
@@ -426,7 +467,7 @@ class FileManagementApp(QtWidgets.QMainWindow):
         if second_confirmation == QMessageBox.No:
             return
 
-        delete_duplicates(duplicate_files_list, self.update_dup_status)
+        deleted = delete_duplicates(duplicate_files_list, self.update_dup_status)
         window.accept()
 
         # 询问是否清理空文件夹，使用用户填入的重复查找目录作为清理对象
@@ -439,36 +480,40 @@ class FileManagementApp(QtWidgets.QMainWindow):
                 QMessageBox.Yes | QMessageBox.No
             )
             if clear_empty == QMessageBox.Yes:
-                clear_empty_dirs(dup_dir, self.update_dup_status)
+                clear_empty_dirs(dup_dir, self.update_dup_status, deleted)  # 只检查刚删除的文件所在的目录及其上级
+
+    # ------------------------------------
+    # 确认把重复文件替换为硬链接
+    def confirm_link_duplicates(self, duplicate_files_list, files_hash, window):
+        confirmation = QMessageBox.question(
+            self,
+            "Confirm Hardlinks",
+            "Replace each duplicate with a hardlink to the kept copy? All paths stay valid."
+        )
+        if confirmation == QMessageBox.No:
+            return
+
+        link_duplicates(duplicate_files_list, files_hash, self.update_dup_status)
+        window.accept()
 
     # ------------------------------------
     # 更新重复文件查找的状态显示
     def update_dup_status(self, message):
-        self.dup_status_text.append(message)
+        self.dup_status_log.write(message)
 
     # ------------------------------------
-    # 计算文件数量和总大小
-    def count_files_and_size(self, src_paths):
-        file_count = 0
-        total_size = 0
-        valid_extensions = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS | OFFICE_EXTENSIONS
+    # 扫描源目录，返回需要迁移的文件（ScanEntry 列表，含大小和 mtime，category 为目标子文件夹）
+    def scan_sources(self, src_paths):
+        work_list = []
         for src_path in src_paths:
-            for root_dir, sub_dirs, files in os.walk(src_path):
-                for file in files:
-                    if file.lower().endswith(tuple(valid_extensions)):
-                        file_count += 1
-                        file_path = os.path.join(root_dir, file)
-                        try:
-                            total_size += os.path.getsize(file_path)
-                        except Exception:
-                            pass
-        return file_count, total_size
+            work_list.extend(entry for entry in scan_tree(src_path, classify=lambda name: classify(name, 'migration'))
+                             if entry.category)
+        return work_list
 
     # ------------------------------------
     # 检查目标路径中的可用空间
     def check_space_needed(self, total_size, dest_path):
-        stats = shutil.disk_usage(dest_path)
-        return total_size <= stats.free
+        return SpaceManager().fits(dest_path, total_size)
 
 # ------------------------------------
 # 程序主入口
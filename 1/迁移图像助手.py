@@ -2,10 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import shutil
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, font
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 引入仓库根目录下的 organizer_core
+from organizer_core.logsink import attach_tk
+from organizer_core.naming import claim_path, release_claim, reset_name_indexes
 # ---------------------------
 # 定义支持的文件扩展名
 IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'}
@@ -48,17 +53,9 @@ def get_non_conflict_path(dest_dir, filename):
         filename -- 待复制/移动的文件名
     返回:
         一个新的文件路径，若目标目录已有同名文件，则会添加“_数字”
+        （该路径已创建空的占位文件，随后的复制/移动会直接覆盖它）
     """
-    base, ext = os.path.splitext(filename)  # 分离文件名和扩展名
-    candidate = filename
-    counter = 1
-    dest_path = os.path.join(dest_dir, candidate)
-    # 循环判断目标路径是否已存在，如果存在则修改文件名
-    while os.path.exists(dest_path):
-        candidate = base + "_" + str(counter) + ext
-        dest_path = os.path.join(dest_dir, candidate)
-        counter = counter + 1
-    return dest_path
+    return claim_path(dest_dir, filename)  # 目录内容只扫描一次，在内存中分配编号
 
 def process_file(file_path, dest_dir, operation, log_callback):
     """
@@ -70,8 +67,9 @@ def process_file(file_path, dest_dir, operation, log_callback):
         log_callback -- 用于记录日志的回调函数
     """
     filename = os.path.basename(file_path)                # 获取文件名
-    dest_path = get_non_conflict_path(dest_dir, filename)   # 获取不冲突的目标路径
+    dest_path = None
     try:
+        dest_path = get_non_conflict_path(dest_dir, filename)   # 获取不冲突的目标路径
         if operation == "copy":
             shutil.copy2(file_path, dest_path)            # 复制文件，保留元数据
             log_callback("复制: " + file_path + " -> " + dest_path)
@@ -79,6 +77,8 @@ def process_file(file_path, dest_dir, operation, log_callback):
             shutil.move(file_path, dest_path)             # 移动文件
             log_callback("移动: " + file_path + " -> " + dest_path)
     except Exception as e:
+        if dest_path:
+            release_claim(dest_path)                      # 删除未写入内容的占位文件
         log_callback("处理 " + file_path + " 时出错: " + str(e))
 
 def process_source_dir(source_dir, dest_dir, operation, log_callback):
@@ -110,6 +110,7 @@ def execute_task(source_dirs, dest_dir, operation, log_callback, finish_callback
         log_callback -- 日志回调，用于向日志区域输出信息
         finish_callback -- 任务完成时调用的回调函数
     """
+    reset_name_indexes()  # 重新读取目标目录中的已有文件名
     i = 0
     while i < len(source_dirs):
         source = source_dirs[i]
@@ -169,14 +170,11 @@ def select_dest():
 
 def log_message(message):
     """
-    在日志文本框中添加一行日志信息
+    在日志文本框中添加一行日志信息（可在工作线程中调用，界面定时批量刷新）
     参数:
         message -- 日志文本
     """
-    txt_log.config(state="normal")
-    txt_log.insert(tk.END, message + "\n")
-    txt_log.see(tk.END)
-    txt_log.config(state="disabled")
+    log_sink.write(message)
 
 def disable_ui():
     """
@@ -187,6 +185,7 @@ def disable_ui():
     btn_select_dest.config(state="disabled")
     btn_copy.config(state="disabled")
     btn_move.config(state="disabled")
+    btn_similar.config(state="disabled")
 
 def enable_ui():
     """
@@ -197,6 +196,7 @@ def enable_ui():
     btn_select_dest.config(state="normal")
     btn_copy.config(state="normal")
     btn_move.config(state="normal")
+    btn_similar.config(state="normal")
 
 def finish_callback():
     """
@@ -245,6 +245,42 @@ def start_operation(op):
     thread.daemon = True
     thread.start()
 
+def find_similar_task(source_dirs, log_callback, finish_callback):
+    """
+    在后台线程中查找源目录里近似重复的图片（缩放、重新压缩过的副本），只在日志中列出，不改动文件
+    参数:
+        source_dirs     -- 源目录列表
+        log_callback    -- 日志回调函数
+        finish_callback -- 任务完成后的回调函数
+    """
+    try:
+        from organizer_core.phash import find_similar_images  # 依赖 numpy 和 Pillow，用到时才导入
+    except ImportError as e:
+        log_callback("查找相似图片需要安装 numpy 和 Pillow: " + str(e))
+        finish_callback()
+        return
+    try:
+        groups = find_similar_images(source_dirs, update_text=log_callback)
+        for number, group in enumerate(groups, 1):
+            log_callback("相似图片第 " + str(number) + " 组:")
+            for path in group:
+                log_callback("    " + path)
+    except Exception as e:
+        log_callback("查找相似图片失败: " + str(e))
+    finish_callback()
+
+def start_find_similar():
+    """
+    用户点击“查找相似图片”，在源目录中查找近似重复的图片
+    """
+    if len(global_source_dirs) == 0:
+        messagebox.showerror("错误", "请至少添加一个源目录")
+        return
+    disable_ui()
+    thread = threading.Thread(target=find_similar_task, args=(list(global_source_dirs), log_message, finish_callback))
+    thread.daemon = True
+    thread.start()
+
 # ---------------------------
 # 构建界面
 
@@ -285,10 +321,15 @@ btn_copy.pack(side="left", padx=20)
 btn_move = tk.Button(frame_oper, text="移动", width=15, font=default_font,
                      relief="raised", bg="#f2dede", command=lambda: start_operation("move"))
 btn_move.pack(side="left", padx=20)
+# “查找相似图片”按钮，只列出近似重复的图片，不改动文件
+btn_similar = tk.Button(frame_oper, text="查找相似图片", width=15, font=default_font,
+                        relief="raised", command=start_find_similar)
+btn_similar.pack(side="left", padx=20)
 # ----- 日志显示区域 -----
 frame_log = tk.LabelFrame(root, text="日志", padx=10, pady=10, font=default_font)
 frame_log.pack(fill="both", expand=True, padx=10, pady=5)
 txt_log = scrolledtext.ScrolledText(frame_log, state="disabled", font=default_font, height=15)
 txt_log.pack(fill="both", expand=True)
+log_sink = attach_tk(txt_log)  # 日志出口，只保留最近的若干行
 # 启动主循环，使界面保持响应
 root.mainloop()
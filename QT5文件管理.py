@@ -1,16 +1,25 @@
 import sys
 import os
-import shutil
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton,
     QFileDialog, QLabel, QMessageBox, QComboBox
 )
 from PyQt5.QtCore import pyqtSignal, QObject, QThread
+from organizer_core.engine import OrganizerEngine
+from organizer_core.space import InsufficientSpaceError
 
 # Define supported video and image file formats
 VIDEO_FORMATS = ['.mp4', '.avi', '.mkv', '.mov']
 IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif']
 
+def classify_media(file_name):
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in VIDEO_FORMATS:
+        return 'video'
+    if extension in IMAGE_FORMATS:
+        return 'image'
+    return None
+
 class FileOperationWorker(QObject):
     finished = pyqtSignal(str)
     progress = pyqtSignal(str)
@@ -22,30 +31,17 @@ class FileOperationWorker(QObject):
         self.action = action
 
     def run(self):
-        for file_path in self.media_files:
-            base_name = os.path.basename(file_path)
-            destination_file_path = os.path.join(self.destination_directory, base_name)
-
-            # Avoid overwriting files by checking for existing destination
-            if os.path.exists(destination_file_path):
-                base, extension = os.path.splitext(base_name)
-                counter = 1
-                while os.path.exists(destination_file_path):
-                    new_file_name = f"{base}_{counter}{extension}"
-                    destination_file_path = os.path.join(self.destination_directory, new_file_name)
-                    counter += 1
-
-            try:
-                if self.action == 'move':
-                    shutil.move(file_path, destination_file_path)
-                    self.progress.emit(f"Moved: {file_path} to {destination_file_path}")
-                else:
-                    shutil.copy2(file_path, destination_file_path)
-                    self.progress.emit(f"Copied: {file_path} to {destination_file_path}")
-            except Exception as e:
-                self.progress.emit(f"Error processing {file_path}: {str(e)}")
-
-        self.finished.emit("File operation completed successfully!")
+        # The engine claims collision-free names (name, name_1, ...) and transfers files in parallel
+        engine = OrganizerEngine(classify=classify_media, update_text=self.progress.emit)
+        try:
+            result = engine.transfer(self.media_files, self.destination_directory, self.action, flat=True)
+        except InsufficientSpaceError as e:  # Checked before any file is transferred; nothing was changed
+            self.finished.emit(f"File operation cancelled: {e.strerror}")
+            return
+        except Exception as e:  # The thread must always emit finished so the UI can clean up
+            self.finished.emit(f"File operation failed: {e}")
+            return
+        self.finished.emit(f"File operation completed: {result.succeeded} succeeded, {result.failed} failed.")
 
 class MediaFileManager(QWidget):
     def __init__(self):
@@ -133,14 +129,8 @@ class MediaFileManager(QWidget):
                     self.start_worker(media_files, destination_directory)
 
     def find_media_files(self, root_directory):
-        media_files = []
-        for current_directory, _, file_names in os.walk(root_directory):
-            for file_name in file_names:
-                file_name_without_extension, file_extension = os.path.splitext(file_name)
-                if file_extension.lower() in VIDEO_FORMATS or file_extension.lower() in IMAGE_FORMATS:
-                    file_path = os.path.join(current_directory, file_name)
-                    media_files.append(file_path)
-        return media_files
+        # Scan entries (path, size, device, category) are passed straight to the worker
+        return [entry for entry in OrganizerEngine(classify=classify_media).scan([root_directory]) if entry.category]
 
     def start_worker(self, media_files, destination_directory):
         action = self.action_combo.currentText().lower()
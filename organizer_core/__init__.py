@@ -0,0 +1,6 @@
+"""
+各个整理/去重脚本共用的底层组件。
+Shared building blocks used by the organizer and de-duplication scripts.
+
+子模块按需导入，避免在只用到其中一部分功能时加载可选依赖。
+"""
@@ -0,0 +1,223 @@
+"""
+asyncio 驱动的整理流水线，适合每次 stat / open 都有较高延迟的网络盘（NFS / SMB）。
+列目录 -> stat -> 哈希（可选） -> 传输 四个阶段同时运行，阶段之间用有界队列连接；
+阻塞的系统调用交给各阶段自己的线程池，几百个元数据操作可以同时在途，
+而有界队列保证扫描再快也不会把整棵目录树堆在内存里。
+结果与 OrganizerEngine.organize 相同：按类别移动/复制到 target_dir/类别/，重名时自动加 _1、_2 ...
+
+    python -m organizer_core.engine organize SRC --target DEST --op copy --async
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from organizer_core.engine import TransferResult
+from organizer_core.fastcopy import MoveStats
+from organizer_core.hashing import cached_hash_file
+from organizer_core.naming import reset_name_indexes
+from organizer_core.scanner import FULL_PERMISSIONS, ScanEntry
+
+LIST_WORKERS = 16  # 同时列出的目录数
+STAT_WORKERS = 64  # 同时进行的 stat 数
+HASH_WORKERS = 8  # 同时计算哈希的文件数
+TRANSFER_WORKERS = 4  # 同时传输的文件数
+QUEUE_SIZE = 1000  # 阶段之间队列的容量
+PROGRESS_INTERVAL = 2.0  # 进度报告间隔（秒）
+
+_DONE = object()  # 队列结束标记
+
+
+def _chmod(path, on_error):  # 与 scan_tree(fix_permissions=True) 相同，把权限改为 777
+    try:
+        os.chmod(path, FULL_PERMISSIONS)
+    except OSError as e:
+        on_error(path, e)
+
+
+def _list_dir(directory):  # 在线程池中执行：返回 (子目录列表, [(路径, 文件名), ...])，不 stat 文件
+    dirs, files = [], []
+    with os.scandir(directory) as iterator:
+        for entry in iterator:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.is_file():
+                files.append((entry.path, entry.name))
+    return dirs, files
+
+
+# -------------------- 异步流水线 --------------------
+class AsyncPipeline:
+    """
+    参数:
+        engine          -- OrganizerEngine，提供分类函数、日志和单个文件的传输
+        skip_duplicates -- 为 True 时增加哈希阶段，内容与本次已处理文件相同的文件留在原处
+        其余参数        -- 各阶段的并发数和队列容量
+    """
+
+    def __init__(self, engine, skip_duplicates=False, list_workers=LIST_WORKERS, stat_workers=STAT_WORKERS,
+                 hash_workers=HASH_WORKERS, transfer_workers=TRANSFER_WORKERS, queue_size=QUEUE_SIZE):
+        self.engine = engine
+        self.skip_duplicates = skip_duplicates
+        self.list_workers = list_workers
+        self.stat_workers = stat_workers
+        self.hash_workers = hash_workers
+        self.transfer_workers = transfer_workers
+        self.queue_size = queue_size
+
+    def run(self, sources, target_dir, operation, fix_permissions=False):  # 同步入口，返回 TransferResult
+        return asyncio.run(self.organize(sources, target_dir, operation, fix_permissions))
+
+    async def organize(self, sources, target_dir, operation, fix_permissions=False):
+        if operation not in ('copy', 'move'):
+            raise ValueError(f"未知的操作: {operation}")
+        reset_name_indexes()
+        self._loop = asyncio.get_running_loop()
+        self._target_dir = target_dir
+        self._operation = operation
+        self._fix_permissions = fix_permissions
+        self._move_stats = MoveStats() if operation == 'move' else None
+        self._made_dirs = set()
+        self._digests = set()
+        self._counts = {'files': 0, 'skipped': 0, 'succeeded': 0, 'failed': 0, 'bytes': 0}
+        self._start = self._last_report = time.monotonic()
+
+        pools = [ThreadPoolExecutor(self.list_workers), ThreadPoolExecutor(self.stat_workers),
+                 ThreadPoolExecutor(self.hash_workers), ThreadPoolExecutor(self.transfer_workers)]
+        self._list_pool, self._stat_pool, self._hash_pool, self._transfer_pool = pools
+        try:
+            dir_queue = asyncio.Queue()  # 目录数量远少于文件，不限容量，避免列目录的协程互相等待
+            file_queue = asyncio.Queue(self.queue_size)
+            entry_queue = asyncio.Queue(self.queue_size)
+            transfer_queue = asyncio.Queue(self.queue_size) if self.skip_duplicates else entry_queue
+            for source in sources:
+                if fix_permissions:
+                    _chmod(source, self._on_error)
+                dir_queue.put_nowait(source)
+
+            listers = [asyncio.create_task(self._lister(dir_queue, file_queue)) for _ in range(self.list_workers)]
+            next_workers = self.hash_workers if self.skip_duplicates else self.transfer_workers
+            stages = [self._stage(self.stat_workers, self._stat, file_queue, entry_queue, next_workers)]
+            if self.skip_duplicates:
+                stages.append(self._stage(self.hash_workers, self._dedup, entry_queue, transfer_queue,
+                                          self.transfer_workers))
+            stages.append(self._stage(self.transfer_workers, self._transfer, transfer_queue))
+            stage_tasks = [asyncio.create_task(stage) for stage in stages]
+
+            await dir_queue.join()  # 所有目录都已列出
+            for task in listers:
+                task.cancel()
+            await asyncio.gather(*listers, return_exceptions=True)
+            for _ in range(self.stat_workers):
+                await file_queue.put(_DONE)
+            await asyncio.gather(*stage_tasks)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True)
+
+        counts = self._counts
+        self._report()
+        if self._move_stats:
+            self.engine.log(self._move_stats.summary())
+        if counts['skipped']:
+            self.engine.log(f"跳过 {counts['skipped']} 个与已处理文件内容相同的文件")
+        self.engine.emit('done', succeeded=counts['succeeded'], failed=counts['failed'], bytes=counts['bytes'])
+        return TransferResult(counts['succeeded'], counts['failed'], counts['bytes'], self._move_stats)
+
+    def _on_error(self, path, e):
+        self.engine.log(f"无法访问 {path}: {e}")
+
+    def _run(self, pool, func, *args):
+        return self._loop.run_in_executor(pool, func, *args)
+
+    # -------------------- 各阶段 --------------------
+    async def _lister(self, dir_queue, file_queue):  # 列目录：子目录放回目录队列，文件按名称分类后放入文件队列
+        classify = self.engine.classify
+        while True:
+            directory = await dir_queue.get()
+            try:
+                dirs, files = await self._run(self._list_pool, _list_dir, directory)
+            except OSError as e:
+                self._on_error(directory, e)
+                dir_queue.task_done()
+                continue
+            for path in dirs:
+                if self._fix_permissions:
+                    await self._run(self._stat_pool, _chmod, path, self._on_error)  # 进入目录之前修改
+                dir_queue.put_nowait(path)
+            for path, name in files:
+                category = classify(name)
+                if category:  # 不属于任何类别的文件连 stat 都不需要（fix_permissions 也只修改会被传输的文件）
+                    await file_queue.put((path, name, category))  # 队列满时在这里等待后面的阶段
+            dir_queue.task_done()
+
+    async def _stage(self, workers, handler, in_queue, out_queue=None, consumers=0):
+        # 启动 workers 个协程处理同一个队列；全部结束后给下一阶段的 consumers 个协程各发一个结束标记
+        await asyncio.gather(*(self._worker(handler, in_queue, out_queue) for _ in range(workers)))
+        for _ in range(consumers):
+            await out_queue.put(_DONE)
+
+    async def _worker(self, handler, in_queue, out_queue):
+        while True:
+            item = await in_queue.get()
+            if item is _DONE:
+                return
+            try:
+                result = await handler(item)
+            except Exception as e:  # 一个文件出错不能让整个阶段停下，否则上游队列写满后流水线会卡住
+                self.engine.log(f"处理 {item[0] if isinstance(item, tuple) else item} 时出错: {e}")
+                continue
+            if result is not None and out_queue is not None:
+                await out_queue.put(result)
+
+    async def _stat(self, item):  # stat 阶段：取得大小、设备号等，产出 ScanEntry
+        path, name, category = item
+        try:
+            if self._fix_permissions:
+                await self._run(self._stat_pool, _chmod, path, self._on_error)
+            st = await self._run(self._stat_pool, os.stat, path)
+        except OSError as e:
+            self._on_error(path, e)
+            return None
+        self._counts['files'] += 1
+        return ScanEntry(path, name, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino, category)
+
+    async def _dedup(self, entry):  # 哈希阶段：内容已出现过的文件不再传输
+        try:
+            digest = await self._run(self._hash_pool, cached_hash_file, entry.path)
+        except OSError as e:
+            self._on_error(entry.path, e)
+            return None
+        if digest in self._digests:  # 检查和登记之间没有 await，不会有两个协程同时登记同一哈希
+            self._counts['skipped'] += 1
+            self.engine.log(f"跳过重复文件: {entry.path}")
+            return None
+        self._digests.add(digest)
+        return entry
+
+    async def _transfer(self, entry):  # 传输阶段：认领目标文件名后移动/复制
+        dest_dir = os.path.join(self._target_dir, entry.category)
+        if dest_dir not in self._made_dirs:
+            await self._run(self._transfer_pool, lambda: os.makedirs(dest_dir, exist_ok=True))
+            self._made_dirs.add(dest_dir)
+        ok = await self._run(self._transfer_pool, self.engine.transfer_file, entry.path, dest_dir, self._operation,
+                             entry.size, entry.dev, self._move_stats)
+        counts = self._counts
+        if ok:
+            counts['succeeded'] += 1
+            counts['bytes'] += entry.size
+        else:
+            counts['failed'] += 1
+        if time.monotonic() - self._last_report >= PROGRESS_INTERVAL:
+            self._report()
+        return None
+
+    def _report(self):
+        counts = self._counts
+        elapsed = time.monotonic() - self._start
+        self._last_report = time.monotonic()
+        mb = counts['bytes'] / 1024 / 1024
+        self.engine.log(f"已发现 {counts['files']} 个文件，完成 {counts['succeeded']} 个，失败 {counts['failed']} 个，"
+                        f"{mb:.1f} MB，平均 {mb / elapsed if elapsed > 0 else 0.0:.1f} MB/s")
+        self.engine.emit('transfer', files=counts['files'], succeeded=counts['succeeded'], failed=counts['failed'],
+                         done_bytes=counts['bytes'])
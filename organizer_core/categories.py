@@ -0,0 +1,131 @@
+"""
+扩展名 -> 类别 查表。
+分类规则统一保存在 categories.json 中（每个工具一套"方案"），加载时展开成只读字典，
+每个文件只需一次字典查找，不再逐个类别遍历扩展名列表。
+
+性能对比（旧的按列表遍历 vs 查表）:
+    python -m organizer_core.categories benchmark --count 5000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+from types import MappingProxyType
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'categories.json')
+
+
+# -------------------- 加载配置 --------------------
+def load_profiles(path=CONFIG_PATH):  # 返回 {方案名: 只读的 {'.ext': 类别}}
+    with open(path, encoding='utf-8') as file:
+        config = json.load(file)
+    profiles = {}
+    for profile, categories in config.items():
+        table = {}
+        for category, extensions in categories.items():
+            for ext in extensions:
+                ext = '.' + ext.lower().lstrip('.')
+                if table.setdefault(ext, category) != category:
+                    raise ValueError(f"{path}: 方案 {profile} 中扩展名 {ext} 同时属于 {table[ext]} 和 {category}")
+        profiles[profile] = MappingProxyType(table)
+    return MappingProxyType(profiles)
+
+
+PROFILES = load_profiles()
+
+
+def get_extension_map(profile):  # 取得某个方案的 {'.ext': 类别} 只读字典
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"未知的分类方案: {profile}（可选: {', '.join(PROFILES)}）") from None
+
+
+def get_categories(profile):  # 取得某个方案的 {类别: 扩展名集合}
+    categories = {}
+    for ext, category in get_extension_map(profile).items():
+        categories.setdefault(category, set()).add(ext)
+    return categories
+
+
+# -------------------- 分类 --------------------
+def classify(file_name, profile):  # 单个文件名 -> 类别，不属于任何类别时返回 None
+    return get_extension_map(profile).get(os.path.splitext(file_name)[1].lower())
+
+
+def classify_many(file_names, profile):  # 批量分类，返回与输入等长的类别列表
+    table = get_extension_map(profile)
+    seen = {}  # 原始后缀 -> 类别，同一批文件的后缀种类很少，大小写转换只做一次
+    result = []
+    append = result.append
+    for name in file_names:
+        base, dot, suffix = name.rpartition('.')
+        if not dot or not base.strip('.') or '/' in suffix or '\\' in suffix:
+            append(None)  # 没有扩展名（或像 .bashrc 这样的隐藏文件），与 os.path.splitext 保持一致
+            continue
+        try:
+            append(seen[suffix])
+        except KeyError:
+            category = seen[suffix] = table.get('.' + suffix.lower())
+            append(category)
+    return result
+
+
+# -------------------- 基准测试 --------------------
+def _classify_by_lists(file_name, categories):  # 旧实现：逐个类别遍历扩展名列表
+    ext = os.path.splitext(file_name)[1].lower()
+    for category, extensions in categories.items():
+        if ext in extensions:
+            return category
+    return None
+
+
+def benchmark(count, profile='organizer'):  # 返回 (旧实现耗时, 查表耗时, 批量接口耗时)，单位秒
+    extensions = list(get_extension_map(profile)) + ['.bin', '.dat', '.log', '']
+    names = [f"IMG_{i:07d}{random.choice(extensions).upper() if i % 7 == 0 else random.choice(extensions)}"
+             for i in range(count)]
+    categories = {category: sorted(exts) for category, exts in get_categories(profile).items()}
+
+    start = time.perf_counter()
+    expected = [_classify_by_lists(name, categories) for name in names]
+    by_lists = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [classify(name, profile) for name in names]
+    by_table = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = classify_many(names, profile)
+    by_batch = time.perf_counter() - start
+
+    if not (expected == single == batch):
+        raise AssertionError('分类结果不一致')
+    return by_lists, by_table, by_batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='扩展名分类表')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('show', help='显示所有分类方案')
+    bench_parser = sub.add_parser('benchmark', help='对比旧的列表遍历与查表的速度')
+    bench_parser.add_argument('--count', type=int, default=1000000)
+    bench_parser.add_argument('--profile', default='organizer', choices=list(PROFILES))
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        for profile in PROFILES:
+            print(f"[{profile}]")
+            for category, extensions in get_categories(profile).items():
+                print(f"  {category}: {' '.join(sorted(extensions))}")
+        return
+
+    by_lists, by_table, by_batch = benchmark(args.count, args.profile)
+    print(f"{args.count} 个文件名:")
+    print(f"  列表遍历 (旧):      {by_lists * 1000:10.1f} ms")
+    print(f"  classify 查表:      {by_table * 1000:10.1f} ms")
+    print(f"  classify_many 批量: {by_batch * 1000:10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
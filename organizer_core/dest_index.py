@@ -0,0 +1,189 @@
+"""
+迁移目标目录的内容索引（SQLite，保存在目标目录中）。
+按 大小 -> 头尾哈希 -> 完整哈希 三级记录目标目录中的文件:
+    - 打开时只扫描目录读取 大小 / mtime_ns（不读文件内容），与上次保存的记录对比，
+      大小或 mtime 变化的文件清空其哈希，新文件只记录大小；
+    - 哈希在需要时才计算：只有源文件的大小与目标中某个文件相同，才依次比较头尾哈希、完整哈希；
+    - 迁移过来的文件随即加入索引，之后同一次运行中的重复文件也能识别。
+"""
+import os
+import sqlite3
+import threading
+
+from organizer_core.hashing import PARTIAL_HASH_SIZE, cached_hash_file, cached_partial_hash_file
+from organizer_core.journal import is_journal_file
+from organizer_core.scanner import scan_tree
+
+INDEX_NAME = '.migration_index.sqlite3'
+COMMIT_EVERY = 500  # 累计多少次更新后提交一次事务
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial TEXT,
+    digest TEXT
+);
+"""
+
+
+def is_index_file(name):  # 索引本身（含 -wal / -shm）不计入目标目录内容
+    return name.startswith(INDEX_NAME)
+
+
+def _is_metadata(name):
+    return is_index_file(name) or is_journal_file(name)
+
+
+# -------------------- 目标目录索引 --------------------
+class DestinationIndex:
+    """线程安全；on_error(path, exception) 用于报告扫描和哈希时的错误"""
+
+    def __init__(self, dest_dir, db_path=None, on_error=None):
+        self.dest_dir = dest_dir
+        self.db_path = db_path or os.path.join(dest_dir, INDEX_NAME)
+        self.on_error = on_error
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._files = {}  # 路径 -> [大小, mtime_ns, 头尾哈希, 完整哈希]
+        self._by_size = {}  # 大小 -> 路径集合
+        self._pending = 0
+        self.added = self.changed = self.removed = 0  # 打开时与上次记录对比的结果
+        self.refresh()
+
+    # -------------------- 与目录内容同步 --------------------
+    def refresh(self):  # 重新扫描目标目录，只读取元数据
+        stored = {path: [size, mtime_ns, partial, digest] for path, size, mtime_ns, partial, digest in
+                  self._conn.execute('SELECT path, size, mtime_ns, partial, digest FROM files')}
+        files = {}
+        upserts = []
+        self.added = self.changed = 0
+        for entry in scan_tree(self.dest_dir, on_error=self.on_error):
+            if _is_metadata(entry.name):
+                continue
+            record = stored.pop(entry.path, None)
+            if record is None:
+                record = [entry.size, entry.mtime_ns, None, None]
+                upserts.append((entry.path, entry.size, entry.mtime_ns, None, None))
+                self.added += 1
+            elif record[:2] != [entry.size, entry.mtime_ns]:  # 文件已变化，旧的哈希作废
+                record = [entry.size, entry.mtime_ns, None, None]
+                upserts.append((entry.path, entry.size, entry.mtime_ns, None, None))
+                self.changed += 1
+            files[entry.path] = record
+        self.removed = len(stored)
+        with self._lock:
+            self._files = files
+            self._by_size = {}
+            for path, record in files.items():
+                self._by_size.setdefault(record[0], set()).add(path)
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO files (path, size, mtime_ns, partial, digest) VALUES (?, ?, ?, ?, ?)', upserts)
+            self._conn.executemany('DELETE FROM files WHERE path=?', ((path,) for path in stored))
+            self._conn.commit()
+            self._pending = 0
+
+    def __len__(self):
+        return len(self._files)
+
+    def add(self, path, digest=None, st=None):  # 登记新写入目标目录的文件（如迁移得到的副本，digest 可用源文件的哈希）
+        st = st or os.stat(path)
+        with self._lock:
+            self._set(path, [st.st_size, st.st_mtime_ns, None, digest])
+
+    def _set(self, path, record):  # 调用方需持有锁
+        old = self._files.get(path)
+        if old is not None and old[0] != record[0]:
+            self._by_size[old[0]].discard(path)
+        self._files[path] = record
+        self._by_size.setdefault(record[0], set()).add(path)
+        self._conn.execute('INSERT OR REPLACE INTO files (path, size, mtime_ns, partial, digest) VALUES (?, ?, ?, ?, ?)',
+                           (path, *record))
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def _forget(self, path):  # 调用方需持有锁
+        record = self._files.pop(path, None)
+        if record is not None:
+            self._by_size[record[0]].discard(path)
+            self._conn.execute('DELETE FROM files WHERE path=?', (path,))
+            self._pending += 1
+
+    # -------------------- 查找重复 --------------------
+    def _hash(self, path, level):  # 取得目标文件的头尾哈希(level=2)或完整哈希(level=3)，文件已变化或不存在时返回 None
+        with self._lock:
+            record = self._files.get(path)
+            if record is None:
+                return None
+            if record[level] is not None:
+                return record[level]
+        try:
+            st = os.stat(path)
+            if (st.st_size, st.st_mtime_ns) != (record[0], record[1]):  # 索引之后被修改过，旧记录作废
+                record = [st.st_size, st.st_mtime_ns, None, None]
+                with self._lock:
+                    self._set(path, record)
+            value = (cached_partial_hash_file if level == 2 else cached_hash_file)(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(path)
+            return None
+        except OSError as e:
+            if self.on_error:
+                self.on_error(path, e)
+            return None
+        with self._lock:
+            if self._files.get(path) is record:
+                record[level] = value
+                self._set(path, record)
+        return value
+
+    def find_duplicate(self, src, size=None):
+        """
+        在目标目录中查找与 src 内容相同的文件，返回 (目标路径或 None, src 的完整哈希或 None)
+        目标中没有大小相同的文件时不读取 src；头尾哈希都不同时也不计算完整哈希
+        """
+        if size is None:
+            size = os.path.getsize(src)
+        with self._lock:
+            candidates = list(self._by_size.get(size, ()))
+        if not candidates:
+            return None, None
+        partial = cached_partial_hash_file(src)
+        candidates = [path for path in candidates if self._hash(path, 2) == partial]  # 大小可能已变，以哈希为准
+        if not candidates:
+            return None, None
+        if size <= PARTIAL_HASH_SIZE * 2:  # 小文件的头尾哈希就是完整哈希
+            return candidates[0], partial
+        digest = cached_hash_file(src)
+        for path in candidates:
+            if self._hash(path, 3) == digest:
+                return path, digest
+        return None, digest
+
+    # -------------------- 提交与关闭 --------------------
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
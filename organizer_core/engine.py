@@ -0,0 +1,393 @@
+"""
+与界面无关的整理引擎：扫描 -> 分类 -> 去重 -> 传输。
+Tk / Qt 工具只负责选择目录、确认和显示日志，实际工作都在这里完成；
+同样的流程也可以在没有图形界面的服务器上运行（例如放进 cron）。
+
+命令行:
+    python -m organizer_core.engine scan SRC [SRC ...] --profile media
+    python -m organizer_core.engine duplicates DIR [--delete | --link [--verify]]
+    python -m organizer_core.engine organize SRC [SRC ...] --target DEST --op move [--async] [--prune-empty]
+    python -m organizer_core.engine plan SRC [SRC ...] --target DEST --op move --out plan.jsonl
+    python -m organizer_core.engine plan-info plan.jsonl
+    python -m organizer_core.engine apply plan.jsonl
+加上 --json 时（子命令前后均可）每行输出一个 JSON 事件（{"stage": ..., ...}），便于其他程序解析进度。
+"""
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict, namedtuple
+
+from organizer_core import categories
+from organizer_core.fastcopy import MoveStats, copy_file, move_file
+from organizer_core.hashing import PARTIAL_HASH_SIZE, cached_hash_file, cached_partial_hash_file
+from organizer_core.linkdedup import MODES as LINK_MODES, link_duplicates
+from organizer_core.naming import claim_path, release_claim, reset_name_indexes
+from organizer_core.parallel_hash import HashEngine
+from organizer_core.plan import OrganizePlan, build_plan, format_summary, read_summary
+from organizer_core.prune import prune_empty_dirs
+from organizer_core.scanner import FULL_PERMISSIONS, group_by_size, scan_tree
+from organizer_core.space import InsufficientSpaceError, SpaceManager
+from organizer_core.transfer import TransferJob, TransferScheduler
+
+# 一次传输的结果；moves 为 MoveStats（复制时为 None）
+TransferResult = namedtuple('TransferResult', 'succeeded failed bytes moves')
+
+
+# -------------------- 整理引擎 --------------------
+class OrganizerEngine:
+    """
+    参数:
+        profile        -- categories.json 中的分类方案
+        classify       -- 可选，文件名 -> 类别 的函数，指定时代替 profile
+        update_text    -- 可选，接收一行日志文本（界面的文本框、print 等）
+        on_event       -- 可选，接收结构化的进度事件 dict（"stage" 字段表示阶段）
+        min_free_bytes -- 每个目标磁盘在写入之后至少保留的剩余字节数
+        space          -- 可选，共用的 SpaceManager（指定时忽略 min_free_bytes）
+    """
+
+    def __init__(self, profile='organizer', classify=None, update_text=None, on_event=None, min_free_bytes=0,
+                 space=None):
+        if classify is None:
+            categories.get_extension_map(profile)  # 方案名错误时立即报错
+            classify = lambda name: categories.classify(name, profile)
+        self.classify = classify
+        self.update_text = update_text
+        self.on_event = on_event
+        self.space = space or SpaceManager(min_free_bytes)  # 剩余空间在内存中记账，不必每个文件都 statvfs
+
+    def log(self, message):
+        if self.update_text:
+            self.update_text(message)
+        if self.on_event:
+            self.on_event({'stage': 'message', 'text': message})
+
+    def emit(self, stage, **data):
+        if self.on_event:
+            self.on_event({'stage': stage, **data})
+
+    # -------------------- 扫描 + 分类 --------------------
+    def scan(self, sources, fix_permissions=False):  # 单次遍历所有源目录，返回 ScanEntry 列表（不属于任何类别的文件 category 为 None）
+        on_error = lambda path, e: self.log(f"无法访问 {path}: {e}")
+        entries = []
+        for source in sources:
+            entries.extend(scan_tree(source, classify=self.classify, fix_permissions=fix_permissions, on_error=on_error))
+        self.emit('scan', files=len(entries), bytes=sum(entry.size for entry in entries))
+        return entries
+
+    @staticmethod
+    def summarize(entries):  # {类别: {'files': 文件数, 'bytes': 字节数}}，忽略未分类的文件
+        summary = {}
+        for entry in entries:
+            if entry.category:
+                item = summary.setdefault(entry.category, {'files': 0, 'bytes': 0})
+                item['files'] += 1
+                item['bytes'] += entry.size
+        return summary
+
+    # -------------------- 去重 --------------------
+    def find_duplicates(self, entries):  # 大小 -> 头尾哈希 -> 完整哈希 逐级筛选，返回 {哈希: [路径, ...]}（每组至少两个不同的 inode）
+        engine = HashEngine(update_text=self.log)
+        # 同一 inode 的多个路径（硬链接，例如 link_duplicates 之后）只算一个文件：再次运行不会重复报告，也不会提示删除不释放空间的路径
+        inodes = {}
+        for entry in entries:
+            inodes.setdefault((entry.dev, entry.ino) if entry.ino else entry.path, entry)
+        candidates = [entry for group in group_by_size(inodes.values()).values() for entry in group]
+        partial_groups = engine.group(
+            lambda entry: cached_partial_hash_file(entry.path), candidates,
+            key=lambda entry, partial_hash: (entry.size, partial_hash), total=len(candidates), label='计算部分哈希')
+
+        hashmap = defaultdict(list)
+        full_candidates = []
+        for (size, partial_hash), group in partial_groups.items():
+            if len(group) < 2:
+                continue
+            if size <= PARTIAL_HASH_SIZE * 2:
+                hashmap[partial_hash].extend(entry.path for entry in group)  # 小文件的头尾哈希就是完整哈希
+            else:
+                full_candidates.extend(entry.path for entry in group)
+        for digest, paths in engine.group(cached_hash_file, full_candidates, total=len(full_candidates)).items():
+            hashmap[digest].extend(paths)
+
+        duplicates = {digest: paths for digest, paths in hashmap.items() if len(paths) > 1}
+        self.emit('dedup', groups=len(duplicates), redundant=sum(len(paths) - 1 for paths in duplicates.values()))
+        return duplicates
+
+    def delete_files(self, paths):  # 删除指定文件，返回删除数量
+        deleted = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.log(f"无法删除 {path}: {e}")
+                continue
+            self.log(f"删除重复文件: {path}")
+            deleted += 1
+        self.emit('delete', deleted=deleted)
+        return deleted
+
+    def delete_duplicates(self, duplicates):  # 每组保留第一个文件，删除其余文件
+        return self.delete_files(path for paths in duplicates.values() for path in paths[1:])
+
+    def link_duplicates(self, duplicates, mode='auto', verify=False):
+        """
+        每组保留第一个文件，其余原子地替换为指向它的硬链接 / reflink（路径保持有效），返回 LinkStats
+        verify 为 True 时替换前逐字节比较，内容不一致的文件保持不动
+        """
+        stats = link_duplicates(
+            duplicates, mode, verify,
+            on_linked=lambda path, canonical, reclaimed: self.log(f"替换为链接: {path} -> {canonical}"),
+            on_error=lambda path, e: self.log(f"无法替换 {path}: {e}"))
+        self.log(stats.summary())
+        self.emit('link', linked=stats.linked, reclaimed=stats.reclaimed, already=stats.already,
+                  mismatched=stats.mismatched, failed=stats.failed)
+        return stats
+
+    def prune_empty_dirs(self, roots, touched=None):  # 删除 roots 下的空目录（touched 指定时只检查这些文件所在的目录），返回删除数量
+        removed = 0
+        for root in roots:
+            removed += prune_empty_dirs(root, touched, on_removed=lambda path: self.log(f"删除空文件夹: {path}"),
+                                        on_error=lambda path, e: self.log(f"无法删除文件夹 {path}: {e}"))
+        self.emit('prune', removed=removed)
+        return removed
+
+    # -------------------- 传输 --------------------
+    def transfer_file(self, src, dest_dir, operation, size=None, src_dev=None, move_stats=None, dest_name=None):
+        # 移动或复制单个文件，成功返回 True；dest_name 为计划好的目标文件名，默认沿用源文件名
+        dest = None
+        reservation = None
+        try:
+            if size is None or (operation == 'move' and src_dev is None):
+                st = os.stat(src)
+                size, src_dev = st.st_size, st.st_dev
+            needed = 0 if operation == 'move' and src_dev == self.space.device(dest_dir) else size  # 同盘移动只 rename
+            reservation = self.space.reserve(dest_dir, needed)
+            if reservation is None:
+                self.log(f"目标目录 {dest_dir} 剩余空间不足，无法处理文件: {src}")
+                return False
+            dest = claim_path(dest_dir, dest_name or os.path.basename(src))  # 认领不冲突的目标文件名（重名时自动加 _1、_2 ...）
+            if operation == 'move':
+                move_file(src, dest, claimed=True, stats=move_stats, src_dev=src_dev)  # 同一文件系统只 rename，跨设备复制+fsync 后删除
+                self.log(f"移动文件: {src} 到 {dest}")
+            elif operation == 'copy':
+                copy_file(src, dest)  # reflink / copy_file_range 等，保留元数据
+                self.log(f"复制文件: {src} 到 {dest}")
+            else:
+                raise ValueError(f"未知的操作: {operation}")
+            self.space.release(reservation)
+            return True
+        except Exception as e:
+            if reservation:
+                self.space.release(reservation, written=False)
+            if dest:
+                release_claim(dest)  # 删除未写入内容的占位文件
+            self.log(f"处理文件 {src} 时出错: {e}")
+            return False
+
+    def transfer(self, entries, target_dir, operation, flat=False):
+        """
+        把已分类的文件移动/复制到 target_dir/类别/（flat 为 True 时直接放在 target_dir 下）
+        并行传输，每个磁盘的并发数单独限制；返回 TransferResult
+        """
+        return self.execute(build_plan(entries, target_dir, operation, flat))
+
+    # -------------------- 计划 --------------------
+    def plan(self, sources, target_dir, operation, fix_permissions=False, flat=False):  # 扫描并算出每个文件的去向，不动任何数据
+        sources = [os.path.abspath(source) for source in sources]  # 计划中保存绝对路径，换个工作目录也能重放
+        plan = build_plan(self.scan(sources, fix_permissions), target_dir, operation, flat)
+        summary = plan.summary()
+        self.log("以下是要操作的文件清单：")
+        self.log(format_summary(summary))
+        self.emit('classify', categories=summary['categories'])
+        self.emit('plan', files=summary['files'], bytes=summary['bytes'], devices=summary['devices'])
+        return plan
+
+    def execute(self, plan, fix_permissions=False):
+        """
+        按计划移动/复制，返回 TransferResult；计划可以来自 OrganizePlan.load
+        开始前按各目标设备需要写入的总量检查剩余空间，放不下时抛出 InsufficientSpaceError，不传输任何文件
+        fix_permissions 为 True 时在传输前把计划中的源文件及其所在目录权限改为 777
+        （界面先用不改权限的计划请用户确认，确认后才在这里修改）
+        """
+        shortfalls = plan.shortfalls(self.space)
+        if shortfalls:
+            error = InsufficientSpaceError(shortfalls)
+            self.log(error.strerror)
+            self.emit('rejected', shortfalls=shortfalls)
+            raise error
+        reset_name_indexes()  # 重新读取目标目录中的已有文件名
+        jobs = []
+        missing = 0
+        made_dirs = set()
+        fixed_dirs = set()
+        for item in plan.items:
+            if fix_permissions:
+                self._fix_permissions(item.src, fixed_dirs)
+            src_dev = item.src_dev
+            if not plan.local:  # 计划来自文件：源文件可能已不存在，设备号也要重新取得
+                try:
+                    src_dev = os.stat(item.src).st_dev
+                except OSError as e:
+                    self.log(f"无法访问 {item.src}: {e}")
+                    missing += 1
+                    continue
+            dest_dir, dest_name = os.path.split(item.dst)
+            if dest_dir not in made_dirs:
+                os.makedirs(dest_dir, exist_ok=True)
+                made_dirs.add(dest_dir)
+            jobs.append(TransferJob(item.src, dest_dir, item.bytes, src_dev, dest_name))
+
+        operation = plan.operation
+        move_stats = MoveStats() if operation == 'move' else None
+        scheduler = TransferScheduler(
+            update_text=self.log,
+            on_progress=lambda done, total, ok, failed: self.emit(
+                'transfer', done_bytes=done, total_bytes=total, succeeded=ok, failed=failed + missing))
+        succeeded, failed, done_bytes = scheduler.run(
+            jobs, lambda job: self.transfer_file(
+                job.src, job.dest_dir, operation, job.size, job.src_dev, move_stats, job.dest_name),
+            operation)
+        if move_stats:
+            self.log(move_stats.summary())
+            self.emit('moves', renamed=move_stats.renamed, copied=move_stats.copied, bytes_copied=move_stats.bytes_copied)
+        return TransferResult(succeeded, failed + missing, done_bytes, move_stats)
+
+    def _fix_permissions(self, path, fixed_dirs):  # 与 scan_tree(fix_permissions=True) 相同的权限，每个目录只改一次
+        directory = os.path.dirname(path)
+        targets = [path] if directory in fixed_dirs else [directory, path]
+        fixed_dirs.add(directory)
+        for target in targets:
+            try:
+                os.chmod(target, FULL_PERMISSIONS)
+            except OSError as e:
+                self.log(f"无法调整 {target} 的权限: {e}")
+
+    def organize(self, sources, target_dir, operation, fix_permissions=False, flat=False):  # 完整流程：生成计划后执行
+        result = self.execute(self.plan(sources, target_dir, operation, fix_permissions, flat))
+        self.emit('done', succeeded=result.succeeded, failed=result.failed, bytes=result.bytes)
+        return result
+
+
+# -------------------- 命令行入口 --------------------
+def _print_event(event):
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
+
+def main(argv=None):
+    # --json / --profile 写在子命令之前或之后都可以：子命令上的同名选项默认不设置，未出现时沿用前面的值
+    common = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
+    common.add_argument('--json', action='store_true', help='每行输出一个 JSON 进度事件')
+    common.add_argument('--profile', choices=list(categories.PROFILES), help='分类方案（默认 organizer）')
+    parser = argparse.ArgumentParser(description='文件整理引擎（无界面）')
+    parser.add_argument('--json', action='store_true', help='每行输出一个 JSON 进度事件')
+    parser.add_argument('--profile', default='organizer', choices=list(categories.PROFILES), help='分类方案')
+    sub = parser.add_subparsers(dest='command', required=True)
+    scan_parser = sub.add_parser('scan', help='扫描并统计各类别的文件数和大小', parents=[common])
+    scan_parser.add_argument('sources', nargs='+')
+    dup_parser = sub.add_parser('duplicates', help='查找重复文件', parents=[common])
+    dup_parser.add_argument('directory')
+    dup_action = dup_parser.add_mutually_exclusive_group()
+    dup_action.add_argument('--delete', action='store_true', help='每组保留第一个文件，删除其余文件')
+    dup_action.add_argument('--link', action='store_true', help='每组保留第一个文件，其余替换为指向它的链接')
+    dup_parser.add_argument('--link-mode', choices=LINK_MODES, default='auto', help='链接方式（auto: 同盘硬链接，跨盘 reflink）')
+    dup_parser.add_argument('--verify', action='store_true', help='替换为链接之前逐字节比较')
+    org_parser = sub.add_parser('organize', help='按类别移动或复制文件', parents=[common])
+    org_parser.add_argument('sources', nargs='+')
+    org_parser.add_argument('--target', required=True)
+    org_parser.add_argument('--op', choices=['copy', 'move'], default='copy')
+    org_parser.add_argument('--fix-permissions', action='store_true', help='扫描时把源目录权限改为 777')
+    org_parser.add_argument('--min-free-mb', type=int, default=0, help='目标磁盘至少保留的剩余空间（MB）')
+    org_parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='使用 asyncio 流水线（适合延迟高的网络盘）')
+    org_parser.add_argument('--prune-empty', action='store_true',
+                            help='移动完成后删除因此变空的源目录（只检查本次移走文件所在的目录）')
+    org_parser.add_argument('--skip-duplicates', action='store_true', help='与 --async 一起使用：内容重复的文件留在原处')
+    plan_parser = sub.add_parser('plan', help='只生成整理计划（不移动/复制任何文件）', parents=[common])
+    plan_parser.add_argument('sources', nargs='+')
+    plan_parser.add_argument('--target', required=True)
+    plan_parser.add_argument('--op', choices=['copy', 'move'], default='copy')
+    plan_parser.add_argument('--out', help='把计划保存到文件，之后用 apply 执行')
+    plan_parser.add_argument('--min-free-mb', type=int, default=0, help='目标磁盘至少保留的剩余空间（MB）')
+    info_parser = sub.add_parser('plan-info', help='显示计划文件的汇总（只读取第一行）', parents=[common])
+    info_parser.add_argument('plan_file')
+    apply_parser = sub.add_parser('apply', help='执行保存的计划', parents=[common])
+    apply_parser.add_argument('plan_file')
+    apply_parser.add_argument('--min-free-mb', type=int, default=0, help='目标磁盘至少保留的剩余空间（MB）')
+    args = parser.parse_args(argv)
+
+    engine = OrganizerEngine(
+        args.profile,
+        update_text=None if args.json else print,
+        on_event=_print_event if args.json else None,
+        min_free_bytes=getattr(args, 'min_free_mb', 0) * 1024 * 1024)
+
+    if args.command == 'scan':
+        summary = engine.summarize(engine.scan(args.sources))
+        engine.emit('classify', categories=summary)
+        if not args.json:
+            for category, item in summary.items():
+                print(f"{category}: {item['files']} files, {item['bytes'] / 1024 / 1024:.1f} MB")
+        return 0
+
+    if args.command == 'duplicates':
+        duplicates = engine.find_duplicates(engine.scan([args.directory]))
+        if args.json:
+            engine.emit('duplicates', groups=duplicates)
+        else:
+            for digest, paths in duplicates.items():
+                print(f"Hash: {digest}")
+                for path in paths:
+                    print(f" - {path}")
+        if args.delete:
+            engine.delete_duplicates(duplicates)
+        elif args.link:
+            stats = engine.link_duplicates(duplicates, args.link_mode, args.verify)
+            return 1 if stats.failed or stats.mismatched else 0
+        return 0
+
+    if args.command == 'plan':
+        plan = engine.plan(args.sources, args.target, args.op)
+        shortfalls = plan.shortfalls(engine.space)
+        for path, needed, free in shortfalls:
+            engine.log(f"警告: {path} 所在磁盘可用 {free / 1024 / 1024:.1f} MB，需要 {needed / 1024 / 1024:.1f} MB")
+        if args.out:
+            plan.save(args.out)
+            engine.log(f"计划已保存到 {args.out}")
+        return 1 if shortfalls else 0
+
+    if args.command == 'plan-info':
+        summary = read_summary(args.plan_file)
+        if args.json:
+            engine.emit('plan', **summary)
+        else:
+            print(format_summary(summary))
+        return 0
+
+    if args.command == 'apply':
+        try:
+            result = engine.execute(OrganizePlan.load(args.plan_file))
+        except InsufficientSpaceError:
+            return 1  # 原因已经输出
+        engine.emit('done', succeeded=result.succeeded, failed=result.failed, bytes=result.bytes)
+        if not args.json:
+            print(f"完成：成功 {result.succeeded} 个，失败 {result.failed} 个，共 {result.bytes / 1024 / 1024:.1f} MB")
+        return 1 if result.failed else 0
+
+    if args.use_async:
+        from organizer_core.async_pipeline import AsyncPipeline  # async_pipeline 依赖本模块，在这里才导入
+        result = AsyncPipeline(engine, skip_duplicates=args.skip_duplicates).run(
+            args.sources, args.target, args.op, fix_permissions=args.fix_permissions)
+    else:
+        try:
+            result = engine.organize(args.sources, args.target, args.op, fix_permissions=args.fix_permissions)
+        except InsufficientSpaceError:
+            return 1
+    if args.prune_empty and result.moves:
+        engine.prune_empty_dirs(args.sources, touched=result.moves.sources)
+    if not args.json:
+        print(f"完成：成功 {result.succeeded} 个，失败 {result.failed} 个，共 {result.bytes / 1024 / 1024:.1f} MB")
+    return 1 if result.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
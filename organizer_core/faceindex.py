@@ -0,0 +1,352 @@
+"""
+持久化的人脸编码库。
+每张图片中人脸的 128 维编码只计算一次：
+    - encodings*.f32 -- 所有编码依次追加的 float32 原始数组，查询时以内存映射（np.memmap）打开；
+    - faces.sqlite3 -- 路径表，以 (st_dev, st_ino) 为键记录 size / mtime_ns、路径和该图片在数组中的行范围，
+      文件未变化时直接使用已有编码（包括“没有人脸”的结果），文件变化后重新编码，旧的行在 compact 时清除。
+查询时对整个矩阵做一次向量化的距离计算（|a - b|² = |a|² - 2a·b + |b|²，一次矩阵乘法），
+再按图片取最小距离；二十万张照片的库重新查询约 0.1 秒，不再逐张调用 face_recognition。
+
+依赖 numpy；编码新图片还需要 face_recognition。命令行:
+    python -m organizer_core.faceindex index DIR [DIR ...] [--workers N]
+    python -m organizer_core.faceindex query REFERENCE.jpg DIR [DIR ...] --threshold 0.6
+    python -m organizer_core.faceindex stats
+    python -m organizer_core.faceindex compact
+"""
+import argparse
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+
+import numpy as np
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'file_organization_tool', 'faces')
+DIMENSIONS = 128  # face_recognition 的编码维数
+ROW_BYTES = DIMENSIONS * 4
+DEFAULT_THRESHOLD = 0.6  # face_recognition 推荐的同一人距离阈值
+COMMIT_EVERY = 200  # 累计多少张图片后提交一次事务
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    first_row INTEGER NOT NULL,
+    face_count INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def encode_image(path):  # 检测并编码图片中的所有人脸，返回 (人脸数, 128) 的 float32 数组
+    from organizer_core.facepipeline import encode_file  # 只有编码新图片时才需要 face_recognition
+    return encode_file(path)
+
+
+def iter_images(directories, extensions=IMAGE_EXTENSIONS):  # 目录中的图片路径
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.lower().endswith(extensions):
+                    yield os.path.join(root, name)
+
+
+def _encode_one(encode, path):  # 与 FacePipeline.encode 相同的 (路径, 编码数组, 错误) 形式
+    try:
+        return path, encode(path), None
+    except Exception as e:  # 损坏的图片可能让解码库抛出各种异常
+        return path, None, e
+
+
+class _Snapshot:
+    """查询用的只读快照：有人脸的图片按行号排列，及每一行编码的平方范数"""
+
+    def __init__(self, rows, matrix):
+        self.keys = [(dev, ino) for dev, ino, _, _, _ in rows]
+        self.paths = [path for _, _, path, _, _ in rows]
+        self.starts = np.array([row[3] for row in rows], dtype=np.int64)
+        self.counts = np.array([row[4] for row in rows], dtype=np.int64)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.matrix = matrix
+        self.squared = np.einsum('ij,ij->i', matrix, matrix) if len(matrix) else np.empty(0, dtype=np.float32)
+
+
+# -------------------- 人脸编码库 --------------------
+class FaceIndex:
+    """线程安全；写入按批提交，查询使用内存中的快照，写入后自动失效"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get('ORGANIZER_FACE_INDEX') or DEFAULT_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, 'faces.sqlite3'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE name='data_file'").fetchone()
+        self.data_path = os.path.join(self.directory, row[0] if row else 'encodings.f32')  # compact 后换成新文件
+        self._pending = 0
+        self._snapshot = None
+
+    def lookup(self, path, st=None):  # 已编码且文件未变化时返回人脸数，否则返回 None
+        st = st or os.stat(path)
+        with self._lock:
+            row = self._conn.execute('SELECT size, mtime_ns, path, face_count FROM images WHERE dev=? AND ino=?',
+                                     (st.st_dev, st.st_ino)).fetchone()
+            if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+                return None
+            if row[2] != path:  # 文件被移动或改名（同一 inode），只更新路径
+                self._conn.execute('UPDATE images SET path=? WHERE dev=? AND ino=?', (path, st.st_dev, st.st_ino))
+                self._wrote()
+            return row[3]
+
+    def add(self, path, encodings, st=None):  # 保存一张图片的全部人脸编码（可以为空，表示没有人脸）
+        st = st or os.stat(path)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, DIMENSIONS)
+        with self._lock:
+            fd = os.open(self.data_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                size = os.fstat(fd).st_size
+                if size % ROW_BYTES:  # 上次写入中断留下的半行
+                    size -= size % ROW_BYTES
+                    os.ftruncate(fd, size)
+                os.lseek(fd, size, os.SEEK_SET)
+                data = encodings.tobytes()
+                while data:
+                    data = data[os.write(fd, data):]
+            finally:
+                os.close(fd)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO images (dev, ino, size, mtime_ns, path, first_row, face_count) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, path, size // ROW_BYTES, len(encodings)))
+            self._wrote()
+
+    def _wrote(self):  # 调用方需持有锁
+        self._snapshot = None
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def update(self, paths, encode=encode_image, update_text=None, pipeline=None):
+        """
+        确保每张图片都已编码：未变化的直接跳过，其余调用 encode(path) 后保存
+        pipeline 为 FacePipeline 时改由它在多个进程中成批编码（忽略 encode）
+        返回 {路径: 人脸数}，读取或编码失败的图片不在结果中（下次会重试）
+        """
+        counts = {}
+        missing = {}  # 需要编码的图片 -> stat 结果
+        for path in paths:
+            try:
+                st = os.stat(path)
+                count = self.lookup(path, st)
+            except OSError as e:
+                if update_text:
+                    update_text(f"无法访问图片 {path}: {e}")
+                continue
+            if count is None:
+                missing[path] = st
+            else:
+                counts[path] = count
+        results = pipeline.encode(missing) if pipeline else (_encode_one(encode, path) for path in missing)
+        encoded = 0
+        for path, encodings, error in results:
+            if error is not None:
+                if update_text:
+                    update_text(f"无法处理图片 {path}: {error}")
+                continue
+            self.add(path, encodings, missing[path])
+            counts[path] = len(encodings)
+            encoded += 1
+        self.flush()
+        if update_text:
+            update_text(f"共 {len(counts)} 张图片，新编码 {encoded} 张，其余使用已保存的编码")
+        return counts
+
+    # -------------------- 查询 --------------------
+    def _load(self):
+        with self._lock:
+            if self._snapshot is None:
+                rows = self._conn.execute('SELECT dev, ino, path, first_row, face_count FROM images '
+                                          'WHERE face_count > 0 ORDER BY first_row').fetchall()
+                total = os.path.getsize(self.data_path) // ROW_BYTES if os.path.exists(self.data_path) else 0
+                if total:
+                    matrix = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(total, DIMENSIONS))
+                else:
+                    matrix = np.empty((0, DIMENSIONS), dtype=np.float32)
+                self._snapshot = _Snapshot(rows, matrix)
+            return self._snapshot
+
+    def query(self, encodings, paths=None, threshold=None):
+        """
+        与 encodings（一个或多个参考人脸编码）比较，返回 [(路径, 最小距离), ...]，距离从小到大
+        paths 指定时只在这些图片（须已 update）中查找；threshold 指定时只返回距离不超过它的图片；
+        没有人脸的图片不在结果中
+        """
+        references = np.asarray(encodings, dtype=np.float32).reshape(-1, DIMENSIONS)
+        snapshot = self._load()
+        if paths is None:
+            selected = np.arange(len(snapshot.keys))
+        else:
+            selected = []
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                position = snapshot.positions.get((st.st_dev, st.st_ino))
+                if position is not None:
+                    selected.append(position)
+            selected = np.array(sorted(set(selected)), dtype=np.int64)
+        if not len(selected) or not len(references):
+            return []
+        # 所有行与所有参考编码的距离：一次矩阵乘法
+        squared = (snapshot.squared[:, None] - 2.0 * (snapshot.matrix @ references.T)
+                   + np.einsum('ij,ij->i', references, references)[None, :])
+        distances = np.sqrt(np.maximum(squared.min(axis=1), 0.0))
+        # 每张图片取其所有人脸中的最小距离（同一图片的行是连续的）
+        starts, counts = snapshot.starts[selected], snapshot.counts[selected]
+        offsets = np.cumsum(counts) - counts
+        rows = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+        best = np.minimum.reduceat(distances[rows], offsets)
+        if threshold is not None:
+            keep = best <= threshold
+            selected, best = selected[keep], best[keep]
+        order = np.argsort(best, kind='stable')
+        return list(zip(map(snapshot.paths.__getitem__, selected[order].tolist()), best[order].tolist()))
+
+    # -------------------- 维护 --------------------
+    def stats(self):
+        with self._lock:
+            images, faces, no_face = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(face_count), 0), COALESCE(SUM(face_count = 0), 0) FROM images').fetchone()
+        rows = os.path.getsize(self.data_path) // ROW_BYTES if os.path.exists(self.data_path) else 0
+        return {'images': images, 'faces': faces, 'no_face': no_face, 'rows': rows, 'stale_rows': rows - faces}
+
+    def compact(self, prune_missing=True):  # 删除已不存在的图片，重写编码数组去掉失效的行，返回删除的行数
+        with self._lock:
+            if prune_missing:
+                missing = []
+                for dev, ino, size, mtime_ns, path in self._conn.execute(
+                        'SELECT dev, ino, size, mtime_ns, path FROM images'):
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        missing.append((dev, ino))
+                        continue
+                    if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                        missing.append((dev, ino))
+                self._conn.executemany('DELETE FROM images WHERE dev=? AND ino=?', missing)
+            rows = self._conn.execute('SELECT dev, ino, first_row, face_count FROM images ORDER BY first_row').fetchall()
+            total = os.path.getsize(self.data_path) // ROW_BYTES if os.path.exists(self.data_path) else 0
+            # 写入新文件，新文件名与新的行号在同一个事务中提交：中途失败时仍使用旧文件和旧行号
+            name = f"encodings-{uuid.uuid4().hex[:8]}.f32"
+            new_path = os.path.join(self.directory, name)
+            written = 0
+            with open(new_path, 'wb') as out:
+                if total:
+                    matrix = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(total, DIMENSIONS))
+                    for dev, ino, first_row, count in rows:
+                        out.write(matrix[first_row:first_row + count].tobytes())
+                        self._conn.execute('UPDATE images SET first_row=? WHERE dev=? AND ino=?', (written, dev, ino))
+                        written += count
+                    del matrix
+                out.flush()
+                os.fsync(out.fileno())
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('data_file', ?)", (name,))
+            self._conn.commit()
+            self._pending = 0
+            self._snapshot = None
+            old_path, self.data_path = self.data_path, new_path
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass  # Windows 上仍被映射的旧文件删不掉，不影响使用
+        return total - written
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+
+# -------------------- 全局默认库 --------------------
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index():  # 各脚本共享的编码库实例，进程退出时自动提交
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = FaceIndex()
+            atexit.register(_default_index.close)
+        return _default_index
+
+
+# -------------------- 命令行 --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人脸编码库')
+    parser.add_argument('--dir', help=f'编码库目录（默认 {DEFAULT_DIR}）')
+    sub = parser.add_subparsers(dest='command', required=True)
+    index_parser = sub.add_parser('index', help='编码目录中尚未编码或已变化的图片')
+    index_parser.add_argument('directories', nargs='+')
+    query_parser = sub.add_parser('query', help='查找与参考图片中的人脸相似的图片')
+    query_parser.add_argument('reference')
+    query_parser.add_argument('directories', nargs='+')
+    query_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='最大距离')
+    for command_parser in (index_parser, query_parser):
+        command_parser.add_argument('--workers', type=int, help='编码进程数（默认 CPU 核数）')
+    sub.add_parser('stats', help='显示图片数、人脸数和失效行数')
+    sub.add_parser('compact', help='清除已删除/已变化图片的编码')
+    args = parser.parse_args(argv)
+
+    index = FaceIndex(args.dir)
+    try:
+        if args.command == 'index':
+            from organizer_core.facepipeline import FacePipeline
+            with FacePipeline(args.workers) as pipeline:
+                index.update(iter_images(args.directories), update_text=print, pipeline=pipeline)
+        elif args.command == 'query':
+            from organizer_core.facepipeline import FacePipeline
+            references = encode_image(args.reference)
+            if not len(references):
+                print(f"参考图片中未检测到人脸: {args.reference}")
+                return 1
+            paths = list(iter_images(args.directories))
+            with FacePipeline(args.workers) as pipeline:
+                index.update(paths, update_text=print, pipeline=pipeline)
+            for path, distance in index.query(references, paths, args.threshold):
+                print(f"{distance:.4f}  {path}")
+        elif args.command == 'stats':
+            info = index.stats()
+            print(f"编码库目录: {index.directory}")
+            print(f"图片: {info['images']}（无人脸 {info['no_face']}）  人脸: {info['faces']}  失效行: {info['stale_rows']}")
+        elif args.command == 'compact':
+            print(f"已清除 {index.compact()} 行失效编码")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+尽量不经过用户态缓冲区的文件复制/移动，用法与 shutil.copy2 / shutil.move 相同。
+复制依次尝试:
+    1. reflink（FICLONE，btrfs / XFS 等写时复制文件系统上几乎瞬间完成，不占额外空间）
+    2. os.copy_file_range（数据在内核内复制，部分 NFS/SMB 还能在服务端完成）
+    3. os.sendfile
+    4. 大缓冲区 readinto / write 循环
+完成后像 copy2 一样复制权限和时间戳。
+移动时源和目标在同一文件系统上只改目录项（rename，不读写数据）；
+跨设备时复制 -> fsync -> 删除源文件，中途出错源文件保持不动。
+"""
+import ctypes
+import errno
+import os
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+COPY_CHUNK = 1 << 30  # copy_file_range / sendfile 单次调用的最大字节数
+BUFFER_SIZE = 4 * 1024 * 1024  # 最后一种方式的读写缓冲区大小
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1  # linux/fs.h
+
+# 这些错误表示"当前方式不适用"，换下一种方式即可
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EBADF,
+                getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)}
+
+_buffers = threading.local()
+
+
+# -------------------- 各种复制方式 --------------------
+def _try_reflink(src_fd, dst_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+
+
+def _copy_range(src_fd, dst_fd, size, offset):  # 返回复制后的偏移；不支持时原样返回
+    if not hasattr(os, 'copy_file_range'):
+        return offset
+    while offset < size:
+        try:
+            copied = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - offset), offset, offset)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                return offset
+            raise
+        if copied == 0:  # 某些文件系统不报错但也不复制，交给下一种方式
+            return offset
+        offset += copied
+    return offset
+
+
+def _sendfile(src_fd, dst_fd, size, offset):
+    if not hasattr(os, 'sendfile') or os.name == 'nt':
+        return offset
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < size:
+        try:
+            sent = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK, size - offset))
+        except OSError as e:
+            if e.errno in _UNSUPPORTED:
+                return offset
+            raise
+        if sent == 0:
+            return offset
+        offset += sent
+    return offset
+
+
+def _read_write(src_fd, dst_fd, offset, progress=None):  # 复制到文件末尾（不依赖事先取得的大小）
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as reader:
+        while True:
+            count = reader.readinto(view)
+            if not count:
+                return offset
+            written = 0
+            while written < count:
+                written += os.write(dst_fd, view[written:count])
+            offset += count
+            if progress:
+                progress(count)
+
+
+# -------------------- 对外接口 --------------------
+def copy_file(src, dst, progress=None, fsync=False):
+    """
+    复制文件内容和元数据，返回目标路径（dst 为目录时复制到其中，与 shutil.copy2 一致）
+    参数:
+        progress -- 可选，每复制一段数据调用 progress(本次字节数)
+        fsync    -- 为 True 时在关闭前把数据刷到磁盘
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} 和 {dst!r} 是同一个文件")
+
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            if size and _try_reflink(src_fd, dst_fd):
+                offset = size
+                if progress:
+                    progress(size)
+            else:
+                offset = 0
+                for method in (_copy_range, _sendfile):
+                    new_offset = method(src_fd, dst_fd, size, offset)
+                    if progress and new_offset > offset:
+                        progress(new_offset - offset)
+                    offset = new_offset
+                    if offset >= size:
+                        break
+                # 剩余部分（或以上方式都不可用时的全部内容）用缓冲区复制；
+                # 即使已达到 stat 得到的大小也读一次，以免漏掉复制期间追加的数据
+                _read_write(src_fd, dst_fd, offset, progress)
+            if fsync:
+                os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+    return dst
+
+
+def reflink_file(src, dst):  # 以 reflink 方式创建 dst（与 src 共享数据块），dst 已存在或文件系统不支持时抛出 OSError
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        cloned = False
+        try:
+            cloned = _try_reflink(src_fd, dst_fd)
+        finally:
+            os.close(dst_fd)
+            if not cloned:
+                os.remove(dst)  # 不留下空文件
+        if not cloned:
+            unsupported = getattr(errno, 'EOPNOTSUPP', errno.EINVAL)
+            raise OSError(unsupported, "文件系统不支持 reflink", dst)
+    finally:
+        os.close(src_fd)
+    return dst
+
+
+# -------------------- 移动 --------------------
+def _load_renameat2():
+    try:
+        func = ctypes.CDLL(None, use_errno=True).renameat2  # glibc >= 2.28
+    except (AttributeError, OSError, TypeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return func
+
+
+_renameat2 = _load_renameat2() if os.name == 'posix' else None
+
+
+def rename_noreplace(src, dst):  # 原子地重命名，dst 已存在时抛出 FileExistsError 而不是覆盖
+    if os.name == 'nt':
+        os.rename(src, dst)  # Windows 的 rename 本身不覆盖已有文件
+        return
+    if _renameat2 is not None:
+        if _renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err not in (errno.EINVAL, errno.ENOSYS):  # 文件系统不支持该标志时改用下面的方式
+            raise OSError(err, os.strerror(err), src, None, dst)
+    try:
+        os.link(src, dst)  # 硬链接同样在目标已存在时失败
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            raise
+        if os.path.lexists(dst):  # 不支持硬链接的文件系统（FAT、部分网络盘）
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst) from None
+        os.rename(src, dst)
+    else:
+        os.unlink(src)
+
+
+class MoveStats:
+    """一轮移动操作的统计：多少文件只改了目录项，多少文件跨设备复制"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.renamed = 0  # 同一文件系统内 rename，不读写数据
+        self.copied = 0  # 跨设备复制后删除源文件
+        self.bytes_copied = 0
+        self.sources = []  # 已移走的源文件路径（移动日志），用于事后只清理本次变空的源目录
+
+    def record(self, renamed, size=0, src=None):
+        with self._lock:
+            if src is not None:
+                self.sources.append(src)
+            if renamed:
+                self.renamed += 1
+            else:
+                self.copied += 1
+                self.bytes_copied += size
+
+    def summary(self):
+        total = self.renamed + self.copied
+        return (f"移动 {total} 个文件：{self.renamed} 个仅修改目录项（同一文件系统），"
+                f"{self.copied} 个跨设备复制后删除（{self.bytes_copied / 1024 / 1024:.1f} MB）")
+
+
+def _fsync_dir(directory):
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # 部分文件系统不支持对目录 fsync
+    finally:
+        os.close(fd)
+
+
+def move_file(src, dst, claimed=False, stats=None, src_dev=None):
+    """
+    移动文件，返回目标路径
+    参数:
+        claimed -- dst 是 organizer_core.naming 认领的空占位文件，可以直接覆盖；否则目标已存在时抛出 FileExistsError
+        stats   -- 可选的 MoveStats，记录本次移动是否只改了目录项
+        src_dev -- 源文件的 st_dev（扫描时已取得的直接传入，省一次 stat）
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    src_stat = os.stat(src)
+    if src_dev is None:
+        src_dev = src_stat.st_dev
+    dest_dir = os.path.dirname(os.path.abspath(dst))
+    if src_dev == os.stat(dest_dir).st_dev:
+        try:
+            if claimed:
+                os.replace(src, dst)
+            else:
+                rename_noreplace(src, dst)
+            if stats:
+                stats.record(True, src=src)
+            return dst
+        except OSError as e:
+            if e.errno != errno.EXDEV:  # 同一文件系统的不同挂载点（bind mount）仍需复制
+                raise
+
+    if not claimed:
+        os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))  # 先占住目标名，已存在时抛出 FileExistsError
+    try:
+        copy_file(src, dst, fsync=True)
+    except BaseException:
+        try:
+            os.remove(dst)  # 目标（包括占位文件）是本次创建的，删除复制了一半的内容，源文件保持不动
+        except OSError:
+            pass
+        raise
+    _fsync_dir(dest_dir)  # 确认新目录项已落盘后才删除源文件
+    os.unlink(src)
+    if stats:
+        stats.record(False, src_stat.st_size, src)
+    return dst
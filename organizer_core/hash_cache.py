@@ -0,0 +1,209 @@
+"""
+持久化文件哈希缓存（SQLite）。
+以 (st_dev, st_ino, 算法) 为键保存哈希值，并记录 size / mtime_ns，
+文件未变化时直接返回缓存结果，不再读取文件内容。
+
+命令行:
+    python -m organizer_core.hash_cache stats
+    python -m organizer_core.hash_cache prune --max-age-days 30 --max-entries 1000000
+"""
+import argparse
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'file_organization_tool', 'hash_cache.sqlite3')
+COMMIT_EVERY = 500  # 累计多少次写入后提交一次事务
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    path TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (dev, ino, algorithm)
+);
+CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+# -------------------- 哈希缓存 --------------------
+class HashCache:
+    """线程安全的哈希缓存，写入和命中时间的更新都按批提交。"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get('ORGANIZER_HASH_CACHE') or DEFAULT_DB_PATH
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._pending = 0  # 尚未提交的写入数
+        self._touched = []  # 命中的条目，稍后批量更新 last_used
+        self.hits = 0  # 本次运行的命中数
+        self.misses = 0  # 本次运行的未命中数
+
+    def lookup(self, path, algorithm, st=None):  # 查询缓存，文件已变化或不存在记录时返回 None
+        st = st or os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT size, mtime_ns, digest FROM hashes WHERE dev=? AND ino=? AND algorithm=?',
+                (st.st_dev, st.st_ino, algorithm)).fetchone()
+            if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                self.hits += 1
+                self._touched.append((time.time(), st.st_dev, st.st_ino, algorithm))
+                self._maybe_commit()
+                return row[2]
+            self.misses += 1
+            return None
+
+    def store(self, path, algorithm, digest, st=None):  # 写入（或覆盖）一条缓存记录
+        st = st or os.stat(path)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO hashes (dev, ino, algorithm, size, mtime_ns, digest, path, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (st.st_dev, st.st_ino, algorithm, st.st_size, st.st_mtime_ns, digest,
+                 os.path.abspath(path), time.time()))
+            self._pending += 1
+            self._maybe_commit()
+
+    def get_or_compute(self, path, algorithm, compute):  # 命中则直接返回，否则调用 compute(path) 并写入缓存
+        st = os.stat(path)
+        digest = self.lookup(path, algorithm, st)
+        if digest is None:
+            digest = compute(path)
+            # 计算期间文件被修改时不写入缓存，避免缓存错误的哈希
+            after = os.stat(path)
+            if after.st_size == st.st_size and after.st_mtime_ns == st.st_mtime_ns:
+                self.store(path, algorithm, digest, st)
+        return digest
+
+    def _maybe_commit(self):  # 调用方需持有锁
+        if self._pending + len(self._touched) >= COMMIT_EVERY:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE hashes SET last_used=? WHERE dev=? AND ino=? AND algorithm=?', self._touched)
+            self._touched = []
+        for name, value in (('hits', self.hits), ('misses', self.misses)):
+            self._conn.execute(
+                'INSERT INTO counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, value))
+        self.hits = self.misses = 0  # 已累加进数据库
+        self._conn.commit()
+        self._pending = 0
+
+    def flush(self):  # 提交所有未写入的数据
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_locked()
+            self._conn.close()
+            self._conn = None
+
+    # -------------------- 清理与统计 --------------------
+    def prune(self, max_age_days=None, max_entries=None):  # 删除失效、过期及超出数量上限的记录，返回删除条数
+        removed = 0
+        with self._lock:
+            self._flush_locked()
+            stale = []
+            for dev, ino, algorithm, size, mtime_ns, path in self._conn.execute(
+                    'SELECT dev, ino, algorithm, size, mtime_ns, path FROM hashes'):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    stale.append((dev, ino, algorithm))
+                    continue
+                if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                    stale.append((dev, ino, algorithm))
+            self._conn.executemany('DELETE FROM hashes WHERE dev=? AND ino=? AND algorithm=?', stale)
+            removed += len(stale)
+            if max_age_days is not None:
+                cursor = self._conn.execute(
+                    'DELETE FROM hashes WHERE last_used < ?', (time.time() - max_age_days * 86400,))
+                removed += cursor.rowcount
+            if max_entries is not None:
+                cursor = self._conn.execute(
+                    'DELETE FROM hashes WHERE rowid NOT IN '
+                    '(SELECT rowid FROM hashes ORDER BY last_used DESC LIMIT ?)', (max_entries,))
+                removed += cursor.rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self):  # 返回累计命中率等统计信息
+        with self._lock:
+            self._flush_locked()
+            counters = dict(self._conn.execute('SELECT name, value FROM counters'))
+            entries = self._conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+
+# -------------------- 全局默认缓存 --------------------
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():  # 各脚本共享的缓存实例，进程退出时自动提交
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HashCache()
+            atexit.register(_default_cache.close)
+        return _default_cache
+
+
+# -------------------- 命令行入口 --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='文件哈希缓存管理')
+    parser.add_argument('--db', help=f'缓存数据库路径（默认 {DEFAULT_DB_PATH}）')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help='显示缓存条目数和命中率')
+    prune_parser = sub.add_parser('prune', help='清理已不存在或已变化文件的记录')
+    prune_parser.add_argument('--max-age-days', type=float, help='删除超过指定天数未使用的记录')
+    prune_parser.add_argument('--max-entries', type=int, help='最多保留的记录数（按最近使用保留）')
+    args = parser.parse_args(argv)
+
+    cache = HashCache(args.db)
+    try:
+        if args.command == 'stats':
+            info = cache.stats()
+            print(f"缓存文件: {cache.db_path}")
+            print(f"记录数: {info['entries']}")
+            print(f"命中: {info['hits']}  未命中: {info['misses']}  命中率: {info['hit_rate']:.1%}")
+        elif args.command == 'prune':
+            removed = cache.prune(args.max_age_days, args.max_entries)
+            print(f"已删除 {removed} 条记录。")
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+统一的文件哈希模块。
+所有去重/迁移工具都通过这里计算文件哈希，算法与读取块大小可配置：
+    ORGANIZER_HASH_ALGORITHM  -- 默认算法（默认 blake2b）
+    ORGANIZER_HASH_CHUNK_SIZE -- 每次读取的字节数（默认 1 MiB）
+
+安装了 xxhash 时可额外选择 xxh64 / xxh3_64 / xxh3_128（非加密哈希，速度最快）。
+
+本机基准测试（输出各算法、各块大小下的 MB/s）:
+    python -m organizer_core.hashing benchmark --size 512 --dir /mnt/data
+检查哈希超大文件时的内存峰值（生成稀疏文件，超过上限时返回非零退出码）:
+    python -m organizer_core.hashing memcheck --size-gb 4 --limit-mb 64
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import xxhash  # 可选依赖
+except ImportError:
+    xxhash = None
+
+# -------------------- 算法注册表 --------------------
+ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+    'blake2s': hashlib.blake2s,
+}
+if xxhash is not None:
+    ALGORITHMS.update({
+        'xxh64': xxhash.xxh64,
+        'xxh3_64': xxhash.xxh3_64,
+        'xxh3_128': xxhash.xxh3_128,
+    })
+
+DEFAULT_ALGORITHM = os.environ.get('ORGANIZER_HASH_ALGORITHM', 'blake2b')
+DEFAULT_CHUNK_SIZE = int(os.environ.get('ORGANIZER_HASH_CHUNK_SIZE', 1024 * 1024))
+
+
+def new_hasher(algorithm=None):  # 按名称创建哈希对象
+    algorithm = algorithm or DEFAULT_ALGORITHM
+    try:
+        return ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"不支持的哈希算法: {algorithm}（可选: {', '.join(sorted(ALGORITHMS))}）") from None
+
+
+# -------------------- 文件哈希 --------------------
+_buffers = threading.local()  # 每个线程复用一块读缓冲区
+
+
+def _get_buffer(chunk_size):  # 取得当前线程的缓冲区，大小不够时才重新分配
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < chunk_size:
+        buffer = _buffers.buffer = bytearray(chunk_size)
+    return memoryview(buffer)[:chunk_size]
+
+
+def hash_file(path, algorithm=None, chunk_size=None):  # 流式计算整个文件的哈希，内存占用与文件大小无关
+    hasher = new_hasher(algorithm)
+    view = _get_buffer(chunk_size or DEFAULT_CHUNK_SIZE)
+    # buffering=0 直接用 readinto 读进复用的缓冲区，每个块都不产生新的 bytes 对象
+    with open(path, 'rb', buffering=0) as file:
+        while True:
+            count = file.readinto(view)
+            if not count:
+                break
+            hasher.update(view[:count])
+    return hasher.hexdigest()
+
+
+def cached_hash_file(path, algorithm=None, chunk_size=None):  # 同 hash_file，但未变化的文件直接取持久化缓存
+    from organizer_core.hash_cache import get_default_cache
+    algorithm = algorithm or DEFAULT_ALGORITHM
+    return get_default_cache().get_or_compute(path, algorithm, lambda p: hash_file(p, algorithm, chunk_size))
+
+
+PARTIAL_HASH_SIZE = 4096  # 部分哈希时文件头、尾各读取的字节数
+
+
+def partial_hash_file(path, algorithm=None):  # 只读取文件头尾计算哈希；不超过 2 * PARTIAL_HASH_SIZE 的小文件结果等于完整哈希
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as file:
+        head = file.read(PARTIAL_HASH_SIZE * 2 + 1)
+        if len(head) <= PARTIAL_HASH_SIZE * 2:  # 小文件直接读完
+            hasher.update(head)
+        else:
+            hasher.update(head[:PARTIAL_HASH_SIZE])  # 文件头
+            file.seek(-PARTIAL_HASH_SIZE, os.SEEK_END)  # 跳到文件尾
+            hasher.update(file.read(PARTIAL_HASH_SIZE))  # 文件尾
+    return hasher.hexdigest()
+
+
+def cached_partial_hash_file(path, algorithm=None):  # 同 partial_hash_file，结果同样写入持久化缓存
+    from organizer_core.hash_cache import get_default_cache
+    algorithm = algorithm or DEFAULT_ALGORITHM
+    return get_default_cache().get_or_compute(
+        path, f"{algorithm}-partial{PARTIAL_HASH_SIZE}", lambda p: partial_hash_file(p, algorithm))
+
+
+# -------------------- 基准测试 --------------------
+def _parse_size(text):  # 解析 64K / 1M 之类的大小
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _drop_page_cache(path):  # 尽量把文件从页缓存中清出，使测试真正读取磁盘（仅 Linux 等支持 fadvise 的系统）
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def benchmark(path, algorithms, chunk_sizes, repeat=3, cold=True):  # 返回 [(算法, 块大小, MB/s), ...]，每组取最快的一次
+    size = os.path.getsize(path)
+    if not cold:
+        hash_file(path, 'md5', DEFAULT_CHUNK_SIZE)  # 预热一次，让各组都从相同的缓存状态开始
+    results = []
+    for algorithm in algorithms:
+        for chunk_size in chunk_sizes:
+            best = None
+            for _ in range(repeat):
+                if cold:
+                    _drop_page_cache(path)
+                start = time.perf_counter()
+                hash_file(path, algorithm, chunk_size)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results.append((algorithm, chunk_size, size / (1024 * 1024) / max(best, 1e-9)))
+    return results
+
+
+def peak_rss_mb():  # 当前进程的内存峰值（MB），不支持的平台返回 None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # macOS 单位为字节，Linux 为 KB
+
+
+def memcheck(directory, size_gb, limit_mb, algorithm=None, chunk_size=None):  # 哈希一个稀疏大文件，返回 (峰值增量 MB, 是否在上限内)
+    fd, path = tempfile.mkstemp(prefix='hash_memcheck_', dir=directory)
+    try:
+        os.ftruncate(fd, int(size_gb * 1024 ** 3))  # 稀疏文件，不占用实际磁盘空间
+        os.close(fd)
+        before = peak_rss_mb()
+        hash_file(path, algorithm, chunk_size)
+        after = peak_rss_mb()
+    finally:
+        os.remove(path)
+    if before is None:
+        return None, True
+    growth = after - before
+    return growth, growth <= limit_mb
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='文件哈希工具')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    hash_parser = sub.add_parser('hash', help='计算文件哈希')
+    hash_parser.add_argument('paths', nargs='+')
+    hash_parser.add_argument('--algorithm', default=DEFAULT_ALGORITHM, choices=sorted(ALGORITHMS))
+    hash_parser.add_argument('--chunk-size', default=str(DEFAULT_CHUNK_SIZE))
+
+    bench_parser = sub.add_parser('benchmark', help='测试各算法和块大小在本机磁盘上的吞吐量')
+    bench_parser.add_argument('--file', help='用已有文件测试；不指定时在 --dir 下生成临时文件')
+    bench_parser.add_argument('--dir', default='.', help='生成临时测试文件的目录（应位于待测磁盘上）')
+    bench_parser.add_argument('--size', type=int, default=256, help='临时测试文件大小（MB）')
+    bench_parser.add_argument('--algorithms', default=','.join(sorted(ALGORITHMS)))
+    bench_parser.add_argument('--chunk-sizes', default='64K,256K,1M,4M')
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    bench_parser.add_argument('--warm', action='store_true', help='不清除页缓存，只测试哈希计算本身的速度')
+
+    mem_parser = sub.add_parser('memcheck', help='哈希一个稀疏大文件并检查内存峰值')
+    mem_parser.add_argument('--dir', default='.', help='生成稀疏文件的目录')
+    mem_parser.add_argument('--size-gb', type=float, default=4)
+    mem_parser.add_argument('--limit-mb', type=float, default=64, help='允许的内存峰值增量（MB）')
+    mem_parser.add_argument('--algorithm', default=DEFAULT_ALGORITHM, choices=sorted(ALGORITHMS))
+    args = parser.parse_args(argv)
+
+    if args.command == 'memcheck':
+        growth, ok = memcheck(args.dir, args.size_gb, args.limit_mb, args.algorithm)
+        if growth is None:
+            print("当前平台无法读取内存峰值。")
+            return
+        print(f"哈希 {args.size_gb:g} GB 稀疏文件，内存峰值增加 {growth:.1f} MB（上限 {args.limit_mb:g} MB）")
+        if not ok:
+            sys.exit(1)
+        return
+
+    if args.command == 'hash':
+        for path in args.paths:
+            print(f"{hash_file(path, args.algorithm, _parse_size(args.chunk_size))}  {path}")
+        return
+
+    algorithms = [name.strip() for name in args.algorithms.split(',') if name.strip()]
+    for name in algorithms:
+        new_hasher(name)  # 提前校验算法名
+    chunk_sizes = [_parse_size(text) for text in args.chunk_sizes.split(',') if text.strip()]
+    temp_path = None
+    path = args.file
+    if path is None:
+        fd, temp_path = tempfile.mkstemp(prefix='hash_bench_', dir=args.dir)
+        with os.fdopen(fd, 'wb') as file:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size):
+                file.write(block)
+        path = temp_path
+    try:
+        print(f"测试文件: {path} ({os.path.getsize(path) / (1024 * 1024):.0f} MB)")
+        print(f"{'algorithm':<10}{'chunk':>10}{'MB/s':>12}")
+        for algorithm, chunk_size, speed in benchmark(path, algorithms, chunk_sizes, args.repeat, cold=not args.warm):
+            print(f"{algorithm:<10}{chunk_size // 1024:>9}K{speed:>12.1f}")
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+快速校验图片文件是否完整，不解码图像。
+只读取文件开头 HEAD_SIZE 和结尾 TAIL_SIZE 字节（读入每个线程复用的缓冲区），检查：
+    - 文件签名与格式头（JPEG / PNG / GIF / BMP / TIFF / WebP），宽高等关键字段是否合理；
+    - 文件尾：PNG 的 IEND、GIF 的结束符，BMP / WebP 头中声明的大小不超过实际大小 —— 能发现传输中断造成的截断文件；
+    - JPEG 从 SOI 逐段走到 SOS，SOS 之后任意位置出现 EOI 即可（允许动态照片、MPF 多图等在 EOI 之后附加数据）：
+      先在文件尾查找，找不到时才从 SOS 向后扫描。
+deep 模式在此基础上再用 Pillow 的 verify() 完整检查（较慢，需要 Pillow）。
+ImageValidator 在进程池中校验，结果按 (设备, inode, 大小, mtime) 缓存在哈希缓存中，文件未变化时不再读取。
+
+命令行（列出无效的图片）:
+    python -m organizer_core.imagecheck DIR [DIR ...] [--deep]
+"""
+import argparse
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from organizer_core.hash_cache import get_default_cache
+from organizer_core.scanner import scan_tree
+
+HEAD_SIZE = 4096  # 读取的文件头字节数
+TAIL_SIZE = 1024  # 读取的文件尾字节数
+SCAN_CHUNK = 64 * 1024  # JPEG 的 EOI 不在文件尾时，向后扫描每次读取的字节数
+CACHE_KEY = 'image-check-v2'  # 哈希缓存中的"算法"名（v1 会把带附加数据的 JPEG 判为无效）
+DEEP_CACHE_KEY = 'image-check-deep-v2'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+
+_BMP_HEADER_SIZES = {12, 40, 52, 56, 64, 108, 124}  # 各版本 BMP 信息头的长度
+_TIFF_EXTENT_TAGS = {273: 'offset', 279: 'length', 324: 'offset', 325: 'length'}  # StripOffsets/ByteCounts、TileOffsets/ByteCounts
+_local = threading.local()
+
+
+def _buffer():  # 每个线程（进程）复用的读取缓冲区
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray(HEAD_SIZE + TAIL_SIZE)
+    return buffer
+
+
+# -------------------- 各格式的检查 --------------------
+def _read_at(buffer, head, file, position, length):  # 文件中 position 处的 length 字节，已在文件头缓冲区内时不再读取
+    if position + length <= head:
+        return bytes(buffer[position:position + length])
+    file.seek(position)
+    return file.read(length)
+
+
+def _check_jpeg(buffer, head, tail_start, tail_end, size, file):
+    position = 2  # 跳过 SOI
+    while True:  # 逐段走到 SOS（第一个扫描段）
+        marker = _read_at(buffer, head, file, position, 4)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return False
+        kind = marker[1]
+        if kind == 0xFF:  # 填充字节
+            position += 1
+            continue
+        if kind == 0x01 or 0xD0 <= kind <= 0xD7:  # 没有长度字段的标记
+            position += 2
+            continue
+        if kind == 0xD9 or len(marker) < 4:  # SOS 之前就结束了
+            return False
+        (length,) = struct.unpack_from('>H', marker, 2)
+        if length < 2:
+            return False
+        position += 2 + length
+        if kind == 0xDA:
+            break
+        if position >= size:
+            return False
+    if position >= size:
+        return False
+    # 扫描数据中的 0xFF 后面只会跟 0x00 或 RST，SOS 之后第一次出现的 FFD9 就是 EOI
+    tail_offset = size - (tail_end - tail_start)  # buffer[tail_start] 在文件中的位置
+    start = tail_start + max(0, position - tail_offset)
+    if start < tail_end and buffer.find(b'\xff\xd9', start, tail_end) != -1:
+        return True
+    file.seek(position)
+    previous = b''
+    while True:
+        chunk = file.read(SCAN_CHUNK)
+        if not chunk:
+            return False
+        if (previous + chunk[:1]) == b'\xff\xd9' or chunk.find(b'\xff\xd9') != -1:
+            return True
+        previous = chunk[-1:]
+
+
+def _check_png(buffer, head, tail_start, tail_end, size, file):
+    if head < 33:
+        return False
+    length, chunk_type, width, height = struct.unpack_from('>I4sII', buffer, 8)
+    return (length == 13 and chunk_type == b'IHDR' and width > 0 and height > 0
+            and buffer.find(b'IEND', tail_start, tail_end) != -1)
+
+
+def _check_gif(buffer, head, tail_start, tail_end, size, file):
+    if head < 10:
+        return False
+    width, height = struct.unpack_from('<HH', buffer, 6)
+    end = tail_end
+    while end > tail_start and buffer[end - 1] == 0:  # 忽略末尾的填充字节
+        end -= 1
+    return width > 0 and height > 0 and end > tail_start and buffer[end - 1] == 0x3B
+
+
+def _check_bmp(buffer, head, tail_start, tail_end, size, file):
+    if head < 26:
+        return False
+    declared, _, offset, header_size = struct.unpack_from('<IIII', buffer, 2)
+    if header_size not in _BMP_HEADER_SIZES or not 14 + header_size <= offset < size or declared > size:
+        return False
+    if header_size == 12:
+        width, height = struct.unpack_from('<HH', buffer, 18)
+    else:
+        width, height = struct.unpack_from('<ii', buffer, 18)
+    return width > 0 and height != 0
+
+
+def _check_tiff(buffer, head, tail_start, tail_end, size, file):
+    if head < 8:
+        return False
+    order = '<' if buffer[:2] == b'II' else '>'
+    (offset,) = struct.unpack_from(order + 'I', buffer, 4)
+    if not 8 <= offset <= size - 2:
+        return False
+    if offset + 2 > head:  # 第一个 IFD 不在已读取的范围内，只能检查到这里
+        return True
+    (entries,) = struct.unpack_from(order + 'H', buffer, offset)
+    if not entries or offset + 2 + entries * 12 > size:
+        return False
+    # TIFF 没有文件尾标记：用最后一个条带（或图块）的 偏移 + 长度 判断数据是否完整
+    last = {}
+    for position in range(offset + 2, min(offset + 2 + entries * 12, head - 11), 12):
+        tag, kind, count = struct.unpack_from(order + 'HHI', buffer, position)
+        if tag in _TIFF_EXTENT_TAGS and kind in (3, 4) and count:
+            width = 2 if kind == 3 else 4
+            value_at = position + 8 if count * width <= 4 else struct.unpack_from(order + 'I', buffer, position + 8)[0]
+            value_at += (count - 1) * width
+            if value_at + width <= head:
+                last[_TIFF_EXTENT_TAGS[tag]] = struct.unpack_from(order + ('H' if kind == 3 else 'I'), buffer, value_at)[0]
+    if 'offset' in last and 'length' in last:
+        return last['offset'] + last['length'] <= size
+    return True
+
+
+def _check_webp(buffer, head, tail_start, tail_end, size, file):
+    if head < 16:
+        return False
+    (riff_size,) = struct.unpack_from('<I', buffer, 4)
+    return riff_size + 8 <= size
+
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', _check_jpeg),
+    (b'\x89PNG\r\n\x1a\n', _check_png),
+    (b'GIF87a', _check_gif),
+    (b'GIF89a', _check_gif),
+    (b'BM', _check_bmp),
+    (b'II*\x00', _check_tiff),
+    (b'MM\x00*', _check_tiff),
+)
+
+
+# -------------------- 单个文件 --------------------
+def check_header(path):
+    """只读文件头和文件尾判断图片是否完整；签名未知或读取失败时返回 False"""
+    buffer = _buffer()
+    try:
+        with open(path, 'rb', buffering=0) as file:  # 检查期间保持打开：JPEG 可能需要继续读取
+            size = os.fstat(file.fileno()).st_size
+            with memoryview(buffer) as view:
+                head = file.readinto(view[:HEAD_SIZE])
+                if size > HEAD_SIZE:
+                    file.seek(max(HEAD_SIZE, size - TAIL_SIZE))
+                    tail_start = HEAD_SIZE
+                    tail_end = HEAD_SIZE + file.readinto(view[HEAD_SIZE:])
+                else:  # 小文件一次读完，文件尾就是已读内容的末尾
+                    tail_start, tail_end = max(0, head - TAIL_SIZE), head
+            check = None
+            if head >= 12 and buffer[:4] == b'RIFF' and buffer[8:12] == b'WEBP':
+                check = _check_webp
+            for signature, candidate in _SIGNATURES:
+                if check is None and head >= len(signature) and buffer.startswith(signature):
+                    check = candidate
+            if check is None:
+                return False
+            try:
+                return check(buffer, head, tail_start, tail_end, size, file)
+            except struct.error:
+                return False
+    except OSError:
+        return False
+
+
+def check_image(path, deep=False):
+    """检查图片是否完整；deep 为 True 时文件头检查通过后再用 Pillow 完整校验"""
+    if not check_header(path):
+        return False
+    if not deep:
+        return True
+    from PIL import Image  # 只有 deep 模式需要 Pillow
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:  # Pillow 对损坏文件可能抛出各种异常
+        return False
+    return True
+
+
+# -------------------- 进程池 --------------------
+class ImageValidator:
+    """
+    在进程池中校验图片，与复制/移动同时进行；submit 返回 Future，结果为 True / False
+    缓存在主进程中查询和写入，命中时直接返回已完成的 Future
+    参数:
+        deep    -- 是否用 Pillow 完整校验
+        workers -- 进程数，默认 CPU 核数
+    """
+
+    def __init__(self, deep=False, workers=None):
+        self.deep = deep
+        self.cache_key = DEEP_CACHE_KEY if deep else CACHE_KEY
+        self._cache = get_default_cache()
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, path, st=None):
+        try:
+            st = st or os.stat(path)
+            cached = self._cache.lookup(path, self.cache_key, st)
+        except OSError:
+            cached = None
+        if cached is not None:
+            future = Future()
+            future.set_result(cached == '1')
+            return future
+        future = self._pool.submit(check_image, path, self.deep)
+        if st is not None:
+            future.add_done_callback(lambda done: self._store(path, st, done))
+        return future
+
+    def _store(self, path, st, future):
+        if future.exception() is not None:
+            return
+        try:
+            self._cache.store(path, self.cache_key, '1' if future.result() else '0', st)
+        except OSError:
+            pass
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def find_invalid_images(directories, deep=False, workers=None):  # 扫描目录，返回无效的图片路径列表
+    with ImageValidator(deep, workers) as validator:
+        futures = [(entry.path, validator.submit(entry.path))
+                   for directory in directories
+                   for entry in scan_tree(directory)
+                   if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS]
+        return sorted(path for path, future in futures if not future.result())
+
+
+# -------------------- 命令行 --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查图片文件是否完整（只读文件头和文件尾）')
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('--deep', action='store_true', help='再用 Pillow 完整校验（较慢）')
+    parser.add_argument('--workers', type=int, help='进程数（默认 CPU 核数）')
+    args = parser.parse_args(argv)
+
+    invalid = find_invalid_images(args.directories, args.deep, args.workers)
+    for path in invalid:
+        print(path)
+    print(f"无效图片 {len(invalid)} 个", file=sys.stderr)
+    return 1 if invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
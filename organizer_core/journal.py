@@ -0,0 +1,105 @@
+"""
+可续传的迁移日志（SQLite，WAL 模式）。
+保存在目标目录中，每迁移完（或判定为重复而跳过）一个源文件就追加一条记录：
+源路径、大小、mtime_ns、哈希、目标路径。
+中断后重新运行时，记录全部载入内存，源文件未变化且目标仍存在即可 O(1) 跳过，
+不必再次哈希或复制。写入按批提交（synchronous=NORMAL，不会每个文件 fsync 一次）。
+"""
+import os
+import sqlite3
+import threading
+import time
+
+JOURNAL_NAME = '.migration_journal.sqlite3'
+COMMIT_EVERY = 500  # 累计多少条记录后提交一次事务
+COMMIT_INTERVAL = 5.0  # 距上次提交超过多少秒也提交一次（秒）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS done (
+    src TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT,
+    dest TEXT,
+    finished REAL NOT NULL
+);
+"""
+
+
+def is_journal_file(name):  # 日志本身（含 -wal / -shm）不属于迁移内容，扫描目标目录时应跳过
+    return name.startswith(JOURNAL_NAME)
+
+
+# -------------------- 迁移日志 --------------------
+class MigrationJournal:
+    """线程安全；dest_dir 为迁移目标目录，日志文件默认放在其中"""
+
+    def __init__(self, dest_dir, db_path=None):
+        self.db_path = db_path or os.path.join(dest_dir, JOURNAL_NAME)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._done = {}  # 源路径 -> (大小, mtime_ns, 哈希, 目标路径)
+        for src, size, mtime_ns, digest, dest in self._conn.execute(
+                'SELECT src, size, mtime_ns, digest, dest FROM done'):
+            self._remember(src, size, mtime_ns, digest, dest)
+        self._pending = []
+        self._last_commit = time.monotonic()
+        self.resumed = len(self._done)  # 打开时已有的记录数，大于 0 表示这是一次续传
+
+    def __len__(self):
+        return len(self._done)
+
+    def is_done(self, src, size=None, mtime_ns=None):  # 源文件已迁移且此后未变化（目标也还在）时返回 True；扫描时已取得大小和 mtime 的直接传入
+        record = self._done.get(src)
+        if record is None:
+            return False
+        if size is None or mtime_ns is None:
+            st = os.stat(src)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+        if (size, mtime_ns) != record[:2]:
+            return False
+        dest = record[3]
+        return dest is None or os.path.exists(dest)
+
+    def _remember(self, src, size, mtime_ns, digest, dest):
+        self._done[src] = (size, mtime_ns, digest, dest)
+
+    def record(self, src, digest=None, dest=None, st=None):  # 记录一个已完成的源文件（dest 为 None 表示重复而跳过）
+        st = st or os.stat(src)
+        row = (src, st.st_size, st.st_mtime_ns, digest, dest, time.time())
+        with self._lock:
+            self._remember(*row[:5])
+            self._pending.append(row)
+            if len(self._pending) >= COMMIT_EVERY or time.monotonic() - self._last_commit >= COMMIT_INTERVAL:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO done (src, size, mtime_ns, digest, dest, finished) '
+                'VALUES (?, ?, ?, ?, ?, ?)', self._pending)
+            self._conn.commit()
+            self._pending = []
+        self._last_commit = time.monotonic()
+
+    def flush(self):  # 提交所有未写入的记录
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush_locked()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,122 @@
+"""
+用链接代替删除的去重。
+重复文件不删除，而是替换成指向同一份数据的硬链接（或 reflink），所有路径仍然有效，空间照样释放：
+    1. 可选逐字节比较，确认内容真的相同（哈希碰撞也不会丢数据）；
+    2. 在重复文件所在目录创建临时名的链接；
+    3. rename 覆盖原文件 —— 替换是原子的，任何时刻该路径要么是原文件，要么是链接。
+硬链接共享 inode（权限、修改时间与保留的文件相同）；reflink 是独立的文件，保留原来的权限和时间戳，
+但需要 btrfs / XFS 等支持写时复制的文件系统。
+"""
+import os
+import shutil
+import threading
+import uuid
+
+from organizer_core.fastcopy import reflink_file
+
+COMPARE_CHUNK = 1024 * 1024  # 逐字节比较时每次读取的字节数
+
+MODES = ('hardlink', 'reflink', 'auto')  # auto: 优先硬链接，跨设备时改用 reflink
+
+
+def files_identical(path_a, path_b, chunk_size=COMPARE_CHUNK):  # 逐字节比较两个文件
+    if os.path.getsize(path_a) != os.path.getsize(path_b):
+        return False
+    with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+        while True:
+            block_a = file_a.read(chunk_size)
+            if block_a != file_b.read(chunk_size):
+                return False
+            if not block_a:
+                return True
+
+
+class LinkStats:
+    """一轮链接去重的统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.linked = 0  # 替换成链接的文件数
+        self.already = 0  # 本来就是同一个 inode 的文件数
+        self.mismatched = 0  # 逐字节比较不一致而跳过的文件数
+        self.failed = 0
+        self.reclaimed = 0  # 释放的字节数
+
+    def add(self, field, reclaimed=0):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            self.reclaimed += reclaimed
+
+    def summary(self):
+        return (f"替换为链接 {self.linked} 个文件，释放 {self.reclaimed / 1024 / 1024:.1f} MB；"
+                f"已是同一文件 {self.already} 个，内容不一致跳过 {self.mismatched} 个，失败 {self.failed} 个")
+
+
+# -------------------- 单个文件 --------------------
+def replace_with_link(canonical, duplicate, mode='auto', verify=False):
+    """
+    把 duplicate 替换成指向 canonical 的链接，返回释放的字节数（两者本来就是同一个文件时返回 None）
+    verify 为 True 时先逐字节比较，不一致时抛出 ValueError，duplicate 保持不动
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的链接方式: {mode}（可选: {', '.join(MODES)}）")
+    canonical_stat = os.stat(canonical)
+    duplicate_stat = os.stat(duplicate)
+    if (canonical_stat.st_dev, canonical_stat.st_ino) == (duplicate_stat.st_dev, duplicate_stat.st_ino):
+        return None
+    if verify and not files_identical(canonical, duplicate):
+        raise ValueError(f"{duplicate} 与 {canonical} 内容不一致")
+
+    directory, name = os.path.split(duplicate)
+    temp = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.link")
+    use_hardlink = mode == 'hardlink' or (mode == 'auto' and canonical_stat.st_dev == duplicate_stat.st_dev)
+    if use_hardlink:
+        os.link(canonical, temp)
+    else:
+        reflink_file(canonical, temp)
+        shutil.copystat(duplicate, temp)  # reflink 是独立文件，保留重复文件原来的权限和时间戳
+    try:
+        os.replace(temp, duplicate)  # 原子替换
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    if use_hardlink and duplicate_stat.st_nlink > 1:
+        return 0  # 原文件还有其他硬链接，数据块并未释放
+    return duplicate_stat.st_size
+
+
+def link_duplicates(duplicates, mode='auto', verify=False, on_linked=None, on_error=None):
+    """
+    duplicates 为 {哈希: [路径, ...]}（find_duplicates 的结果），每组保留第一个文件，其余替换为链接，返回 LinkStats
+    参数:
+        on_linked -- 可选，每替换一个文件调用 on_linked(重复文件, 保留的文件, 释放的字节数)
+        on_error  -- 可选，出错或内容不一致时调用 on_error(路径, exception)
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的链接方式: {mode}（可选: {', '.join(MODES)}）")
+    stats = LinkStats()
+    for paths in duplicates.values():
+        canonical = paths[0]
+        for duplicate in paths[1:]:
+            try:
+                reclaimed = replace_with_link(canonical, duplicate, mode, verify)
+            except ValueError as e:
+                stats.add('mismatched')
+                if on_error:
+                    on_error(duplicate, e)
+                continue
+            except OSError as e:
+                stats.add('failed')
+                if on_error:
+                    on_error(duplicate, e)
+                continue
+            if reclaimed is None:
+                stats.add('already')
+                continue
+            stats.add('linked', reclaimed)
+            if on_linked:
+                on_linked(duplicate, canonical, reclaimed)
+    return stats
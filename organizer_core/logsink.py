@@ -0,0 +1,126 @@
+"""
+界面日志的统一出口。
+工作线程只把消息放进队列（collections.deque 的 append / popleft 在 CPython 中是原子操作，不需要加锁），
+界面线程用定时器每隔 FLUSH_INTERVAL_MS 取出全部消息，一次性插入文本框；
+文本框只保留最近 max_lines 行（旧行自动删除），完整日志可同时按批写入文件，不在内存中累积。
+
+Tk:
+    sink = attach_tk(text_widget)            # 返回 LogSink，可直接当作 update_text 回调
+Qt:
+    sink = attach_qt(text_edit)              # QTextEdit / QPlainTextEdit
+"""
+import collections
+import threading
+
+FLUSH_INTERVAL_MS = 100  # 界面刷新间隔（毫秒）
+MAX_LINES = 5000  # 文本框保留的最大行数
+
+
+# -------------------- 消息队列 --------------------
+class LogSink:
+    def __init__(self, log_path=None):
+        self._queue = collections.deque()
+        self._file_lock = threading.Lock()  # 只保护日志文件，写入消息本身不加锁
+        self._file = None
+        self._unshown = []  # 关闭日志文件时已写入文件、但还没显示到界面的消息
+        if log_path:
+            self.open_file(log_path)
+
+    def write(self, message):  # 任意线程都可以调用
+        self._queue.append(str(message))
+
+    __call__ = write  # 可以直接作为 update_text / update_status 之类的回调传入
+
+    def drain(self):  # 取出所有待显示的消息（同时写入日志文件），由界面线程调用
+        with self._file_lock:
+            lines = self._take()
+            shown, self._unshown = self._unshown, []
+        return shown + lines
+
+    def _take(self):  # 调用方需持有 _file_lock
+        lines = []
+        popleft = self._queue.popleft
+        while True:
+            try:
+                lines.append(popleft())
+            except IndexError:
+                break
+        if lines and self._file is not None:
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+        return lines
+
+    # -------------------- 日志文件 --------------------
+    def open_file(self, path):  # 此后的消息同时写入 path（覆盖已有内容）
+        with self._file_lock:
+            self._close_locked()
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def close_file(self):  # 把队列中剩余的消息写入文件后关闭；这些消息仍会在下次刷新时显示
+        with self._file_lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self._file is None:
+            return
+        self._unshown.extend(self._take())
+        self._file.close()
+        self._file = None
+
+
+# -------------------- Tk 文本框 --------------------
+class TkLogView:
+    """定时把 LogSink 中的消息批量插入 Tk Text / ScrolledText（只读状态的文本框也可以）"""
+
+    def __init__(self, sink, widget, max_lines=MAX_LINES, interval_ms=FLUSH_INTERVAL_MS):
+        self.sink = sink
+        self.widget = widget
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        widget.after(interval_ms, self._flush)
+
+    def _flush(self):
+        lines = self.sink.drain()
+        if lines:
+            widget = self.widget
+            state = widget.cget('state')
+            if state == 'disabled':
+                widget.configure(state='normal')
+            widget.insert('end', '\n'.join(lines) + '\n')
+            line_count = int(widget.index('end-1c').split('.')[0]) - 1
+            if line_count > self.max_lines:
+                widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')  # 删除最早的行
+            widget.see('end')
+            if state == 'disabled':
+                widget.configure(state='disabled')
+        self.widget.after(self.interval_ms, self._flush)
+
+
+def attach_tk(widget, log_path=None, max_lines=MAX_LINES):  # 为 Tk 文本框创建日志出口，需在界面线程调用
+    sink = LogSink(log_path)
+    TkLogView(sink, widget, max_lines)
+    return sink
+
+
+# -------------------- Qt 文本框 --------------------
+def attach_qt(widget, log_path=None, max_lines=MAX_LINES):  # 为 QTextEdit / QPlainTextEdit 创建日志出口，需在界面线程调用
+    from PyQt5.QtCore import QTimer  # 只有 Qt 界面需要
+    from PyQt5.QtGui import QTextCursor
+
+    sink = LogSink(log_path)
+    widget.document().setMaximumBlockCount(max_lines)  # Qt 自动删除超出的旧行
+
+    def flush():
+        lines = sink.drain()
+        if lines:
+            cursor = QTextCursor(widget.document())  # 独立的光标，不影响用户当前的选择
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText('\n'.join(lines) + '\n')  # 按纯文本插入，每行一个段落
+            scrollbar = widget.verticalScrollBar()
+            scrollbar.setValue(scrollbar.maximum())
+
+    timer = QTimer(widget)  # 以文本框为父对象，随文本框一起销毁
+    timer.timeout.connect(flush)
+    timer.start(FLUSH_INTERVAL_MS)
+    sink.timer = timer
+    return sink
@@ -0,0 +1,76 @@
+"""
+目标目录的文件名分配。
+每个目标目录只用一次 scandir 建立已有文件名的索引，之后在内存中按 name、name_1、name_2 ...
+的顺序分配下一个可用的名字，不再循环调用 os.path.exists。
+名字通过 O_CREAT | O_EXCL 创建空的占位文件来"认领"，多个线程/进程同时写同一目录也不会互相覆盖；
+随后的复制或移动直接覆盖这个占位文件。
+"""
+import os
+import threading
+
+_CLAIM_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+
+
+# -------------------- 单个目录的文件名索引 --------------------
+class NameIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._next_counter = {}  # (文件名, 扩展名) -> 下一个要尝试的编号
+        try:
+            with os.scandir(directory) as entries:
+                self._taken = {entry.name for entry in entries}
+        except FileNotFoundError:
+            self._taken = set()
+
+    def claim(self, filename):  # 认领一个不冲突的文件名，返回已创建占位文件的完整路径
+        base, ext = os.path.splitext(filename)
+        with self._lock:
+            candidate = filename
+            counter = self._next_counter.get((base, ext), 1)
+            while True:
+                if candidate not in self._taken:
+                    path = os.path.join(self.directory, candidate)
+                    try:
+                        os.close(os.open(path, _CLAIM_FLAGS, 0o666))
+                    except FileExistsError:
+                        pass  # 其他进程刚刚创建了同名文件，继续尝试下一个编号
+                    else:
+                        self._taken.add(candidate)
+                        if candidate != filename:
+                            self._next_counter[(base, ext)] = counter
+                        return path
+                    self._taken.add(candidate)
+                candidate = f"{base}_{counter}{ext}"
+                counter += 1
+
+
+# -------------------- 全局索引表 --------------------
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_name_index(directory):  # 同一目录在进程内共用一个索引
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = NameIndex(key)
+        return index
+
+
+def claim_path(dest_dir, filename):  # 在 dest_dir 中认领 filename（冲突时自动加 _1、_2 ...），返回目标路径
+    return get_name_index(dest_dir).claim(filename)
+
+
+def release_claim(path):  # 复制/移动失败时删除仍为空的占位文件
+    try:
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def reset_name_indexes():  # 新一轮整理开始前清空索引，重新读取目录内容
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,69 @@
+"""
+并行哈希引擎。
+hashlib 在处理大块数据时会释放 GIL，因此用线程池即可让多个文件同时读取、计算，
+同时限制"已提交但未完成"的任务数，保证内存占用不随文件数量增长。
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = int(os.environ.get('ORGANIZER_HASH_WORKERS', 0)) or min(32, (os.cpu_count() or 1) + 4)
+PROGRESS_INTERVAL = 1.0  # 进度回调的最小间隔（秒）
+
+
+# -------------------- 哈希引擎 --------------------
+class HashEngine:
+    """
+    参数:
+        workers       -- 工作线程数，默认读取环境变量 ORGANIZER_HASH_WORKERS
+        max_in_flight -- 同时排队/执行的最大任务数，默认 workers 的 4 倍
+        update_text   -- 进度回调，接收一行文本
+    """
+
+    def __init__(self, workers=None, max_in_flight=None, update_text=None):
+        self.workers = workers or DEFAULT_WORKERS
+        self.max_in_flight = max_in_flight or self.workers * 4
+        self.update_text = update_text
+
+    def imap(self, func, items, total=None, label='计算哈希'):  # 按完成顺序产出 (item, result, error)
+        done = 0
+        last_report = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {}
+            items = iter(items)
+            exhausted = False
+            while pending or not exhausted:
+                # 补充任务，直到达到在途上限
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(func, item)] = item
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = pending.pop(future)
+                    error = future.exception()
+                    yield item, (None if error else future.result()), error
+                    done += 1
+                now = time.monotonic()
+                if self.update_text and now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    progress = f"{done}/{total}" if total is not None else str(done)
+                    self.update_text(f"{label}: 已完成 {progress} 个文件")
+        if self.update_text and done:
+            self.update_text(f"{label}: 共完成 {done} 个文件")
+
+    def group(self, func, items, key=None, total=None, label='计算哈希'):  # 返回 {结果: [item, ...]}，出错的条目通过回调报告后跳过
+        groups = defaultdict(list)
+        for item, result, error in self.imap(func, items, total=total, label=label):
+            if error is not None:
+                if self.update_text:
+                    self.update_text(f"无法读取 {item}: {error}")
+                continue
+            groups[result if key is None else key(item, result)].append(item)
+        return groups
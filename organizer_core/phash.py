@@ -0,0 +1,284 @@
+"""
+感知哈希与近似重复图片查找（缩放、重新压缩过的副本也能找出来）。
+    - 缩略图：JPEG 用 draft 直接按 1/2～1/8 分辨率解码，再缩成 32x32 灰度图，不解码整张大图；
+    - 哈希：aHash / dHash / pHash 各 64 位，成批用 NumPy 矩阵运算计算（pHash 的 DCT 是两次矩阵乘法）；
+      结果写入持久化哈希缓存，未变化的图片不再解码；
+    - 分组：多索引汉明搜索 —— 64 位切成 m 段，距离不超过 r 的两个哈希至少有一段距离不超过 r // m，
+      每段排序后只查少量邻近段值，再核对完整距离，不做 O(n²) 的两两比较；百万张图片几分钟内完成。
+
+依赖 numpy 和 Pillow。命令行:
+    python -m organizer_core.phash DIR [DIR ...] --kind phash --distance 6
+"""
+import argparse
+import json
+import os
+import sys
+from itertools import combinations
+from math import comb
+
+import numpy as np
+from PIL import Image
+
+from organizer_core.hash_cache import get_default_cache
+from organizer_core.parallel_hash import HashEngine
+from organizer_core.scanner import scan_tree
+
+HASH_SIZE = 8  # 哈希边长，8x8 = 64 位
+DCT_SIZE = 32  # pHash 的 DCT 输入边长
+KINDS = ('ahash', 'dhash', 'phash')
+CACHE_KEY = 'perceptual-v1'  # 哈希缓存中的"算法"名，三种哈希拼成一个值保存
+BATCH_SIZE = 1024  # 每批向量化计算的图片数
+DEFAULT_DISTANCE = 6  # 认为是近似重复的最大汉明距离
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp'}
+
+MAX_CHUNKS = 16  # 多索引搜索最多把 64 位哈希切成的段数
+CANDIDATE_COST = 0.2  # 核对一个候选相对一次二分查找的耗时（用于选择分段方式）
+PAIR_BLOCK = 1 << 22  # 每次展开核对的候选对数上限
+
+
+def is_image_file(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+# -------------------- 缩略图与哈希 --------------------
+def _dct_matrix(n):  # 正交 DCT-II 矩阵，X 的二维 DCT 为 D @ X @ D.T
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+
+def load_thumbnail(path):  # 返回 (32x32 灰度图, 8x9 灰度图)，都是 float32 数组
+    with Image.open(path) as image:
+        image.draft('L', (DCT_SIZE * 2, DCT_SIZE * 2))  # JPEG 按缩小后的分辨率解码，其他格式忽略
+        image = image.convert('L')
+        square = image.resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR, reducing_gap=2.0)
+        wide = image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR, reducing_gap=2.0)
+        return np.asarray(square, dtype=np.float32), np.asarray(wide, dtype=np.float32)
+
+
+def _pack(bits):  # (N, 64) 布尔数组 -> N 个 64 位无符号整数
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def compute_hashes(squares, wides):
+    """
+    成批计算感知哈希
+    squares -- (N, 32, 32) 灰度图；wides -- (N, 8, 9) 灰度图
+    返回 {'ahash': uint64 数组, 'dhash': ..., 'phash': ...}
+    """
+    count = len(squares)
+    block = DCT_SIZE // HASH_SIZE
+    small = squares.reshape(count, HASH_SIZE, block, HASH_SIZE, block).mean(axis=(2, 4))  # 按块平均缩到 8x8
+    ahash = small > small.mean(axis=(1, 2), keepdims=True)
+    dhash = wides[:, :, 1:] > wides[:, :, :-1]  # 相邻像素的明暗变化
+    low = (_DCT @ squares @ _DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(count, -1)  # 低频 8x8 系数
+    phash = low > np.median(low[:, 1:], axis=1, keepdims=True)  # 中位数不计直流分量
+    return {
+        'ahash': _pack(ahash.reshape(count, -1)),
+        'dhash': _pack(dhash.reshape(count, -1)),
+        'phash': _pack(phash.reshape(count, -1)),
+    }
+
+
+def perceptual_hashes(paths, update_text=None, workers=None):
+    """
+    计算每张图片的 (aHash, dHash, pHash)，返回 {路径: (a, d, p)}；无法解码的图片不在结果中
+    缓存命中的图片不解码；其余图片多线程解码缩略图，每 BATCH_SIZE 张向量化计算一次
+    """
+    cache = get_default_cache()
+    result = {}
+    missing = []
+    for path in paths:
+        try:
+            cached = cache.lookup(path, CACHE_KEY)
+        except OSError:
+            continue
+        if cached is None:
+            missing.append(path)
+        else:
+            result[path] = tuple(int(cached[i:i + 16], 16) for i in (0, 16, 32))
+
+    engine = HashEngine(workers=workers, update_text=update_text)
+    batch_paths, squares, wides = [], [], []
+
+    def flush():
+        if not batch_paths:
+            return
+        hashes = compute_hashes(np.stack(squares), np.stack(wides))
+        for i, path in enumerate(batch_paths):
+            value = tuple(int(hashes[kind][i]) for kind in KINDS)
+            result[path] = value
+            try:
+                cache.store(path, CACHE_KEY, ''.join(f"{part:016x}" for part in value))
+            except OSError:
+                pass
+        batch_paths.clear()
+        squares.clear()
+        wides.clear()
+
+    for path, thumbnail, error in engine.imap(load_thumbnail, missing, total=len(missing), label='解码缩略图'):
+        if error is not None:
+            if update_text:
+                update_text(f"无法读取图片 {path}: {error}")
+            continue
+        batch_paths.append(path)
+        squares.append(thumbnail[0])
+        wides.append(thumbnail[1])
+        if len(batch_paths) >= BATCH_SIZE:
+            flush()
+    flush()
+    return result
+
+
+# -------------------- 汉明距离搜索 --------------------
+if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+    def popcount(values):
+        return np.bitwise_count(values)
+else:
+    _BYTE_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(values):
+        return _BYTE_BITS[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _probe_masks(width, radius):  # width 位内汉明距离不超过 radius 的所有异或掩码（含 0）
+    masks = [0]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(width), distance):
+            masks.append(sum(1 << bit for bit in bits))
+    return np.array(masks, dtype=np.uint64)
+
+
+def _chunk_layout(count, max_distance):
+    """
+    多索引搜索的分段方式，返回 [(起始位, 位数), ...] 和段内搜索半径
+    段数 m 取估算耗时最小者：每段要做 探查掩码数 次二分查找，每次还要核对约 count / 2^段宽 个候选；
+    段越宽候选越少，但段内半径 r // m 越大、探查掩码越多
+    """
+    best = None
+    for chunks in range(2, MAX_CHUNKS + 1):
+        radius = max_distance // chunks
+        width = 64 // chunks
+        probes = sum(comb(width, d) for d in range(radius + 1))
+        cost = chunks * probes * (1 + CANDIDATE_COST * count / 2 ** width)
+        if best is None or cost < best[0]:
+            best = (cost, chunks, radius)
+    _, chunks, radius = best
+    bounds = [64 * i // chunks for i in range(chunks + 1)]
+    return [(low, high - low) for low, high in zip(bounds, bounds[1:])], radius
+
+
+def similar_pairs(values, max_distance=DEFAULT_DISTANCE):
+    """
+    values 为互不相同的 64 位哈希（uint64 数组），返回汉明距离不超过 max_distance 的所有下标对 (i, j)
+    哈希切成 m 段时，距离不超过 r 的两个哈希至少有一段的距离不超过 r // m（抽屉原理）：
+    每段排序一次，对每个探查掩码用二分查找找出段值相差该掩码的条目，再核对完整的 64 位距离
+    """
+    count = len(values)
+    found_i, found_j = [], []
+    if count < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    layout, radius = _chunk_layout(count, max_distance)
+    for low, width in layout:
+        keys = (values >> np.uint64(low)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        for mask in _probe_masks(width, radius):
+            targets = keys ^ mask
+            starts = np.searchsorted(keys, targets, 'left')
+            counts = np.searchsorted(keys, targets, 'right') - starts
+            # 同一对会从两端各找到一次（a ^ m = b 且 b ^ m = a），只保留排序位置靠前的一端；分块展开以限制内存
+            ends = np.cumsum(counts)
+            split = np.searchsorted(ends, np.arange(PAIR_BLOCK, ends[-1], PAIR_BLOCK))
+            for rows in np.split(np.arange(count), split):
+                if not len(rows):
+                    continue
+                row_counts = counts[rows]
+                total = int(row_counts.sum())
+                if not total:
+                    continue
+                source = np.repeat(rows, row_counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+                target = np.repeat(starts[rows], row_counts) + offsets
+                keep = target > source
+                left, right = order[source[keep]], order[target[keep]]
+                close = popcount(values[left] ^ values[right]) <= max_distance
+                found_i.append(left[close])
+                found_j.append(right[close])
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def group_similar(hashes, kind='phash', max_distance=DEFAULT_DISTANCE):
+    """
+    hashes 为 perceptual_hashes 的结果；距离不超过 max_distance 的图片连成一组（传递闭包）
+    返回 [[路径, ...], ...]，每组至少两张，按组大小从大到小排列
+    """
+    position = KINDS.index(kind)
+    paths = list(hashes)
+    values = np.fromiter((hashes[path][position] for path in paths), dtype=np.uint64, count=len(paths))
+    unique, inverse = np.unique(values, return_inverse=True)  # 哈希完全相同的图片（如纯色图）先合并，不参与配对
+    parent = list(range(len(unique)))
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:  # 路径压缩
+            parent[node], node = root, parent[node]
+        return root
+
+    for i, j in zip(*(side.tolist() for side in similar_pairs(unique, max_distance))):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_i] = root_j
+
+    groups = {}
+    for path, node in zip(paths, inverse.ravel().tolist()):
+        groups.setdefault(find(node), []).append(path)
+    return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+
+def find_similar_images(directories, kind='phash', max_distance=DEFAULT_DISTANCE, update_text=None):
+    """扫描目录中的图片，返回近似重复的分组 [[路径, ...], ...]"""
+    on_error = (lambda path, e: update_text(f"无法访问 {path}: {e}")) if update_text else None
+    paths = [entry.path for directory in directories
+             for entry in scan_tree(directory, classify=lambda name: 'image' if is_image_file(name) else None, on_error=on_error)
+             if entry.category]
+    hashes = perceptual_hashes(paths, update_text)
+    groups = group_similar(hashes, kind, max_distance)
+    if update_text:
+        update_text(f"共 {len(hashes)} 张图片，找到 {len(groups)} 组近似重复"
+                    f"（{sum(len(group) - 1 for group in groups)} 张可能多余）")
+    return groups
+
+
+# -------------------- 命令行 --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查找近似重复的图片（感知哈希）')
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('--kind', choices=KINDS, default='phash', help='使用的感知哈希')
+    parser.add_argument('--distance', type=int, default=DEFAULT_DISTANCE, help='最大汉明距离（0-64）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出分组')
+    args = parser.parse_args(argv)
+
+    groups = find_similar_images(args.directories, args.kind, args.distance,
+                                 update_text=None if args.json else print)
+    if args.json:
+        print(json.dumps(groups, ensure_ascii=False))
+    else:
+        for number, group in enumerate(groups, 1):
+            print(f"第 {number} 组:")
+            for path in group:
+                print(f" - {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+整理计划（dry-run）：只扫描一次源目录，算出每个文件的去向，不创建目录、不移动/复制任何数据。
+计划由 (源路径, 目标路径, 操作, 字节数) 组成，可以保存为 JSON Lines 文件，稍后（或在另一台机器上）重放；
+文件第一行是汇总信息（各类别的文件数/字节数、各目标设备需要的空间），
+只看汇总时只读这一行，与计划中的文件数量无关。
+
+    python -m organizer_core.engine plan SRC --target DEST --op move --out plan.jsonl
+    python -m organizer_core.engine plan-info plan.jsonl
+    python -m organizer_core.engine apply plan.jsonl
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+from organizer_core.space import SpaceManager
+
+PLAN_VERSION = 1
+
+# 计划中的一个文件；src_dev 为扫描时源文件的 st_dev（只在同一台机器上有意义）
+PlanItem = namedtuple('PlanItem', 'src dst op bytes category src_dev')
+
+
+def _device_of(path):  # 目标目录可能还不存在，取最近的已存在上级目录所在的设备
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise
+            path = parent
+
+
+# -------------------- 目标文件名 --------------------
+class _NamePlanner:
+    """与 organizer_core.naming 相同的命名规则（name、name_1、name_2 ...），但只在内存中分配，不创建占位文件"""
+
+    def __init__(self):
+        self._taken = {}  # 目录 -> 已占用的文件名
+        self._next_counter = {}  # (目录, 文件名, 扩展名) -> 下一个要尝试的编号
+
+    def assign(self, directory, filename):
+        taken = self._taken.get(directory)
+        if taken is None:
+            try:
+                with os.scandir(directory) as entries:
+                    taken = {entry.name for entry in entries}
+            except FileNotFoundError:
+                taken = set()
+            self._taken[directory] = taken
+        base, ext = os.path.splitext(filename)
+        candidate = filename
+        counter = self._next_counter.get((directory, base, ext), 1)
+        while candidate in taken:
+            candidate = f"{base}_{counter}{ext}"
+            counter += 1
+        taken.add(candidate)
+        if candidate != filename:
+            self._next_counter[(directory, base, ext)] = counter
+        return os.path.join(directory, candidate)
+
+
+# -------------------- 计划 --------------------
+class OrganizePlan:
+    """
+    items     -- PlanItem 列表
+    summary() -- 汇总：文件数、字节数、各类别、各目标设备（needed 为该设备上实际要写入的字节，
+                 同一设备内的移动只改目录项，不占空间）
+    local     -- 计划是否在当前进程中生成（为 False 时源设备号不可信，执行时重新 stat）
+    """
+
+    def __init__(self, target_dir, operation, items=None, created=None, summary=None, local=True):
+        if operation not in ('copy', 'move'):
+            raise ValueError(f"未知的操作: {operation}")
+        self.target_dir = target_dir
+        self.operation = operation
+        self.items = items if items is not None else []
+        self.created = created or time.time()
+        self.local = local
+        self._summary = summary
+
+    def __len__(self):
+        return len(self.items)
+
+    def summary(self):
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    def _summarize(self):
+        categories = {}
+        devices = {}
+        dest_devs = {}  # 目标目录 -> 设备号
+        for item in self.items:
+            category = categories.setdefault(item.category, {'files': 0, 'bytes': 0})
+            category['files'] += 1
+            category['bytes'] += item.bytes
+            dest_dir = os.path.dirname(item.dst)
+            dev = dest_devs.get(dest_dir)
+            if dev is None:
+                dev = dest_devs[dest_dir] = _device_of(dest_dir)
+            device = devices.setdefault(str(dev), {'path': dest_dir, 'files': 0, 'bytes': 0, 'needed': 0})
+            device['files'] += 1
+            device['bytes'] += item.bytes
+            if not (item.op == 'move' and item.src_dev == dev):
+                device['needed'] += item.bytes
+        return {
+            'version': PLAN_VERSION,
+            'target_dir': self.target_dir,
+            'operation': self.operation,
+            'created': self.created,
+            'files': len(self.items),
+            'bytes': sum(item['bytes'] for item in categories.values()),
+            'categories': categories,
+            'devices': devices,
+        }
+
+    def needed_by_path(self):  # {目标目录: 需要写入的字节数}，每个目标设备一项
+        return {device['path']: device['needed'] for device in self.summary()['devices'].values() if device['needed']}
+
+    def shortfalls(self, space=None):  # 剩余空间不足的目标设备：[(目录, 需要的字节数, 可用字节数), ...]
+        return (space or SpaceManager()).shortfalls(self.needed_by_path())
+
+    def describe(self, space=None):  # 汇总文本，空间不足的设备附加警告（界面确认框、命令行输出）
+        # space 应与执行计划的引擎相同（OrganizerEngine.space），警告才会计入它要求保留的剩余空间
+        space = space or SpaceManager()
+        reserve = f"（已扣除保留的 {space.reserve_bytes / 1024 / 1024:.0f} MB）" if space.reserve_bytes else ''
+        lines = [format_summary(self.summary())]
+        for path, needed, free in self.shortfalls(space):
+            lines.append(f"警告: {path} 所在磁盘可用 {free / 1024 / 1024:.1f} MB{reserve}，需要 {needed / 1024 / 1024:.1f} MB")
+        return '\n'.join(lines)
+
+    # -------------------- 保存与读取 --------------------
+    def save(self, path):  # 第一行为汇总，之后每行一个 [src, dst, op, bytes, category, src_dev]
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(self.summary(), ensure_ascii=False) + '\n')
+            for item in self.items:
+                file.write(json.dumps(list(item), ensure_ascii=False) + '\n')
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as file:
+            summary = json.loads(file.readline())
+            if summary.get('version') != PLAN_VERSION:
+                raise ValueError(f"{path}: 不支持的计划文件版本 {summary.get('version')}")
+            items = [PlanItem(*json.loads(line)) for line in file if line.strip()]
+        return cls(summary['target_dir'], summary['operation'], items, summary['created'], summary, local=False)
+
+
+def read_summary(path):  # 只读取计划文件的汇总行
+    with open(path, encoding='utf-8') as file:
+        return json.loads(file.readline())
+
+
+def build_plan(entries, target_dir, operation, flat=False):
+    """
+    由扫描结果生成计划：已分类的文件放到 target_dir/类别/（flat 为 True 时直接放在 target_dir 下），
+    目标文件名按目标目录中已有的文件和本计划中已分配的名字避开冲突
+    """
+    names = _NamePlanner()
+    target_dir = os.path.abspath(target_dir)  # 计划可能在其他工作目录下重放
+    plan = OrganizePlan(target_dir, operation)
+    for entry in entries:
+        if not entry.category:
+            continue
+        dest_dir = target_dir if flat else os.path.join(target_dir, entry.category)
+        plan.items.append(PlanItem(entry.path, names.assign(dest_dir, entry.name), operation, entry.size,
+                                   entry.category, entry.dev))
+    return plan
+
+
+def format_summary(summary):  # 汇总的可读文本（界面确认框、命令行输出）
+    mb = 1024 * 1024
+    lines = [f"{category}: {item['files']} files, {item['bytes'] / mb:.1f} MB"
+             for category, item in summary['categories'].items()]
+    lines.append(f"共 {summary['files']} 个文件，{summary['bytes'] / mb:.1f} MB")
+    for device in summary['devices'].values():
+        lines.append(f"目标 {device['path']} 所在磁盘需要写入 {device['needed'] / mb:.1f} MB")
+    return '\n'.join(lines)
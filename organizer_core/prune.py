@@ -0,0 +1,94 @@
+"""
+删除空目录。
+完整模式只遍历一次目录树：每个目录 scandir 一次并记下子项数量，自底向上处理，
+删掉一个空目录就把父目录的计数减一，父目录因此变空时接着删除，不需要再次列目录。
+只清理本次涉及的目录时（touched 为本次移走/删除的文件路径），连目录树都不遍历：
+直接对这些文件的上级目录逐级 rmdir，目录不为空时 rmdir 失败即停止向上。
+"""
+import errno
+import os
+
+
+def _under(path, root):  # path 是否在 root 之下（不含 root 本身）
+    return path != root and path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+# -------------------- 删除空目录 --------------------
+def prune_empty_dirs(root, touched=None, keep_root=True, on_removed=None, on_error=None):
+    """
+    删除 root 下的空目录（含删除子目录后才变空的目录），返回删除的目录数
+    参数:
+        touched    -- 可选，本次移走/删除的文件路径；指定时只检查这些文件所在的目录及其上级
+        keep_root  -- 为 True 时保留 root 本身
+        on_removed -- 可选，每删除一个目录调用 on_removed(path)
+        on_error   -- 可选，出错时调用 on_error(path, exception)
+    """
+    root = os.path.abspath(root)
+    if touched is not None:
+        return _prune_touched(root, touched, keep_root, on_removed, on_error)
+
+    order = []  # 先序遍历的目录，倒序处理即可保证子目录先于父目录
+    remaining = {}  # 目录 -> 尚未删除的子项数量
+    parents = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                count = 0
+                for entry in iterator:
+                    count += 1
+                    if entry.is_dir(follow_symlinks=False):
+                        parents[entry.path] = directory
+                        stack.append(entry.path)
+        except OSError as e:
+            if on_error:
+                on_error(directory, e)
+            continue  # 读不了的目录当作非空
+        remaining[directory] = count
+        order.append(directory)
+
+    removed = 0
+    for directory in reversed(order):
+        if remaining[directory] or (keep_root and directory == root):
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError as e:
+            if on_error:
+                on_error(directory, e)
+            continue
+        removed += 1
+        if on_removed:
+            on_removed(directory)
+        parent = parents.get(directory)
+        if parent is not None:
+            remaining[parent] -= 1
+    return removed
+
+
+def _prune_touched(root, touched, keep_root, on_removed, on_error):
+    candidates = {os.path.dirname(os.path.abspath(path)) for path in touched}
+    candidates = sorted((path for path in candidates if path == root or _under(path, root)),
+                        key=lambda path: path.count(os.sep), reverse=True)  # 深的目录先处理
+    kept = set()  # 已确认不为空（或删除失败）的目录
+    removed = 0
+    for directory in candidates:
+        while directory not in kept and (_under(directory, root) or (directory == root and not keep_root)):
+            try:
+                os.rmdir(directory)
+            except FileNotFoundError:
+                pass  # 已被删除（例如作为其他目录的上级）
+            except OSError as e:
+                if e.errno not in (errno.ENOTEMPTY, errno.EEXIST) and on_error:
+                    on_error(directory, e)
+                kept.add(directory)
+                break
+            else:
+                removed += 1
+                if on_removed:
+                    on_removed(directory)
+            if directory == root:
+                break
+            directory = os.path.dirname(directory)
+    return removed
@@ -0,0 +1,70 @@
+"""
+基于 os.scandir 的单次目录扫描。
+一次遍历同时完成：调整权限、读取大小/修改时间、按扩展名分类，
+后续的去重、复制/移动都直接使用扫描结果，不再重复遍历目录。
+"""
+import os
+import stat
+from collections import namedtuple
+
+FULL_PERMISSIONS = (stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR |
+                    stat.S_IRGRP | stat.S_IWGRP | stat.S_IXGRP |
+                    stat.S_IROTH | stat.S_IWOTH | stat.S_IXOTH)
+
+# 扫描得到的文件条目
+ScanEntry = namedtuple('ScanEntry', 'path name size mtime_ns dev ino category')
+
+
+# -------------------- 目录扫描 --------------------
+def scan_tree(root, classify=None, fix_permissions=False, on_error=None):
+    """
+    遍历 root 下的所有文件（不跟随目录符号链接），逐个产出 ScanEntry
+    参数:
+        classify        -- 可选，文件名 -> 类别 的函数，结果写入 entry.category
+        fix_permissions -- 为 True 时把遍历到的目录和文件权限改为 777（目录在进入之前修改）
+        on_error        -- 可选，出错时调用 on_error(path, exception)，默认忽略
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            iterator = os.scandir(directory)
+        except OSError as e:
+            if on_error:
+                on_error(directory, e)
+            continue
+        with iterator:
+            for entry in iterator:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if fix_permissions:
+                            _chmod(entry.path, on_error)
+                        stack.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if fix_permissions:
+                        _chmod(entry.path, on_error)
+                    st = entry.stat()  # Windows 上直接使用目录项缓存，其他平台只 stat 一次
+                except OSError as e:
+                    if on_error:
+                        on_error(entry.path, e)
+                    continue
+                category = classify(entry.name) if classify else None
+                yield ScanEntry(entry.path, entry.name, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino, category)
+
+
+def _chmod(path, on_error):
+    try:
+        os.chmod(path, FULL_PERMISSIONS)
+    except OSError as e:
+        if on_error:
+            on_error(path, e)
+
+
+# -------------------- 扫描结果的后续阶段 --------------------
+def group_by_size(entries, min_count=2):  # 按大小分组，只保留至少 min_count 个文件的组（去重的第一步）
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.size, []).append(entry)
+    return {size: group for size, group in groups.items() if len(group) >= min_count}
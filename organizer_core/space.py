@@ -0,0 +1,126 @@
+"""
+目标磁盘的剩余空间记账。
+每个设备只在第一次用到时 statvfs 一次（shutil.disk_usage），之后在内存中扣除已预留、已写入的字节；
+只有距上次读取超过 REFRESH_INTERVAL 秒，或剩余空间接近下限时才重新向内核查询。
+整份计划可以在开始前一次性检查，放不下就整体拒绝，而不是复制到一半才发现磁盘已满。
+"""
+import errno
+import os
+import shutil
+import threading
+import time
+
+REFRESH_INTERVAL = 30.0  # 定期重新读取剩余空间的间隔（秒）
+THIN_MARGIN = 1024 * 1024 * 1024  # 预计剩余空间低于 保留空间 + 此值 时，先向内核确认（字节）
+THIN_REFRESH_INTERVAL = 1.0  # 余量不多时两次读取之间的最短间隔（秒），避免磁盘接近写满时每个文件都 statvfs
+
+
+class InsufficientSpaceError(OSError):
+    """目标磁盘剩余空间不足"""
+
+    def __init__(self, shortfalls):
+        self.shortfalls = shortfalls  # [(目录, 需要的字节数, 可用字节数), ...]
+        details = '；'.join(f"{path} 需要 {needed / 1024 / 1024:.1f} MB，可用 {free / 1024 / 1024:.1f} MB"
+                           for path, needed, free in shortfalls)
+        super().__init__(errno.ENOSPC, f"目标磁盘空间不足: {details}")
+
+
+class _Device:
+    __slots__ = ('path', 'free', 'written', 'reserved', 'refreshed')
+
+    def __init__(self, path):
+        self.path = path  # 用于 statvfs 的目录
+        self.free = 0  # 上次读取时内核报告的剩余字节数
+        self.written = 0  # 上次读取之后已写完的字节数
+        self.reserved = 0  # 正在传输、已预留的字节数
+        self.refreshed = 0.0
+
+
+# -------------------- 空间管理 --------------------
+class SpaceManager:
+    """
+    线程安全。
+    参数:
+        reserve_bytes    -- 每个设备至少保留的剩余空间
+        refresh_interval -- 定期重新读取剩余空间的间隔（秒）
+    """
+
+    def __init__(self, reserve_bytes=0, refresh_interval=REFRESH_INTERVAL):
+        self.reserve_bytes = reserve_bytes
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._dir_devs = {}  # 目录 -> 设备号
+        self._devices = {}  # 设备号 -> _Device
+
+    def device(self, path):  # 目录所在的设备号（目录不存在时取最近的已存在上级目录），结果按目录缓存
+        dev = self._dir_devs.get(path)
+        if dev is None:
+            probe = os.path.abspath(path)
+            while not os.path.exists(probe):
+                probe = os.path.dirname(probe)
+            dev = self._dir_devs[path] = os.stat(probe).st_dev
+            with self._lock:
+                if dev not in self._devices:
+                    self._devices[dev] = _Device(probe)
+                    self._refresh(self._devices[dev])
+        return dev
+
+    def _refresh(self, device):  # 调用方需持有锁
+        device.free = shutil.disk_usage(device.path).free
+        device.written = 0  # 已写入的数据已经反映在内核的数字里
+        device.refreshed = time.monotonic()
+
+    def available(self, path):  # 预计可用于新文件的字节数（已扣除保留空间和在途预留）
+        device = self._devices[self.device(path)]
+        with self._lock:
+            return self._available(device)
+
+    def _available(self, device):
+        return device.free - device.written - device.reserved - self.reserve_bytes
+
+    # -------------------- 单个文件 --------------------
+    def reserve(self, path, size):  # 为写入 path 所在设备的 size 字节预留空间，成功返回预留凭据，空间不足返回 None
+        dev = self.device(path)
+        device = self._devices[dev]
+        with self._lock:
+            age = time.monotonic() - device.refreshed
+            if age >= self.refresh_interval or (
+                    self._available(device) - size < THIN_MARGIN and age >= THIN_REFRESH_INTERVAL):
+                self._refresh(device)  # 数据太旧或余量不多时以内核为准
+            if self._available(device) < size:
+                return None
+            device.reserved += size
+        return dev, size
+
+    def release(self, reservation, written=True):  # 传输结束后释放预留；written 为 True 表示数据已写入磁盘
+        dev, size = reservation
+        with self._lock:
+            device = self._devices[dev]
+            device.reserved -= size
+            if written:
+                device.written += size
+
+    # -------------------- 整份计划 --------------------
+    def shortfalls(self, needed_by_path):  # {目录: 需要写入的字节数} -> 放不下的设备 [(目录, 需要的字节数, 可用字节数), ...]
+        needed_by_dev = {}
+        for path, needed in needed_by_path.items():
+            dev = self.device(path)
+            first_path, total = needed_by_dev.get(dev, (path, 0))
+            needed_by_dev[dev] = (first_path, total + needed)
+        result = []
+        with self._lock:
+            for dev, (path, needed) in needed_by_dev.items():
+                device = self._devices[dev]
+                self._refresh(device)  # 开始前读取一次准确的剩余空间
+                available = self._available(device)
+                if needed > available:
+                    result.append((path, needed, max(available, 0)))
+        return result
+
+    def check(self, needed_by_path):  # 同 shortfalls，但有设备放不下时抛出 InsufficientSpaceError
+        shortfalls = self.shortfalls(needed_by_path)
+        if shortfalls:
+            raise InsufficientSpaceError(shortfalls)
+
+    def fits(self, path, size):  # path 所在设备能否再写入 size 字节
+        return not self.shortfalls({path: size})
@@ -0,0 +1,135 @@
+"""
+并行复制/移动调度。
+多个文件同时传输，但按设备（st_dev）分别限制并发数：
+机械硬盘同时只跑少量任务避免来回寻道，SSD / NAS 可以调高并发跑满带宽。
+任务按 (源设备, 目标设备) 分组排队，某个设备繁忙时不会阻塞其他设备上的任务。
+移动操作中源和目标在同一设备上的分组只是 rename，不占设备带宽，直接在调用线程里依次完成。
+"""
+import os
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_DEVICE_CONCURRENCY = int(os.environ.get('ORGANIZER_DEVICE_CONCURRENCY', 2))  # 每个设备默认同时进行的传输数
+PROGRESS_INTERVAL = 2.0  # 吞吐量报告间隔（秒）
+
+# 一个待传输的文件；src_dev 为 None 时自动 stat，dest_name 为计划好的目标文件名（None 表示沿用源文件名）
+TransferJob = namedtuple('TransferJob', 'src dest_dir size src_dev dest_name')
+TransferJob.__new__.__defaults__ = (None, None)
+
+
+# -------------------- 调度器 --------------------
+class TransferScheduler:
+    """
+    参数:
+        per_device    -- 每个设备的默认并发上限
+        device_limits -- {st_dev: 并发上限}，为个别设备单独设置
+        max_workers   -- 线程总数，默认为所有设备上限之和（至少 per_device）
+        update_text   -- 进度回调，定期报告已传输字节数和平均吞吐量
+        on_progress   -- 可选，与 update_text 同时调用 on_progress(已传输字节, 总字节, 成功数, 失败数)
+    """
+
+    def __init__(self, per_device=None, device_limits=None, max_workers=None, update_text=None, on_progress=None):
+        self.per_device = per_device or DEFAULT_DEVICE_CONCURRENCY
+        self.device_limits = dict(device_limits or {})
+        self.max_workers = max_workers
+        self.update_text = update_text
+        self.on_progress = on_progress
+        self._dest_devs = {}  # 目标目录 -> st_dev
+
+    def _limit(self, dev):
+        return self.device_limits.get(dev, self.per_device)
+
+    def _dest_dev(self, dest_dir):
+        dev = self._dest_devs.get(dest_dir)
+        if dev is None:
+            dev = self._dest_devs[dest_dir] = os.stat(dest_dir).st_dev
+        return dev
+
+    def run(self, jobs, func, operation='copy'):  # 对每个 TransferJob 调用 func(job)，返回 (成功数, 失败数, 传输字节数)
+        queues = OrderedDict()  # (源设备, 目标设备) -> 待处理任务
+        total_bytes = 0
+        for job in jobs:
+            src_dev = job.src_dev if job.src_dev is not None else os.stat(job.src).st_dev
+            key = (src_dev, self._dest_dev(job.dest_dir))
+            queues.setdefault(key, deque()).append(job)
+            total_bytes += job.size
+        devices = {dev for key in queues for dev in key}
+        workers = self.max_workers or max(self.per_device, sum(self._limit(dev) for dev in devices))
+
+        done_bytes = succeeded = failed = 0
+        start = last_report = time.monotonic()
+        if operation == 'move':
+            for key in [key for key in queues if key[0] == key[1]]:  # 同一设备内的移动
+                for job in queues.pop(key):
+                    try:
+                        ok = func(job) is not False
+                    except Exception as e:
+                        ok = False
+                        if self.update_text:
+                            self.update_text(f"处理文件 {job.src} 时出错: {e}")
+                    if ok:
+                        succeeded += 1
+                        done_bytes += job.size
+                    else:
+                        failed += 1
+            devices = {dev for key in queues for dev in key}
+            workers = self.max_workers or max(self.per_device, sum(self._limit(dev) for dev in devices))
+
+        active = dict.fromkeys(devices, 0)  # 每个设备正在进行的传输数
+        running = {}  # future -> (job, key)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while queues or running:
+                # 依次检查每组任务，两端设备都还有余量时才启动
+                for key in list(queues):
+                    queue = queues[key]
+                    src_dev, dest_dev = key
+                    while queue and len(running) < workers and self._has_capacity(active, src_dev, dest_dev):
+                        job = queue.popleft()
+                        self._acquire(active, src_dev, dest_dev, +1)
+                        running[pool.submit(func, job)] = (job, key)
+                    if not queue:
+                        del queues[key]
+                if not running:
+                    break
+                finished, _ = wait(running, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job, (src_dev, dest_dev) = running.pop(future)
+                    self._acquire(active, src_dev, dest_dev, -1)
+                    if future.exception() is None and future.result() is not False:
+                        succeeded += 1
+                        done_bytes += job.size
+                    else:
+                        failed += 1
+                        if future.exception() is not None and self.update_text:
+                            self.update_text(f"处理文件 {job.src} 时出错: {future.exception()}")
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    self._report(done_bytes, total_bytes, succeeded, failed, now - start)
+        if succeeded or failed:
+            self._report(done_bytes, total_bytes, succeeded, failed, time.monotonic() - start)
+        return succeeded, failed, done_bytes
+
+    def _report(self, done_bytes, total_bytes, succeeded, failed, elapsed):
+        if self.update_text:
+            self.update_text(self._progress_text(done_bytes, total_bytes, elapsed))
+        if self.on_progress:
+            self.on_progress(done_bytes, total_bytes, succeeded, failed)
+
+    def _has_capacity(self, active, src_dev, dest_dev):
+        if src_dev == dest_dev:
+            return active[src_dev] < self._limit(src_dev)
+        return active[src_dev] < self._limit(src_dev) and active[dest_dev] < self._limit(dest_dev)
+
+    @staticmethod
+    def _acquire(active, src_dev, dest_dev, delta):
+        active[src_dev] += delta
+        if dest_dev != src_dev:
+            active[dest_dev] += delta
+
+    @staticmethod
+    def _progress_text(done_bytes, total_bytes, elapsed):
+        mb = 1024 * 1024
+        speed = done_bytes / mb / elapsed if elapsed > 0 else 0.0
+        return f"已传输 {done_bytes / mb:.1f} / {total_bytes / mb:.1f} MB，平均 {speed:.1f} MB/s"
@@ -0,0 +1,36 @@
+"""organizer_core.hashing 的内存占用。运行: python -m unittest discover tests"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 仓库根目录，子进程从这里导入 organizer_core
+
+# 在新进程中测量：ru_maxrss 只增不减，本进程之前的峰值会掩盖哈希时的内存增长
+_MEMCHECK = """
+import json, sys
+from organizer_core.hashing import memcheck, peak_rss_mb
+if peak_rss_mb() is None:
+    print(json.dumps(None))
+else:
+    growth, ok = memcheck(sys.argv[1], size_gb=2, limit_mb=64)
+    print(json.dumps([growth, ok]))
+"""
+
+
+class HashMemoryTest(unittest.TestCase):
+    def test_sparse_file_within_limit(self):  # 2GB 稀疏文件：分块读取，内存峰值增量不超过 64MB
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run([sys.executable, '-c', _MEMCHECK, directory], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if result is None:
+            self.skipTest('本平台无法读取进程内存峰值')
+        growth, ok = result
+        self.assertTrue(ok, f"哈希 2GB 文件时内存峰值增加了 {growth:.1f} MB")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""organizer_core.imagecheck 的文件头/文件尾检查。运行: python -m unittest discover tests"""
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # 引入仓库根目录下的 organizer_core
+
+from organizer_core import imagecheck
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@unittest.skipIf(Image is None, '需要 Pillow 生成测试图片')
+class JpegCheckTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (200, 120, 40)).save(buffer, 'JPEG', exif=b'Exif\x00\x00' + b'\x00' * 64)
+        self.jpeg = buffer.getvalue()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_complete_jpeg(self):
+        self.assertTrue(imagecheck.check_header(self.write('plain.jpg', self.jpeg)))
+
+    def test_jpeg_with_trailer(self):  # 动态照片、MPF 等在 EOI 之后附加的数据
+        trailer = b'\x00ftypmp42' + os.urandom(500 * 1024).replace(b'\xff\xd9', b'\xff\x00')
+        self.assertTrue(imagecheck.check_header(self.write('motion.jpg', self.jpeg + trailer)))
+
+    def test_truncated_jpeg(self):
+        self.assertFalse(imagecheck.check_header(self.write('truncated.jpg', self.jpeg[:len(self.jpeg) // 2])))
+
+    def test_truncated_before_scan(self):  # 在 SOS 之前就截断
+        sos = self.jpeg.index(b'\xff\xda')
+        self.assertFalse(imagecheck.check_header(self.write('header_only.jpg', self.jpeg[:sos + 4])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@ This program uses facial recognition technology to find faces similar to a refer
 import os
 import shutil
 import face_recognition
+from organizer_core.faceindex import get_default_index, iter_images  # 持久化的人脸编码库，每张图片只编码一次
+from organizer_core.facepipeline import FacePipeline  # 多进程编码，检测在缩小后的图片上进行
 # ----------------- 查找和比较所有面孔 -----------------
 def find_and_compare_faces(reference_image_path, directory_path, threshold=0.6):
     # 载入并编码参考图像
@@ -15,36 +17,20 @@ def find_and_compare_faces(reference_image_path, directory_path, threshold=0.6):
     if not reference_encodings:
         print("在参考图像中未检测到面孔。")
         return []
-    # 保存相似图像路径及相似度得分的列表
-    all_faces_distances = []
-    # 遍历目标目录中的图像文件
-    for root, dirs, files in os.walk(directory_path):
-        for file in files:
-            # 过滤掉非图像文件
-            if not file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                continue
-            # 获取完整图像路径
-            image_path = os.path.join(root, file)
-            # 载入当前图像文件
-            current_image = face_recognition.load_image_file(image_path)
-            # 提取当前图像中的面孔编码
-            current_encodings = face_recognition.face_encodings(current_image)
-            # 跳过没有检测到面孔的图像
-            if not current_encodings:
-                print(f"在图像中未检测到面孔: {image_path}，跳过。")
-                continue
-            # 比较当前图像中的每个面孔编码与参考编码
-            for current_encoding in current_encodings:
-                for reference_encoding in reference_encodings:
-                    # 计算欧式距离
-                    distance = face_recognition.face_distance([reference_encoding], current_encoding)[0]
-                    # 记录图片和相似度得分
-                    all_faces_distances.append((image_path, distance)
-                    # 如果距离低于阈值，输出结果
-                    if distance < threshold:
-                        print(f"在 {image_path} 中找到相似面孔， 相似度得分: {distance}")
-    # 按相似度得分对结果排序
-    all_faces_distances.sort(key=lambda x: x[#citation-1](citation-1))
+    # 编码目录中尚未编码或已修改的图像（多进程），其余直接使用编码库中保存的结果
+    index = get_default_index()
+    with FacePipeline() as pipeline:
+        face_counts = index.update(iter_images([directory_path]), update_text=print, pipeline=pipeline)
+    # 跳过没有检测到面孔的图像
+    for image_path, count in face_counts.items():
+        if count == 0:
+            print(f"在图像中未检测到面孔: {image_path}，跳过。")
+    # 一次向量化计算所有面孔与参考编码的欧式距离，每张图像取最小距离，按相似度得分排序
+    all_faces_distances = index.query(reference_encodings, list(face_counts))
+    # 如果距离低于阈值，输出结果
+    for image_path, distance in all_faces_distances:
+        if distance < threshold:
+            print(f"在 {image_path} 中找到相似面孔， 相似度得分: {distance}")
     return all_faces_distances
 # ----------------- 移动或复制图像到目录 -----------------
 def move_or_copy_images_to_directory(image_paths, output_directory, operation='copy'):
@@ -60,22 +46,23 @@ def move_or_copy_images_to_directory(image_paths, output_directory, operation='c
             shutil.copy(image_path, output_directory)
             print(f"已复制 {image_path} 到 {output_directory}")
 # ----------------- 示例使用 -----------------
-# 参考图像路径
-reference_image_path = 'path_to_reference_image.jpg'
-# 图像目录路径
-directory_path = 'path_to_image_directory'
-# 找到相似面孔
-similar_faces_data = find_and_compare_faces(reference_image_path, directory_path)
-# 打印所有面孔的详细相似度报告
-print("\n详细相似度报告（按相似度得分排序）:")
-for image_path, score in similar_faces_data:
-    print(f"图像: {image_path}, 相似度得分: {score}")
-# 如果需要，询问用户是否希望移动或复制这些相似图像
-if similar_faces_data:
-    action = input("\n您希望复制或移动这些图像吗？（copy/move）：").strip().lower()
-    # 确保用户输入正确的操作类型
-    if action in ['copy', 'move']:
-        output_directory = input("请输入输出目录路径：").strip()
-        move_or_copy_images_to_directory(similar_faces_data, output_directory, operation=action)
-    else:
-        print("无效操作。请重新运行脚本并选择 'copy' 或 'move'。")
+if __name__ == '__main__':
+    # 参考图像路径
+    reference_image_path = 'path_to_reference_image.jpg'
+    # 图像目录路径
+    directory_path = 'path_to_image_directory'
+    # 找到相似面孔
+    similar_faces_data = find_and_compare_faces(reference_image_path, directory_path)
+    # 打印所有面孔的详细相似度报告
+    print("\n详细相似度报告（按相似度得分排序）:")
+    for image_path, score in similar_faces_data:
+        print(f"图像: {image_path}, 相似度得分: {score}")
+    # 如果需要，询问用户是否希望移动或复制这些相似图像
+    if similar_faces_data:
+        action = input("\n您希望复制或移动这些图像吗？（copy/move）：").strip().lower()
+        # 确保用户输入正确的操作类型
+        if action in ['copy', 'move']:
+            output_directory = input("请输入输出目录路径：").strip()
+            move_or_copy_images_to_directory(similar_faces_data, output_directory, operation=action)
+        else:
+            print("无效操作。请重新运行脚本并选择 'copy' 或 'move'。")
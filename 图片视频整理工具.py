@@ -1,21 +1,21 @@
 import os
-import hashlib
 import shutil
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
+from organizer_core.hashing import cached_hash_file
+from organizer_core.linkdedup import replace_with_link
+from organizer_core.prune import prune_empty_dirs
 
 def calculate_file_hash(file_path):
-    """计算文件的SHA-256哈希值"""
-    hasher = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        buf = f.read()
-        hasher.update(buf)
-    return hasher.hexdigest()
-
-def remove_duplicate_files_and_move(directory, target_folder, file_extensions):
-    """删除目录中的重复文件并移动到指定文件夹"""
+    """分块计算文件哈希值（算法见 organizer_core.hashing），未变化的文件直接取缓存"""
+    return cached_hash_file(file_path)
+
+def remove_duplicate_files_and_move(directory, target_folder, file_extensions, link_duplicates=False):
+    """删除目录中的重复文件并移动到指定文件夹，返回移走或删除的文件路径；
+    link_duplicates 为 True 时重复文件不删除，而是逐字节确认后替换为指向已移动文件的硬链接"""
     file_hashes = {}
+    touched = []
     if not os.path.exists(target_folder):
         os.makedirs(target_folder)  # 创建目标文件夹，如果不存在
 
@@ -25,8 +25,16 @@ def remove_duplicate_files_and_move(directory, target_folder, file_extensions):
                 file_path = os.path.join(root, file)
                 file_hash = calculate_file_hash(file_path)
                 if file_hash in file_hashes:
+                    if link_duplicates:
+                        try:
+                            reclaimed = replace_with_link(file_hashes[file_hash], file_path, verify=True)
+                            print(f"替换为硬链接: {file_path}（释放 {(reclaimed or 0) / 1024 / 1024:.1f} MB）")
+                        except (OSError, ValueError) as e:
+                            print(f"无法替换 {file_path}: {e}")
+                        continue
                     print(f"删除重复文件: {file_path}")
                     os.remove(file_path)  # 删除重复文件
+                    touched.append(file_path)
                 else:
                     # 移动文件并处理重名
                     target_path = os.path.join(target_folder, file)
@@ -37,15 +45,14 @@ def remove_duplicate_files_and_move(directory, target_folder, file_extensions):
                         counter += 1
                     shutil.move(file_path, target_path)  # 移动文件到目标文件夹
                     file_hashes[file_hash] = target_path
+                    touched.append(file_path)
+    return touched
 
-def remove_empty_folders(directory):
-    """递归删除空文件夹"""
-    for root, dirs, _ in os.walk(directory, topdown=False):
-        for dir in dirs:
-            dir_path = os.path.join(root, dir)
-            if not os.listdir(dir_path):  # 如果文件夹为空
-                print(f"删除空文件夹: {dir_path}")
-                os.rmdir(dir_path)  # 删除空文件夹
+def remove_empty_folders(directory, touched=None):
+    """递归删除空文件夹（包括删除子文件夹后才变空的文件夹），每个文件夹只列一次；
+    touched 为本次移走/删除的文件路径时，只检查这些文件所在的文件夹及其上级"""
+    return prune_empty_dirs(directory, touched, on_removed=lambda path: print(f"删除空文件夹: {path}"),
+                            on_error=lambda path, e: print(f"无法删除文件夹 {path}: {e}"))
 
 def process_files(target_directory, video_target_directory, image_target_directory):
     """处理文件的主函数"""
@@ -55,17 +62,50 @@ def process_files(target_directory, video_target_directory, image_target_directo
     print("即将执行以下操作：")
     print(f"1. 从 {target_directory} 中删除重复的视频文件，并移动到 {video_target_directory}。")
     print(f"2. 从 {target_directory} 中删除重复的图片文件，并移动到 {image_target_directory}。")
-    print(f"3. 删除 {target_directory} 中的空文件夹。")
+    print(f"3. 删除 {target_directory} 中因此变空的文件夹。")
 
     confirm = messagebox.askyesno("确认操作", "您确认要执行这些操作吗？")
     if not confirm:
         return
+    link = messagebox.askyesno("重复文件", "是否把重复文件替换为硬链接而不是删除？（原路径保持有效）")
 
-    remove_duplicate_files_and_move(target_directory, video_target_directory, video_extensions)
-    remove_duplicate_files_and_move(target_directory, image_target_directory, image_extensions)
-    remove_empty_folders(target_directory)
+    touched = remove_duplicate_files_and_move(target_directory, video_target_directory, video_extensions, link)
+    touched += remove_duplicate_files_and_move(target_directory, image_target_directory, image_extensions, link)
+    remove_empty_folders(target_directory, touched)  # 只检查移走/删除的文件所在的文件夹及其上级
     messagebox.showinfo("完成", "文件处理完成！")  # 显示完成信息
 
+def report_similar_images(directory):
+    """列出目录中近似重复的图片（缩放、重新压缩过的副本），只输出到控制台，不改动文件；返回分组，缺少依赖或出错时返回 None"""
+    try:
+        from organizer_core.phash import find_similar_images  # 依赖 numpy 和 Pillow，用到时才导入
+    except ImportError as e:
+        print(f"查找相似图片需要安装 numpy 和 Pillow: {e}")
+        return None
+    try:
+        groups = find_similar_images([directory], update_text=print)
+    except Exception as e:
+        print(f"查找相似图片失败: {e}")
+        return None
+    for number, group in enumerate(groups, 1):
+        print(f"相似图片第 {number} 组:")
+        for path in group:
+            print(f"    {path}")
+    return groups
+
+def start_find_similar(root):
+    """启动查找相似图片的线程，完成后在界面线程中提示结果"""
+    directory = filedialog.askdirectory(title="选择要查找相似图片的目录")
+    if not directory:
+        return
+
+    def task():
+        groups = report_similar_images(directory)
+        message = "查找失败，详见控制台输出。" if groups is None else \
+            f"找到 {len(groups)} 组近似重复的图片，分组见控制台输出（未改动任何文件）。"
+        root.after(0, lambda: messagebox.showinfo("相似图片", message))
+
+    threading.Thread(target=task, daemon=True).start()
+
 def start_processing():
     """启动文件处理的线程"""
     target_directory = filedialog.askdirectory(title="选择目标目录")
@@ -87,7 +127,7 @@ def create_gui():
 
     # 设置窗口大小和位置
     window_width = 350
-    window_height = 180
+    window_height = 220
     screen_width = root.winfo_screenwidth()
     screen_height = root.winfo_screenheight()
     x_cordinate = int((screen_width/2) - (window_width/2))
@@ -105,6 +145,10 @@ def create_gui():
     exit_button = tk.Button(root, text="退出", command=root.quit, width=15)
     exit_button.grid(row=1, column=1, padx=10, pady=5)
 
+    # 只列出缩放、重新压缩过的近似副本，不删除也不移动
+    similar_button = tk.Button(root, text="查找相似图片", command=lambda: start_find_similar(root), width=15)
+    similar_button.grid(row=2, column=0, columnspan=2, pady=5)
+
     root.mainloop()  # 运行主循环
 
 if __name__ == "__main__":
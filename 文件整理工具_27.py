@@ -1,21 +1,19 @@
 import os  # 导入os模块，用于文件和目录操作
-import shutil  # 导入shutil模块，用于高级的文件操作
-from PIL import Image  # 导入PIL库中的Image模块，用于图像验证
 import tkinter as tk  # 导入tkinter用于GUI开发
 from tkinter import filedialog, messagebox  # 导入问路径选择和弹窗模块
 import threading  # 导入线程模块用于后台操作
+from organizer_core.imagecheck import ImageValidator, check_image  # 只读文件头/文件尾的图像校验，结果按 (inode, mtime) 缓存
+from organizer_core.fastcopy import MoveStats, copy_file, move_file  # 快速复制；同一文件系统内的移动只改目录项
+from organizer_core.naming import claim_path, release_claim, reset_name_indexes  # 不冲突的目标文件名
+from organizer_core.transfer import TransferJob, TransferScheduler  # 按 (源设备, 目标设备) 分组传输
 
-def is_valid_image(file_path):  # 定义函数验证图像文件
-    """检查文件是否为有效图像"""
-    try:
-        img = Image.open(file_path)  # 尝试打开图像
-        img.verify()  # 验证图像文件的有效性
-        return True  # 返回True表示有效
-    except (IOError, SyntaxError):  # 捕获IO和语法错误表示无效图像
-        return False  # 返回False表示无效
+def is_valid_image(file_path, deep=False):  # 定义函数验证图像文件
+    """检查文件是否为有效图像：只读文件头和文件尾，deep 为 True 时再用 PIL 完整校验"""
+    return check_image(file_path, deep)
 # --------------------------------------------
-def copy_or_move_file(source_path, target_dir, rename, action):  # 定义函数复制或移动文件
-    """复制或移动并重命名文件以避免重名，确保不覆盖和不破坏源文件"""
+def copy_or_move_file(source_path, target_dir, rename, action, move_stats=None, src_dev=None, errors=None):  # 定义函数复制或移动文件，成功返回 True
+    """复制或移动并重命名文件以避免重名，确保不覆盖和不破坏源文件；失败原因追加到 errors（在传输线程中调用，不能弹窗）"""
+    target_path = None
     try:
         base_name, ext = os.path.splitext(os.path.basename(source_path))  # 分离文件名和扩展名
         if not os.path.exists(target_dir):  # 检查目标目录是否存在
@@ -23,41 +21,115 @@ def copy_or_move_file(source_path, target_dir, rename, action):  # 定义函数
         
         if rename:  # 检查是否重命名文件
             base_name += f"_{os.path.basename(os.path.dirname(source_path))}"  # 添加前缀避免重名
-        target_path = os.path.join(target_dir, base_name + ext)  # 生成目标文件路径
-        i = 1  # 初始化计数器
-        while os.path.exists(target_path):  # 检查是否存在重名文件
-            target_path = os.path.join(target_dir, f"{base_name}_{i}{ext}")  # 更新重命名规则
-            i += 1  # 增加计数器用于下一个循环
+        target_path = claim_path(target_dir, base_name + ext)  # 认领目标文件名，重名时按 _1、_2 ... 编号
         if action == 'move':  # 检查操作是否为移动
-            shutil.move(source_path, target_path)  # 执行移动操作
+            move_file(source_path, target_path, claimed=True, stats=move_stats, src_dev=src_dev)  # 同一文件系统只 rename，跨设备复制+fsync 后删除
         elif action == 'copy':  # 检查操作是否为复制
-            shutil.copy2(source_path, target_path)  # 执行复制操作
+            copy_file(source_path, target_path)  # 执行复制操作
+        return True
     except PermissionError:  # 捕获权限错误
-        messagebox.showerror("权限错误", f"操作被拒绝：没有权限访问或修改 {source_path} 或目标 {target_dir}。")  # 显示错误信息
+        message = f"操作被拒绝：没有权限访问或修改 {source_path} 或目标 {target_dir}。"
     except Exception as e:  # 捕获其他异常
-        messagebox.showerror("错误", f"文件 {source_path} 处理失败：{e}")  # 显示错误信息
+        message = f"文件 {source_path} 处理失败：{e}"
+    if errors is not None:
+        errors.append(message)  # 由主线程统一显示
+    if target_path:
+        release_claim(target_path)  # 删除未写入内容的占位文件
+    return False
 # --------------------------------------------
-def process_media_files(source_dirs, target_dir, rename=False, action='move'):  # 定义批量处理功能
-    """处理图像和视频文件"""
+def process_media_files(source_dirs, target_dir, rename=False, action='move', deep_check=False):  # 定义批量处理功能
+    """处理图像和视频文件，返回 (结果摘要, 错误列表)"""
     image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')  # 支持的图像文件扩展名
     video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv')  # 支持的视频文件扩展名
-    for source_dir in source_dirs:  # 遍历源目录
-        for root, _, files in os.walk(source_dir):  # 遍历目录结构
-            for file_name in files:  # 遍历文件
-                source_path = os.path.join(root, file_name)  # 获取文件绝对路径
-                if file_name.lower().endswith(image_extensions):  # 检查是否为图像
-                    if is_valid_image(source_path):  # 验证图像文件
-                        copy_or_move_file(source_path, target_dir, rename, action)  # 移动或复制图像
-                elif file_name.lower().endswith(video_extensions):  # 检查是否为视频文件
-                    copy_or_move_file(source_path, target_dir, rename, action)  # 移动或复制视频
+    reset_name_indexes()  # 重新读取目标目录中的已有文件名
+    os.makedirs(target_dir, exist_ok=True)
+    jobs = []  # 待处理的文件
+    verdicts = {}  # 图像路径 -> 校验结果（Future），校验在进程池中与传输同时进行
+    invalid = []  # 校验未通过而跳过的图像
+    errors = []  # 传输失败的原因
+    with ImageValidator(deep=deep_check) as validator:
+        for source_dir in source_dirs:  # 遍历源目录
+            for dirpath, _, files in os.walk(source_dir):  # 遍历目录结构
+                for file_name in files:  # 遍历文件
+                    source_path = os.path.join(dirpath, file_name)  # 获取文件绝对路径
+                    is_image = file_name.lower().endswith(image_extensions)  # 检查是否为图像
+                    if not is_image and not file_name.lower().endswith(video_extensions):  # 既不是图像也不是视频
+                        continue
+                    try:
+                        st = os.stat(source_path)
+                    except OSError:
+                        continue
+                    if is_image:
+                        verdicts[source_path] = validator.submit(source_path, st)  # 提交校验，不等待结果
+                    jobs.append(TransferJob(source_path, target_dir, st.st_size, st.st_dev))
+
+        move_stats = MoveStats()
+
+        def transfer(job):  # 图像先等待自己的校验结果，无效时跳过
+            verdict = verdicts.get(job.src)
+            if verdict is not None and not verdict.result():
+                invalid.append(job.src)
+                return False
+            return copy_or_move_file(job.src, job.dest_dir, rename, action, move_stats, job.src_dev, errors)
+
+        # 按 (源设备, 目标设备) 分组：同一设备的移动只改目录项，跨设备的复制按设备限制并发
+        succeeded, failed, _ = TransferScheduler().run(jobs, transfer, action)
+    summary = f"处理完成：成功 {succeeded} 个，失败 {failed - len(invalid)} 个，跳过无效图像 {len(invalid)} 个。"
+    if action == 'move':
+        summary += "\n" + move_stats.summary()
+    return summary, errors
+# --------------------------------------------
+def show_result(summary, errors, limit=20):  # 在主线程中显示结果，错误只汇总显示一次
+    messagebox.showinfo("完成", summary)
+    if errors:
+        details = "\n".join(errors[:limit])
+        if len(errors) > limit:
+            details += f"\n……另有 {len(errors) - limit} 个错误"
+        messagebox.showerror("错误", details)
+
+def run_in_background(*args):  # 后台线程：处理完成后把结果交给主线程显示
+    summary, errors = process_media_files(*args)
+    root.after(0, show_result, summary, errors)
 # --------------------------------------------
 def start_processing():  # 定义开始处理的函数
     if not source_directories or not target_var.get() or action_var.get() not in ['move', 'copy']:  # 检查路径和操作选择是否有效
         messagebox.showwarning("警告", "请先选择源和目标目录，并选择移动或复制操作")  # 提示选择问题
         return
-    threading.Thread(target=process_media_files, args=(source_directories, target_var.get(), rename_var.get(), action_var.get())).start()  # 启动线程
+    threading.Thread(target=run_in_background, args=(source_directories, target_var.get(), rename_var.get(), action_var.get(), deep_var.get())).start()  # 启动线程
     messagebox.showinfo("信息", "文件处理已开始，请稍候...")  # 提示操作开始
 # --------------------------------------------
+def find_similar_task(source_dirs):  # 后台线程：查找近似重复的图片（缩放、重新压缩过的副本），只报告，不改动文件
+    try:
+        from organizer_core.phash import find_similar_images  # 依赖 numpy 和 Pillow，用到时才导入
+        groups = find_similar_images(source_dirs)
+    except ImportError as e:
+        root.after(0, messagebox.showerror, "错误", f"查找相似图片需要安装 numpy 和 Pillow：{e}")
+        return
+    except Exception as e:
+        root.after(0, messagebox.showerror, "错误", f"查找相似图片失败：{e}")
+        return
+    root.after(0, show_similar, groups)
+
+def show_similar(groups):  # 在主线程中用新窗口列出相似图片分组
+    window = tk.Toplevel(root)
+    window.title(f"相似图片：{len(groups)} 组")
+    text = tk.Text(window, width=100, height=30)
+    scrollbar = tk.Scrollbar(window, command=text.yview)
+    text.config(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    text.pack(fill=tk.BOTH, expand=True)
+    if not groups:
+        text.insert(tk.END, "没有找到近似重复的图片。\n")
+    for number, group in enumerate(groups, 1):
+        text.insert(tk.END, f"相似图片第 {number} 组:\n" + "".join(f"    {path}\n" for path in group))
+    text.config(state=tk.DISABLED)
+
+def start_find_similar():  # 在源目录中查找相似图片
+    if not source_directories:
+        messagebox.showwarning("警告", "请先添加源目录")
+        return
+    threading.Thread(target=find_similar_task, args=(list(source_directories),), daemon=True).start()
+# --------------------------------------------
 def select_source_directory():  # 函数选择源目录
     directories = filedialog.askdirectory(title="选择源目录", mustexist=True)  # 打开目录选择对话框
     if directories:  # 检查是否选择了目录
@@ -70,34 +142,41 @@ def select_target_directory():  # 函数选择目标目录
     if directory:  # 检查是否选择了目录
         target_var.set(directory)  # 更新目标路径变量
 # --------------------------------------------
-root = tk.Tk()  # 创建主窗口
-root.title("媒体文件管理器")  # 设置窗口标题
-root.geometry("600x400")  # 定义窗口大小
-root.resizable(False, False)  # 固定窗口大小
-font = ("Arial", 10)  # 定义字体样式
+if __name__ == '__main__':  # 校验进程池的子进程（spawn）会重新导入本文件，此时不创建窗口
+    root = tk.Tk()  # 创建主窗口
+    root.title("媒体文件管理器")  # 设置窗口标题
+    root.geometry("600x400")  # 定义窗口大小
+    root.resizable(False, False)  # 固定窗口大小
+    font = ("Arial", 10)  # 定义字体样式
 
-source_directories = []  # 初始化资源目录列表
-source_frame = tk.LabelFrame(root, text="源目录", padx=10, pady=10, font=font)  # 创建源目录框架
-source_frame.pack(pady=10, padx=10, fill="both", expand=True)  # 添加框架到窗口
-tk.Button(source_frame, text="添加源目录", command=select_source_directory, font=font).pack(pady=5)  # 创建并添加按钮
-source_listbox = tk.Listbox(source_frame, width=80, height=10, font=font)  # 创建列表框
-source_listbox.pack(padx=10, pady=5)  # 添加列表框到框架
+    source_directories = []  # 初始化资源目录列表
+    source_frame = tk.LabelFrame(root, text="源目录", padx=10, pady=10, font=font)  # 创建源目录框架
+    source_frame.pack(pady=10, padx=10, fill="both", expand=True)  # 添加框架到窗口
+    tk.Button(source_frame, text="添加源目录", command=select_source_directory, font=font).pack(pady=5)  # 创建并添加按钮
+    source_listbox = tk.Listbox(source_frame, width=80, height=10, font=font)  # 创建列表框
+    source_listbox.pack(padx=10, pady=5)  # 添加列表框到框架
 
-target_frame = tk.LabelFrame(root, text="目标目录", padx=10, pady=10, font=font)  # 创建目标目录框架
-target_frame.pack(pady=10, padx=10, fill="both")  # 添加框架到窗口
-tk.Entry(target_frame, textvariable=tk.StringVar(), width=60, font=font).pack(side=tk.LEFT, padx=5)  # 创建输入框
-tk.Button(target_frame, text="选择目标目录", command=select_target_directory, font=font).pack(side=tk.LEFT)  # 创建并添加按钮
+    target_frame = tk.LabelFrame(root, text="目标目录", padx=10, pady=10, font=font)  # 创建目标目录框架
+    target_frame.pack(pady=10, padx=10, fill="both")  # 添加框架到窗口
+    tk.Entry(target_frame, textvariable=tk.StringVar(), width=60, font=font).pack(side=tk.LEFT, padx=5)  # 创建输入框
+    tk.Button(target_frame, text="选择目标目录", command=select_target_directory, font=font).pack(side=tk.LEFT)  # 创建并添加按钮
 
-options_frame = tk.Frame(root)  # 创建选项框架
-options_frame.pack(pady=10, padx=10)  # 添加框架到窗口
-rename_var = tk.BooleanVar(value=False)  # 定义复选框变量
-tk.Checkbutton(options_frame, text="重命名以避免冲突", variable=rename_var, font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加复选框
+    options_frame = tk.Frame(root)  # 创建选项框架
+    options_frame.pack(pady=10, padx=10)  # 添加框架到窗口
+    rename_var = tk.BooleanVar(value=False)  # 定义复选框变量
+    tk.Checkbutton(options_frame, text="重命名以避免冲突", variable=rename_var, font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加复选框
+    deep_var = tk.BooleanVar(value=False)  # 是否用 PIL 完整校验图像
+    tk.Checkbutton(options_frame, text="完整校验图像（较慢）", variable=deep_var, font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加复选框
 
-action_var = tk.StringVar(value='move')  # 定义操作变量
-tk.Radiobutton(options_frame, text="移动文件", variable=action_var, value='move', font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加单选按钮
-tk.Radiobutton(options_frame, text="复制文件", variable=action_var, value='copy', font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加单选按钮
+    action_var = tk.StringVar(value='move')  # 定义操作变量
+    tk.Radiobutton(options_frame, text="移动文件", variable=action_var, value='move', font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加单选按钮
+    tk.Radiobutton(options_frame, text="复制文件", variable=action_var, value='copy', font=font).pack(side=tk.LEFT, padx=5)  # 创建并添加单选按钮
 
-run_button = tk.Button(root, text="执行操作", command=start_processing, font=font, bg="green", fg="white")  # 创建执行按钮
-run_button.pack(pady=20)  # 添加按钮到窗口
+    buttons_frame = tk.Frame(root)  # 按钮框架
+    buttons_frame.pack(pady=20)
+    run_button = tk.Button(buttons_frame, text="执行操作", command=start_processing, font=font, bg="green", fg="white")  # 创建执行按钮
+    run_button.pack(side=tk.LEFT, padx=5)  # 添加按钮到窗口
+    similar_button = tk.Button(buttons_frame, text="查找相似图片", command=start_find_similar, font=font)  # 只列出近似副本，不改动文件
+    similar_button.pack(side=tk.LEFT, padx=5)
 
-root.mainloop()  # 启动主循环
+    root.mainloop()  # 启动主循环
@@ -1,135 +1,34 @@
-import os
-import shutil
-import stat
 import threading
-import hashlib
-from collections import defaultdict
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+from organizer_core.categories import classify
+from organizer_core.engine import OrganizerEngine
+from organizer_core.logsink import attach_tk
 
-# -------------------- 文件类型定义 --------------------
-file_types = {  # 定义文件类型分类
-    'office': ['.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.pdf'],  # 办公文件格式
-    'libreoffice': ['.odt', '.ods', '.odp', '.odg'],  # LibreOffice 文件格式
-    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'],  # 图像文件格式
-    'video': ['.mp4', '.avi', '.mov', '.mkv', '.flv'],  # 视频文件格式
-    'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma'],  # 音频文件格式
-    'text': ['.txt', '.json'],  # 文本文件格式
-}
+# 界面只负责选择目录、确认和显示日志，扫描/去重/传输都由 organizer_core.engine 完成
+# （同样的流程可在命令行运行: python -m organizer_core.engine organize SRC --target DEST）
 
 # -------------------- 文件分类函数 --------------------
-def categorize_file(file_name):  # 根据扩展名归类文件
-    ext = os.path.splitext(file_name)[1].lower()  # 获取文件扩展名并转为小写
-    for category, extensions in file_types.items():  # 遍历各分类
-        if ext in extensions:  # 判断文件扩展名是否在当前分类中
-            return category  # 返回文件类别
-    return None  # 如果文件类型不在分类中，返回 None
-
-# -------------------- 收集文件函数 --------------------
-def gather_files(source_dir):  # 收集文件并分类
-    file_count = defaultdict(int)  # 文件计数字典
-    files_to_move = defaultdict(list)  # 文件路径字典
-
-    for root, dirs, files in os.walk(source_dir):  # 遍历源目录中的文件
-        for file in files:
-            category = categorize_file(file)  # 获取文件类别
-            if category:  # 如果文件属于指定类别
-                file_count[category] += 1  # 更新文件计数
-                files_to_move[category].append(os.path.join(root, file))  # 保存文件路径
-
-    return file_count, files_to_move  # 返回文件计数和文件列表
-
-# -------------------- 调整权限函数 --------------------
-def adjust_permissions(path):  # 调整文件权限
-    for root, dirs, files in os.walk(path):  # 遍历路径中的文件和目录
-        all_entities = dirs + files  # 获取所有目录和文件
-        for momo in all_entities:
-            try:
-                full_path = os.path.join(root, momo)  # 获取完整路径
-                os.chmod(full_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR |  # 修改文件权限
-                         stat.S_IRGRP | stat.S_IWGRP | stat.S_IXGRP |
-                         stat.S_IROTH | stat.S_IWOTH | stat.S_IXOTH)
-            except Exception as e:
-                print(f"无法调整 {full_path} 的权限: {e}")  # 出现异常时输出错误信息
-
-# -------------------- 计算文件哈希 --------------------
-def calculate_file_hash(filepath, hash_alg=hashlib.md5):  # 计算文件的哈希值
-    h = hash_alg()  # 初始化哈希对象
-    with open(filepath, 'rb') as file:  # 以二进制方式打开文件
-        while True:
-            chunk = file.read(8192)  # 每次读取8192字节
-            if not chunk:
-                break  # 如果读取完毕，则退出
-            h.update(chunk)  # 更新哈希值
-    return h.hexdigest()  # 返回计算出的哈希值
+def categorize_file(file_name):  # 根据扩展名归类文件，扩展名表见 organizer_core/categories.json 的 organizer 方案
+    return classify(file_name, 'organizer')  # 如果文件类型不在分类中，返回 None
 
 # -------------------- 查找重复文件 --------------------
-def find_duplicate_files(directory, update_text):  # 查找重复文件
-    files_hashmap = {}  # 哈希值字典
-    for root, _, files in os.walk(directory):  # 遍历目录
-        for filename in files:
-            filepath = os.path.join(root, filename)  # 获取文件路径
-            file_hash = calculate_file_hash(filepath)  # 计算文件哈希
-            if file_hash not in files_hashmap:
-                files_hashmap[file_hash] = []  # 初始化哈希值对应的文件路径列表
-            files_hashmap[file_hash].append(filepath)  # 添加文件路径到哈希值对应的列表
-
-    duplicates = {}  # 重复文件字典
-    for hash_val, paths in files_hashmap.items():  # 遍历哈希字典
-        if len(paths) > 1:  # 如果某个哈希值对应多个文件，说明是重复文件
-            duplicates[hash_val] = paths  # 保存重复文件的路径
-
-    return duplicates  # 返回重复文件字典
+def find_duplicate_files(directory, update_text):  # 查找重复文件：大小 -> 头尾哈希 -> 完整哈希 逐级筛选
+    engine = OrganizerEngine(classify=categorize_file, update_text=update_text)  # 多线程计算哈希，进度输出到文本框
+    return engine.find_duplicates(engine.scan([directory]))  # 返回重复文件字典 {哈希: [路径, ...]}
 
 # -------------------- 删除重复文件 --------------------
-def delete_duplicate_files(duplicates, update_text):  # 删除重复文件
-    deleted_count = 0  # 删除文件计数
-    for file_list in duplicates.values():  # 遍历重复文件字典
-        for filepath in file_list[1:]:  # 保留第一个文件，删除其余文件
-            os.remove(filepath)  # 删除文件
-            update_text(f"删除重复文件: {filepath}")  # 更新文本框显示删除信息
-            deleted_count += 1  # 增加删除计数
-    return deleted_count  # 返回删除的文件数量
+def delete_duplicate_files(duplicates, update_text):  # 删除重复文件（每组保留第一个），返回删除的文件数量
+    return OrganizerEngine(classify=categorize_file, update_text=update_text).delete_duplicates(duplicates)
 
-# -------------------- 处理文件 --------------------
-def process_file(src, dest_dir, operation, update_text):  # 处理文件：移动或复制
-    try:
-        base_name = os.path.basename(src)  # 获取文件名
-        name, ext = os.path.splitext(base_name)  # 获取文件名和扩展名
-        dest = os.path.join(dest_dir, base_name)  # 目标路径
-        counter = 1
-        while os.path.exists(dest):  # 如果目标路径已存在，则修改文件名
-            dest = os.path.join(dest_dir, f"{name}_{counter}{ext}")
-            counter += 1
-        
-        if operation == 'move':  # 移动文件
-            shutil.move(src, dest)
-            update_text(f"移动文件: {src} 到 {dest}")  # 更新文本框显示信息
-        elif operation == 'copy':  # 复制文件
-            shutil.copy2(src, dest)
-            update_text(f"复制文件: {src} 到 {dest}")  # 更新文本框显示信息
+def link_duplicate_files(duplicates, update_text):  # 重复文件替换为指向保留文件的硬链接（路径保留），替换前逐字节比较
+    return OrganizerEngine(classify=categorize_file, update_text=update_text).link_duplicates(duplicates, verify=True)
 
-    except Exception as e:
-        error_message = f"处理文件 {src} 时出错: {e}"  # 错误处理
-        update_text(error_message)  # 更新文本框显示错误信息
-
-def process_files(source_dir, target_dir, operation, update_text):  # 处理多个文件
+# -------------------- 处理文件 --------------------
+def process_files(plan, update_text):  # 执行用户确认过的计划，不再重新扫描
     try:
-        adjust_permissions(source_dir)  # 调整源目录权限
-
-        file_count, files_to_move = gather_files(source_dir)  # 获取文件分类信息
-        update_text("以下是要操作的文件清单：")  # 显示操作文件列表
-
-        for category, count in file_count.items():  # 遍历文件计数
-            update_text(f"{category}: {count} files")  # 显示文件类别和数量
-        
-        for category, files in files_to_move.items():  # 遍历每个类别的文件
-            dest_dir = os.path.join(target_dir, category)  # 目标目录
-            if not os.path.exists(dest_dir):  # 如果目标目录不存在，则创建
-                os.makedirs(dest_dir)
-            for file in files:  # 处理每个文件
-                process_file(file, dest_dir, operation, update_text)  # 调用处理文件函数
-
+        engine = OrganizerEngine(classify=categorize_file, update_text=update_text)
+        engine.execute(plan, fix_permissions=True)  # 确认之后才调整源文件权限，再按类别并行移动/复制到目标目录
         update_text("文件操作完成。")  # 完成操作后显示信息
     
     except Exception as e:
@@ -151,6 +50,12 @@ def handle_duplicates(directory, update_text):  # 处理重复文件
             for filepath in file_list:
                 update_text(f" - {filepath}")  # 显示每个重复文件路径
 
+        # 先询问是否用硬链接代替删除：所有路径仍然有效，空间同样释放
+        if messagebox.askyesno("替换为硬链接", f"是否把 {total_duplicates} 个重复文件替换为指向保留文件的硬链接？\n"
+                                             f"（所有路径保持有效；选择“否”则询问是否删除）"):
+            link_duplicate_files(duplicates, update_text)  # 结果汇总（替换数量、释放空间）会输出到文本框
+            return
+
         confirm = messagebox.askyesno("确认删除", f"确认要删除 {total_duplicates} 个重复文件吗？")  # 询问是否删除
         if confirm:  # 如果用户确认删除
             deleted_count = delete_duplicate_files(duplicates, update_text)  # 删除重复文件
@@ -170,6 +75,7 @@ class FileOrganizerApp:
         
         self.file_operate_tab = ttk.Frame(self.tab_control)  # 创建文件操作选项卡
         self.duplicate_tab = ttk.Frame(self.tab_control)  # 创建重复文件查找选项卡
+        self.log_sinks = {}  # 文本框 -> 日志出口
         
         self.setup_file_operate_tab(self.file_operate_tab)  # 设置文件操作选项卡界面
         self.setup_duplicate_tab(self.duplicate_tab)  # 设置重复文件查找选项卡界面
@@ -184,6 +90,7 @@ class FileOrganizerApp:
 
         self.text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.text_edit] = attach_tk(self.text_edit)  # 定时批量刷新，只保留最近的若干行
 
         dir_frame = ttk.Frame(tab)  # 创建目录选择框架
         dir_frame.pack(fill=tk.X, pady=5)
@@ -211,6 +118,7 @@ class FileOrganizerApp:
 
         self.dup_text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.dup_text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.dup_text_edit] = attach_tk(self.dup_text_edit)
 
         self.duplicate_directory = ''  # 初始化目录
         btn_select_directory = ttk.Button(tab, text='选择目录', command=self.select_duplicate_directory)  # 选择目录按钮
@@ -236,9 +144,8 @@ class FileOrganizerApp:
             if isinstance(widget, ttk.Label):  # 如果是标签组件
                 widget.config(text=text)  # 更新标签文本
 
-    def update_text(self, widget, message):  # 更新文本框
-        widget.insert(tk.END, message + '\n')  # 在文本框末尾添加新信息
-        widget.see(tk.END)  # 滚动到文本框的最后
+    def update_text(self, widget, message):  # 更新文本框（可在工作线程中调用）
+        self.log_sinks[widget].write(message)  # 放入队列，由界面线程批量插入文本框末尾并滚动到最后
 
     def start_operation(self):  # 开始文件操作
         if not self.source_directory or not self.target_directory:  # 如果源目录或目标目录为空
@@ -246,14 +153,26 @@ class FileOrganizerApp:
             return
 
         operation = self.operation_var.get()  # 获取操作类型
-        file_count, _ = gather_files(self.source_directory)  # 获取文件分类信息
-        file_summary = "\n".join([f"{category}: {count} files" for category, count in file_count.items()])  # 构造文件清单
+        self.update_text(self.text_edit, "正在扫描源目录，生成文件清单...")
+        threading.Thread(target=self.build_plan, args=(operation,)).start()  # 扫描大目录树时界面不卡住
+
+    def build_plan(self, operation):  # 工作线程：只扫描不传输、不改权限，完成后交给界面线程确认
+        try:
+            # 按计划统计各类别的文件数、字节数和目标磁盘需要的空间
+            engine = OrganizerEngine(classify=categorize_file)
+            plan = engine.plan([self.source_directory], self.target_directory, operation)
+            file_summary = plan.describe(engine.space)  # 与执行时相同的剩余空间要求
+        except Exception as e:
+            self.update_text(self.text_edit, f"生成文件清单时出错: {e}")
+            return
+        self.root.after(0, self.confirm_plan, plan, file_summary, operation)
 
+    def confirm_plan(self, plan, file_summary, operation):  # 界面线程：确认后才执行（并调整权限）
         confirm = messagebox.askyesno("确认操作", f"以下是要{operation}的文件清单：\n{file_summary}\n确定要继续吗？")  # 弹出确认框
         if confirm:  # 如果用户确认
             threading.Thread(
                 target=process_files,  # 启动一个线程来执行文件处理
-                args=(self.source_directory, self.target_directory, operation, lambda msg: self.update_text(self.text_edit, msg))
+                args=(plan, lambda msg: self.update_text(self.text_edit, msg))  # 执行确认过的计划
             ).start()  # 启动线程
 
     def start_duplicate_search(self):  # 开始查找重复文件
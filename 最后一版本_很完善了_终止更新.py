@@ -1,28 +1,19 @@
 import os
-import shutil
 import stat
 import threading
-import hashlib
 from collections import defaultdict
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-# -------------------- 文件类型定义 --------------------
-file_types = {  # 定义文件类型分类
-    'office': ['.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.pdf'],  # 办公文件格式
-    'libreoffice': ['.odt', '.ods', '.odp', '.odg'],  # LibreOffice 文件格式
-    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'],  # 图像文件格式
-    'video': ['.mp4', '.avi', '.mov', '.mkv', '.flv'],  # 视频文件格式
-    'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma'],  # 音频文件格式
-    'text': ['.txt', '.json'],  # 文本文件格式
-}
-
+from organizer_core.categories import classify
+from organizer_core.fastcopy import MoveStats, copy_file, move_file
+from organizer_core.hashing import cached_hash_file
+from organizer_core.logsink import attach_tk
+from organizer_core.naming import claim_path, release_claim, reset_name_indexes
+from organizer_core.parallel_hash import HashEngine
+from organizer_core.transfer import TransferJob, TransferScheduler
 # -------------------- 文件分类函数 --------------------
-def categorize_file(file_name):  # 根据扩展名归类文件
-    ext = os.path.splitext(file_name)[1].lower()  # 获取文件扩展名并转为小写
-    for category, extensions in file_types.items():  # 遍历各分类
-        if ext in extensions:  # 判断文件扩展名是否在当前分类中
-            return category  # 返回文件类别
-    return None  # 如果文件类型不在分类中，返回 None
+def categorize_file(file_name):  # 根据扩展名归类文件，扩展名表见 organizer_core/categories.json 的 organizer 方案
+    return classify(file_name, 'organizer')  # 如果文件类型不在分类中，返回 None
 # -------------------- 收集文件函数 --------------------
 def gather_files(source_dir):  # 收集文件并分类
     file_count = defaultdict(int)  # 文件计数字典
@@ -48,25 +39,13 @@ def adjust_permissions(path):  # 调整文件权限
             except Exception as e:
                 print(f"无法调整 {full_path} 的权限: {e}")  # 出现异常时输出错误信息
 # -------------------- 计算文件哈希 --------------------
-def calculate_file_hash(filepath, hash_alg=hashlib.md5):  # 计算文件的哈希值
-    h = hash_alg()  # 初始化哈希对象
-    with open(filepath, 'rb') as file:  # 以二进制方式打开文件
-        while True:
-            chunk = file.read(8192)  # 每次读取8192字节
-            if not chunk:
-                break  # 如果读取完毕，则退出
-            h.update(chunk)  # 更新哈希值
-    return h.hexdigest()  # 返回计算出的哈希值
+def calculate_file_hash(filepath, algorithm=None):  # 计算文件的哈希值（算法见 organizer_core.hashing），未变化的文件直接取缓存
+    return cached_hash_file(filepath, algorithm)  # 返回计算出的哈希值
 # -------------------- 查找重复文件 --------------------
 def find_duplicate_files(directory, update_text):  # 查找重复文件
-    files_hashmap = {}  # 哈希值字典
-    for root, _, files in os.walk(directory):  # 遍历目录
-        for filename in files:
-            filepath = os.path.join(root, filename)  # 获取文件路径
-            file_hash = calculate_file_hash(filepath)  # 计算文件哈希
-            if file_hash not in files_hashmap:
-                files_hashmap[file_hash] = []  # 初始化哈希值对应的文件路径列表
-            files_hashmap[file_hash].append(filepath)  # 添加文件路径到哈希值对应的列表
+    filepaths = [os.path.join(root, filename) for root, _, files in os.walk(directory) for filename in files]  # 获取所有文件路径
+    engine = HashEngine(update_text=update_text)  # 多线程计算文件哈希，进度输出到文本框
+    files_hashmap = engine.group(calculate_file_hash, filepaths, total=len(filepaths))  # 哈希值 -> 文件路径列表
 
     duplicates = {}  # 重复文件字典
     for hash_val, paths in files_hashmap.items():  # 遍历哈希字典
@@ -83,29 +62,29 @@ def delete_duplicate_files(duplicates, update_text):  # 删除重复文件
             deleted_count += 1  # 增加删除计数
     return deleted_count  # 返回删除的文件数量
 # -------------------- 处理文件 --------------------
-def process_file(src, dest_dir, operation, update_text):  # 处理文件：移动或复制
+def process_file(src, dest_dir, operation, update_text, move_stats=None, src_dev=None):  # 处理文件：移动或复制，成功返回 True
+    dest = None
     try:
-        base_name = os.path.basename(src)  # 获取文件名
-        name, ext = os.path.splitext(base_name)  # 获取文件名和扩展名
-        dest = os.path.join(dest_dir, base_name)  # 目标路径
-        counter = 1
-        while os.path.exists(dest):  # 如果目标路径已存在，则修改文件名
-            dest = os.path.join(dest_dir, f"{name}_{counter}{ext}")
-            counter += 1
-        
-        if operation == 'move':  # 移动文件
-            shutil.move(src, dest)
+        dest = claim_path(dest_dir, os.path.basename(src))  # 认领不冲突的目标文件名（重名时自动加 _1、_2 ...）
+
+        if operation == 'move':  # 移动文件：同一文件系统只 rename（不覆盖已有文件），跨设备复制+fsync 后删除
+            move_file(src, dest, claimed=True, stats=move_stats, src_dev=src_dev)
             update_text(f"移动文件: {src} 到 {dest}")  # 更新文本框显示信息
-        elif operation == 'copy':  # 复制文件
-            shutil.copy2(src, dest)
+        elif operation == 'copy':  # 复制文件：优先 reflink / copy_file_range，内核内完成
+            copy_file(src, dest)
             update_text(f"复制文件: {src} 到 {dest}")  # 更新文本框显示信息
+        return True
 
     except Exception as e:
+        if dest:
+            release_claim(dest)  # 删除未写入内容的占位文件
         error_message = f"处理文件 {src} 时出错: {e}"  # 错误处理
         update_text(error_message)  # 更新文本框显示错误信息
+        return False
 
 def process_files(source_dir, target_dir, operation, update_text):  # 处理多个文件
     try:
+        reset_name_indexes()  # 重新读取目标目录中的已有文件名
         adjust_permissions(source_dir)  # 调整源目录权限
 
         file_count, files_to_move = gather_files(source_dir)  # 获取文件分类信息
@@ -114,14 +93,27 @@ def process_files(source_dir, target_dir, operation, update_text):  # 处理多
         for category, count in file_count.items():  # 遍历文件计数
             update_text(f"{category}: {count} files")  # 显示文件类别和数量
         
+        jobs = []
         for category, files in files_to_move.items():  # 遍历每个类别的文件
             dest_dir = os.path.join(target_dir, category)  # 目标目录
             if not os.path.exists(dest_dir):  # 如果目标目录不存在，则创建
                 os.makedirs(dest_dir)
-            for file in files:  # 处理每个文件
-                process_file(file, dest_dir, operation, update_text)  # 调用处理文件函数
-
-        update_text("文件操作完成。")  # 完成操作后显示信息
+            for file in files:
+                try:
+                    st = os.stat(file)
+                except OSError as e:
+                    update_text(f"无法访问 {file}: {e}")
+                    continue
+                jobs.append(TransferJob(file, dest_dir, st.st_size, st.st_dev))
+
+        # 按 (源设备, 目标设备) 分组：同一设备的移动只改目录项，跨设备的复制按设备限制并发
+        move_stats = MoveStats() if operation == 'move' else None
+        succeeded, failed, _ = TransferScheduler(update_text=update_text).run(
+            jobs, lambda job: process_file(job.src, job.dest_dir, operation, update_text, move_stats, job.src_dev),
+            operation)
+        if move_stats:
+            update_text(move_stats.summary())
+        update_text(f"文件操作完成：成功 {succeeded} 个，失败 {failed} 个。")  # 完成操作后显示信息
     
     except Exception as e:
         error_message = f"文件操作过程中出错: {e}"  # 错误处理
@@ -161,6 +153,7 @@ class FileOrganizerApp:
         
         self.file_operate_tab = ttk.Frame(self.tab_control)  # 创建文件操作选项卡
         self.duplicate_tab = ttk.Frame(self.tab_control)  # 创建重复文件查找选项卡
+        self.log_sinks = {}  # 文本框 -> 日志出口
         
         self.setup_file_operate_tab(self.file_operate_tab)  # 设置文件操作选项卡界面
         self.setup_duplicate_tab(self.duplicate_tab)  # 设置重复文件查找选项卡界面
@@ -175,6 +168,7 @@ class FileOrganizerApp:
 
         self.text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.text_edit] = attach_tk(self.text_edit)  # 传输线程池中的多个线程都会写日志，由界面线程批量刷新
 
         dir_frame = ttk.Frame(tab)  # 创建目录选择框架
         dir_frame.pack(fill=tk.X, pady=5)
@@ -202,6 +196,7 @@ class FileOrganizerApp:
 
         self.dup_text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.dup_text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.dup_text_edit] = attach_tk(self.dup_text_edit)
 
         self.duplicate_directory = ''  # 初始化目录
         btn_select_directory = ttk.Button(tab, text='选择目录', command=self.select_duplicate_directory)  # 选择目录按钮
@@ -227,9 +222,8 @@ class FileOrganizerApp:
             if isinstance(widget, ttk.Label):  # 如果是标签组件
                 widget.config(text=text)  # 更新标签文本
 
-    def update_text(self, widget, message):  # 更新文本框
-        widget.insert(tk.END, message + '\n')  # 在文本框末尾添加新信息
-        widget.see(tk.END)  # 滚动到文本框的最后
+    def update_text(self, widget, message):  # 更新文本框（可在工作线程中调用）
+        self.log_sinks[widget].write(message)  # 放入队列，由界面线程批量插入文本框末尾并滚动到最后
 
     def start_operation(self):  # 开始文件操作
         if not self.source_directory or not self.target_directory:  # 如果源目录或目标目录为空
@@ -1,137 +1,50 @@
-import os
-import shutil
-import stat
 import threading
-import hashlib
-from collections import defaultdict
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+from organizer_core.categories import classify
+from organizer_core.async_pipeline import AsyncPipeline
+from organizer_core.engine import OrganizerEngine
+from organizer_core.logsink import attach_tk
+from organizer_core.space import SpaceManager
 
-# -------------------- 文件类型定义 --------------------
-file_types = {  # 定义文件类型分类
-    'office': ['.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.pdf'],  # 办公文件格式
-    'libreoffice': ['.odt', '.ods', '.odp', '.odg'],  # LibreOffice 文件格式
-    'image': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'],  # 图像文件格式
-    'video': ['.mp4', '.avi', '.mov', '.mkv', '.flv'],  # 视频文件格式
-    'audio': ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma'],  # 音频文件格式
-    'text': ['.txt', '.json'],  # 文本文件格式
-}
+# 界面只负责选择目录、确认和显示日志，扫描/去重/传输都由 organizer_core.engine 完成
+MIN_FREE_BYTES = 500 * 1024 * 1024  # 目标磁盘在文件大小之外至少保留 500MB
+SPACE = SpaceManager(MIN_FREE_BYTES)  # 所有操作共用，每个磁盘只定期 statvfs，逐个文件的检查在内存中完成
 
 # -------------------- 文件分类函数 --------------------
-def categorize_file(file_name):  # 根据扩展名归类文件
-    ext = os.path.splitext(file_name)[1].lower()  # 获取文件扩展名并转为小写
-    for category, extensions in file_types.items():  # 遍历各分类
-        if ext in extensions:  # 判断文件扩展名是否在当前分类中
-            return category  # 返回文件类别
-    return None  # 如果文件类型不在分类中，返回 None
-# -------------------- 收集文件函数 --------------------
-def gather_files(source_dir):  # 收集文件并分类
-    file_count = defaultdict(int)  # 文件计数字典
-    files_to_move = defaultdict(list)  # 文件路径字典
-    for root, dirs, files in os.walk(source_dir):  # 遍历源目录中的文件
-        for file in files:
-            category = categorize_file(file)  # 获取文件类别
-            if category:  # 如果文件属于指定类别
-                file_count[category] += 1  # 更新文件计数
-                files_to_move[category].append(os.path.join(root, file))  # 保存文件路径
-    return file_count, files_to_move  # 返回文件计数和文件列表
-# -------------------- 调整权限函数 --------------------
-def adjust_permissions(path):  # 调整文件权限
-    for root, dirs, files in os.walk(path):  # 遍历路径中的文件和目录
-        all_entities = dirs + files  # 获取所有目录和文件
-        for momo in all_entities:
-            try:
-                full_path = os.path.join(root, momo)  # 获取完整路径
-                os.chmod(full_path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR |  # 修改文件权限
-                         stat.S_IRGRP | stat.S_IWGRP | stat.S_IXGRP |
-                         stat.S_IROTH | stat.S_IWOTH | stat.S_IXOTH)
-            except Exception as e:
-                print(f"无法调整 {full_path} 的权限: {e}")  # 出现异常时输出错误信息
-# -------------------- 计算文件哈希 --------------------
-def calculate_file_hash(filepath, hash_alg=hashlib.md5):  # 计算文件的哈希值
-    h = hash_alg()  # 初始化哈希对象
-    with open(filepath, 'rb') as file:  # 以二进制方式打开文件
-        while True:
-            chunk = file.read(8192)  # 每次读取8192字节
-            if not chunk:
-                break  # 如果读取完毕，则退出
-            h.update(chunk)  # 更新哈希值
-    return h.hexdigest()  # 返回计算出的哈希值
+def categorize_file(file_name):  # 根据扩展名归类文件，扩展名表见 organizer_core/categories.json 的 organizer 方案
+    return classify(file_name, 'organizer')  # 如果文件类型不在分类中，返回 None
+def make_engine(update_text):  # 本工具使用的整理引擎：organizer 分类方案，传输前检查剩余空间
+    return OrganizerEngine(classify=categorize_file, update_text=update_text, space=SPACE)
 # -------------------- 查找重复文件 --------------------
-def find_duplicate_files(directory, update_text):  # 查找重复文件
-    files_hashmap = {}  # 哈希值字典
-    for root, _, files in os.walk(directory):  # 遍历目录
-        for filename in files:
-            filepath = os.path.join(root, filename)  # 获取文件路径
-            file_hash = calculate_file_hash(filepath)  # 计算文件哈希
-            if file_hash not in files_hashmap:
-                files_hashmap[file_hash] = []  # 初始化哈希值对应的文件路径列表
-            files_hashmap[file_hash].append(filepath)  # 添加文件路径到哈希值对应的列表
-
-    duplicates = {}  # 重复文件字典
-    for hash_val, paths in files_hashmap.items():  # 遍历哈希字典
-        if len(paths) > 1:  # 如果某个哈希值对应多个文件，说明是重复文件
-            duplicates[hash_val] = paths  # 保存重复文件的路径
-    return duplicates  # 返回重复文件字典
+def find_duplicate_files(directory, update_text):  # 查找重复文件，返回 {哈希: [路径, ...]}
+    engine = make_engine(update_text)  # 多线程计算文件哈希，进度输出到文本框
+    return engine.find_duplicates(engine.scan([directory]))
 # -------------------- 删除重复文件 --------------------
-def delete_selected_files(files_to_delete, update_text):  # 删除选择的重复文件
-    deleted_count = 0  # 删除文件计数
-    for filepath in files_to_delete:  # 遍历要删除的文件列表
-        os.remove(filepath)  # 删除文件
-        update_text(f"删除重复文件: {filepath}")  # 更新文本框显示删除信息
-        deleted_count += 1  # 增加删除计数
-    return deleted_count  # 返回删除的文件数量
+def delete_selected_files(files_to_delete, update_text):  # 删除选择的重复文件，返回删除的文件数量
+    return make_engine(update_text).delete_files(files_to_delete)
+def link_selected_files(files_to_link, canonical_of, update_text):  # 把选择的重复文件替换为指向保留文件的硬链接，返回 LinkStats
+    duplicates = {}
+    for path in files_to_link:
+        duplicates.setdefault(canonical_of[path], [canonical_of[path]]).append(path)
+    return make_engine(update_text).link_duplicates(duplicates, verify=True)  # 替换前逐字节比较
 # -------------------- 处理文件 --------------------
-def check_disk_space(dest_dir, file_size):  # 检查目标目录剩余空间
-    total, used, free = shutil.disk_usage(dest_dir)  # 获取磁盘使用情况
-    # 判断剩余空间是否至少大于文件大小+500MB
-    return free >= (file_size + 500 * 1024 * 1024)  # 500MB = 500 * 1024 * 1024 字节
-
-def process_file(src, dest_dir, operation, update_text):  # 处理文件：移动或复制
+def process_files(plan, update_text):  # 执行用户确认过的计划，不再重新扫描
     try:
-        base_name = os.path.basename(src)  # 获取文件名
-        name, ext = os.path.splitext(base_name)  # 获取文件名和扩展名
-        dest = os.path.join(dest_dir, base_name)  # 目标路径
-        counter = 1
-        while os.path.exists(dest):  # 如果目标路径已存在，则修改文件名
-            dest = os.path.join(dest_dir, f"{name}_{counter}{ext}")
-            counter += 1
-        
-        file_size = os.path.getsize(src)  # 获取文件大小
-        
-        if not check_disk_space(dest_dir, file_size):  # 检查剩余空间
-            update_text(f"目标目录 {dest_dir} 剩余空间不足，无法处理文件: {src}")
-            return  # 如果空间不足，则停止处理文件
-        
-        if operation == 'move':  # 移动文件
-            shutil.move(src, dest)
-            update_text(f"移动文件: {src} 到 {dest}")  # 更新文本框显示信息
-        elif operation == 'copy':  # 复制文件
-            shutil.copy2(src, dest)
-            update_text(f"复制文件: {src} 到 {dest}")  # 更新文本框显示信息
-
+        # 确认之后才调整源文件权限，再按类别并行复制/移动，每个磁盘的并发数单独限制
+        make_engine(update_text).execute(plan, fix_permissions=True)
+        update_text("文件操作完成。")  # 完成操作后显示信息
+    
     except Exception as e:
-        error_message = f"处理文件 {src} 时出错: {e}"  # 错误处理
+        error_message = f"文件操作过程中出错: {e}"  # 错误处理
         update_text(error_message)  # 更新文本框显示错误信息
 
-def process_files(source_dirs, target_dir, operation, update_text):  # 处理多个文件
+def process_files_async(source_dirs, target_dir, operation, update_text):  # 网络盘：不预先扫描，边列目录边传输
     try:
         for source_dir in source_dirs:
-            adjust_permissions(source_dir)  # 调整源目录权限
-
-            file_count, files_to_move = gather_files(source_dir)  # 获取文件分类信息
-            update_text(f"正在处理 {source_dir} 中的文件...")  # 显示操作文件列表
-
-            for category, count in file_count.items():  # 遍历文件计数
-                update_text(f"{category}: {count} files")  # 显示文件类别和数量
-            
-            for category, files in files_to_move.items():  # 遍历每个类别的文件
-                dest_dir = os.path.join(target_dir, category)  # 目标目录
-                if not os.path.exists(dest_dir):  # 如果目标目录不存在，则创建
-                    os.makedirs(dest_dir)
-                for file in files:  # 处理每个文件
-                    process_file(file, dest_dir, operation, update_text)  # 调用处理文件函数
-
+            update_text(f"正在处理 {source_dir} 中的文件...")
+        # 列目录、stat、传输同时进行，大量元数据操作并发等待
+        AsyncPipeline(make_engine(update_text)).run(source_dirs, target_dir, operation, fix_permissions=True)
         update_text("文件操作完成。")  # 完成操作后显示信息
     
     except Exception as e:
@@ -149,6 +62,7 @@ def handle_duplicates(directory, update_text):  # 处理重复文件
 
         files_to_delete = []  # 要删除的文件列表
         checkboxes = {}  # 存储复选框对象
+        canonical_of = {}  # 重复文件 -> 同组中保留的文件
 
         # 在窗口中添加复选框
         for hash_val, file_list in duplicates.items():
@@ -157,6 +71,7 @@ def handle_duplicates(directory, update_text):  # 处理重复文件
                 checkbox = ttk.Checkbutton(delete_window, text=filepath, variable=var)  # 创建复选框
                 checkbox.pack(anchor=tk.W)
                 checkboxes[filepath] = var  # 将文件路径与复选框变量关联
+                canonical_of[filepath] = file_list[0]
 
         # 添加全选按钮
         select_all_state = [False]  # 用列表存储状态，避免在回调函数中修改局部变量
@@ -180,6 +95,15 @@ def handle_duplicates(directory, update_text):  # 处理重复文件
         delete_button = ttk.Button(delete_window, text="删除选中文件", command=delete_files)  # 删除按钮
         delete_button.pack(pady=5)
 
+        def link_files():
+            files_to_link = [filepath for filepath, var in checkboxes.items() if var.get()]  # 获取已选中的文件路径
+            link_selected_files(files_to_link, canonical_of, update_text)  # 汇总（释放的空间）输出到文本框
+            delete_window.destroy()
+
+        # 添加硬链接按钮：不删除路径，只释放重复数据占用的空间
+        link_button = ttk.Button(delete_window, text="替换为硬链接（保留路径）", command=link_files)
+        link_button.pack(pady=5)
+
     else:
         update_text("没有找到重复文件。")  # 如果没有找到重复文件，显示提示信息
 
@@ -194,6 +118,7 @@ class FileOrganizerApp:
         
         self.file_operate_tab = ttk.Frame(self.tab_control)  # 创建文件操作选项卡
         self.duplicate_tab = ttk.Frame(self.tab_control)  # 创建重复文件查找选项卡
+        self.log_sinks = {}  # 文本框 -> 日志出口
         
         self.setup_file_operate_tab(self.file_operate_tab)  # 设置文件操作选项卡界面
         self.setup_duplicate_tab(self.duplicate_tab)  # 设置重复文件查找选项卡界面
@@ -208,6 +133,7 @@ class FileOrganizerApp:
 
         self.text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.text_edit] = attach_tk(self.text_edit)  # 定时批量刷新，只保留最近的若干行
 
         dir_frame = ttk.Frame(tab)  # 创建目录选择框架
         dir_frame.pack(fill=tk.X, pady=5)
@@ -226,6 +152,10 @@ class FileOrganizerApp:
         radio_move.pack(anchor=tk.W)
         radio_copy.pack(anchor=tk.W)
 
+        self.async_var = tk.BooleanVar(value=False)  # 网络盘（NFS/SMB）模式
+        check_async = ttk.Checkbutton(tab, text='网络盘模式（异步流水线）', variable=self.async_var)
+        check_async.pack(anchor=tk.W)
+
         btn_start = ttk.Button(tab, text='开始', command=self.start_operation)  # 开始操作按钮
         btn_start.pack(pady=10)
 
@@ -235,6 +165,7 @@ class FileOrganizerApp:
 
         self.dup_text_edit = tk.Text(tab, height=20)  # 创建文本框显示信息
         self.dup_text_edit.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.log_sinks[self.dup_text_edit] = attach_tk(self.dup_text_edit)
 
         self.duplicate_directory = ''  # 初始化目录
         btn_select_directory = ttk.Button(tab, text='选择目录', command=self.select_duplicate_directory)  # 选择目录按钮
@@ -262,9 +193,8 @@ class FileOrganizerApp:
             if isinstance(widget, ttk.Label):  # 如果是标签组件
                 widget.config(text=text)  # 更新标签文本
 
-    def update_text(self, widget, message):  # 更新文本框
-        widget.insert(tk.END, message + '\n')  # 在文本框末尾添加新信息
-        widget.see(tk.END)  # 滚动到文本框的最后
+    def update_text(self, widget, message):  # 更新文本框（可在工作线程中调用）
+        self.log_sinks[widget].write(message)  # 放入队列，由界面线程批量插入文本框末尾并滚动到最后
 
     def start_operation(self):  # 开始文件操作
         if not self.source_directory or not self.target_directory:  # 如果源目录或目标目录为空
@@ -272,14 +202,32 @@ class FileOrganizerApp:
             return
 
         operation = self.operation_var.get()  # 获取操作类型
-        file_count, _ = gather_files(self.source_directory[0])  # 获取文件分类信息
-        file_summary = "\n".join([f"{category}: {count} files" for category, count in file_count.items()])  # 构造文件清单
+        update_text = lambda msg: self.update_text(self.text_edit, msg)
+        if self.async_var.get():  # 网络盘模式边扫描边传输，预先扫描一遍正是它要避免的
+            if messagebox.askyesno("确认操作", f"网络盘模式不预先统计文件清单，将边扫描边{operation}。\n确定要继续吗？"):
+                threading.Thread(target=process_files_async,
+                                 args=(self.source_directory, self.target_directory, operation, update_text)).start()
+            return
+
+        update_text("正在扫描源目录，生成文件清单...")
+        threading.Thread(target=self.build_plan, args=(operation, update_text)).start()  # 扫描大目录树时界面不卡住
+
+    def build_plan(self, operation, update_text):  # 工作线程：只扫描不传输、不改权限，完成后交给界面线程确认
+        try:
+            # 按计划统计各类别的文件数、字节数和目标磁盘需要的空间
+            plan = make_engine(None).plan(self.source_directory, self.target_directory, operation)
+            file_summary = plan.describe(SPACE)  # 与执行时相同的 SpaceManager，计入 500MB 的保留空间
+        except Exception as e:
+            update_text(f"生成文件清单时出错: {e}")
+            return
+        self.root.after(0, self.confirm_plan, plan, file_summary, operation, update_text)
 
+    def confirm_plan(self, plan, file_summary, operation, update_text):  # 界面线程：确认后才执行（并调整权限）
         confirm = messagebox.askyesno("确认操作", f"以下是要{operation}的文件清单：\n{file_summary}\n确定要继续吗？")  # 弹出确认框
         if confirm:  # 如果用户确认
             threading.Thread(
-                target=process_files,  # 启动一个线程来执行文件处理
-                args=(self.source_directory, self.target_directory, operation, lambda msg: self.update_text(self.text_edit, msg))
+                target=process_files,  # 启动一个线程执行确认过的计划
+                args=(plan, update_text)
             ).start()  # 启动线程
 
     def start_duplicate_search(self):  # 开始查找重复文件
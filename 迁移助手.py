@@ -2,29 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import os
-import shutil
 import random
 import string
 import threading
 import datetime
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
+from organizer_core.categories import get_extension_map
+from organizer_core.fastcopy import MoveStats, copy_file, move_file
+from organizer_core.logsink import attach_tk
 # -----------------------------
-# 媒体分类字典
-# 根据文件扩展名判断文件类型
-MEDIA_CATEGORIES = {
-    'Music': {'mp3', 'wav', 'aac', 'flac', 'ogg', 'm4a', 'wma'},
-    'Videos': {'mp4', 'mkv', 'avi', 'mov', 'wmv', 'flv', 'webm'},
-    'Pictures': {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'svg', 'heic'}
-}
+# 媒体分类表（扩展名 -> 类别），见 organizer_core/categories.json 的 media 方案
+MEDIA_EXTENSION_MAP = get_extension_map('media')
 # -----------------------------
 # 根据扩展名返回归属分类，找不到返回 None
 def get_category_by_extension(ext):
-    ext = ext.lower().lstrip('.')  # 去除前导点，转小写
-    for category, ext_set in MEDIA_CATEGORIES.items():
-        if ext in ext_set:
-            return category
-    return None
+    return MEDIA_EXTENSION_MAP.get('.' + ext.lower().lstrip('.'))  # 统一成带点的小写形式再查表
 # -----------------------------
 # 生成随机字符串,默认6位，字母+数字
 def random_string(length=6):
@@ -45,12 +38,13 @@ def safe_copy_file(src_path, dest_folder):
         rand_str = random_string()
         candidate = os.path.join(dest_folder, f"{name}_{rand_str}{ext}")
 
-    shutil.copy2(src_path, candidate)  # 复制文件，包括元数据
+    copy_file(src_path, candidate)  # 复制文件，包括元数据（优先 reflink / copy_file_range）
     return candidate
 
 # -----------------------------
 # 移动文件到目标文件夹，自动避免重名（尾部加入随机串）
-def safe_move_file(src_path, dest_folder):
+# 同一文件系统内只改目录项；目标名的检查和移动是原子的，不会覆盖同时出现的同名文件
+def safe_move_file(src_path, dest_folder, stats=None):
     os.makedirs(dest_folder, exist_ok=True)
 
     filename = os.path.basename(src_path)
@@ -58,12 +52,12 @@ def safe_move_file(src_path, dest_folder):
 
     candidate = os.path.join(dest_folder, filename)
 
-    while os.path.exists(candidate):
-        rand_str = random_string()
-        candidate = os.path.join(dest_folder, f"{name}_{rand_str}{ext}")
-
-    shutil.move(src_path, candidate)
-    return candidate
+    while True:
+        try:
+            return move_file(src_path, candidate, stats=stats)
+        except FileExistsError:
+            rand_str = random_string()
+            candidate = os.path.join(dest_folder, f"{name}_{rand_str}{ext}")
 
 # -----------------------------
 # 主应用窗口类，封装UI及功能逻辑
@@ -81,9 +75,6 @@ class MediaOrganizerApp:
         # 操作模式变量，copy 或 move，默认复制
         self.operation_mode = tk.StringVar(value='copy')
 
-        # 用于存储日志信息，用于写入文件
-        self.log_lines = []
-
         # --- 新增：创建菜单栏并添加“关于”菜单 ---
         self.create_menu()
 
@@ -156,6 +147,8 @@ class MediaOrganizerApp:
         # --- 进度日志滚动文本框 ---
         self.txt_log = scrolledtext.ScrolledText(frm, height=25, state='disabled', wrap=tk.WORD)
         self.txt_log.pack(fill=tk.BOTH, expand=True)
+        # 日志出口：定时批量刷新到文本框（只保留最近的若干行），整理期间同时写入日志文件
+        self.log_sink = attach_tk(self.txt_log)
 
         # --- 状态栏 ---
         self.status_var = tk.StringVar(value="")
@@ -179,16 +172,9 @@ class MediaOrganizerApp:
 
     # ---------------------------------
     # 线程安全日志记录方法
-    # 通过 root.after 把UI更新放入主线程调用
+    # 消息放入队列，由主线程定时批量插入文本框
     def threadsafe_log(self, msg):
-        def append():
-            self.txt_log.configure(state='normal')
-            self.txt_log.insert(tk.END, msg + '\n')
-            self.txt_log.see(tk.END)
-            self.txt_log.configure(state='disabled')
-
-            self.log_lines.append(msg)  # 同步保存日志行
-        self.root.after(0, append)
+        self.log_sink.write(msg)
 
     # ---------------------------------
     # 点击“开始整理”按钮时触发，先弹确认
@@ -226,14 +212,22 @@ class MediaOrganizerApp:
         self.txt_log.configure(state='normal')
         self.txt_log.delete(1.0, tk.END)
         self.txt_log.configure(state='disabled')
-        self.log_lines = []  # 清空内部日志缓存
+
+        # 日志边整理边写入目标目录中的文件，不在内存中保存
+        log_filename = f"media_organizer_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        log_path = os.path.join(dst, log_filename)
+        try:
+            self.log_sink.open_file(log_path)
+        except OSError as e:
+            log_path = None
+            self.threadsafe_log(f"无法创建日志文件: {e}")
 
         # 使用线程执行整理流程，避免阻塞主线程（UI）
-        threading.Thread(target=self.organize_media_files, args=(src, dst, op), daemon=True).start()
+        threading.Thread(target=self.organize_media_files, args=(src, dst, op, log_path), daemon=True).start()
 
     # ---------------------------------
     # 实际执行整理的线程函数
-    def organize_media_files(self, src_dir, dst_dir, mode):
+    def organize_media_files(self, src_dir, dst_dir, mode, log_path=None):
         self.threadsafe_log(f"开始整理，源目录: {src_dir}")
         self.threadsafe_log(f"目标目录: {dst_dir}")
         self.threadsafe_log(f"操作方式: {'复制' if mode=='copy' else '移动'}")
@@ -244,6 +238,7 @@ class MediaOrganizerApp:
         except Exception as e:
             self.threadsafe_log(f"无法访问源目录: {e}")
             self.status_var.set("整理失败")
+            self.log_sink.close_file()
             self.enable_start_button()
             return
 
@@ -259,10 +254,12 @@ class MediaOrganizerApp:
         if total_files == 0:
             self.threadsafe_log("源目录无可处理的媒体文件。")
             self.status_var.set("完成，无文件整理")
+            self.log_sink.close_file()
             self.enable_start_button()
             return
 
         # 遍历文件开始处理
+        move_stats = MoveStats()
         for entry in entries:
             if entry.is_file():
                 ext = os.path.splitext(entry.name)[1].lower()
@@ -274,7 +271,7 @@ class MediaOrganizerApp:
                             new_path = safe_copy_file(entry.path, dest_folder)
                             action = '复制'
                         else:
-                            new_path = safe_move_file(entry.path, dest_folder)
+                            new_path = safe_move_file(entry.path, dest_folder, move_stats)
                             action = '移动'
                         self.threadsafe_log(f"{action}文件: {entry.name} -> {category}/ (新名: {os.path.basename(new_path)})")
                         processed_files += 1
@@ -286,17 +283,17 @@ class MediaOrganizerApp:
                 continue
 
         self.threadsafe_log(f"整理完成。共处理 {processed_files}/{total_files} 个媒体文件。")
+        if mode != 'copy':
+            self.threadsafe_log(move_stats.summary())
 
         # -------------------
-        # 保存日志文件，方便后续查看
-        try:
-            log_filename = f"media_organizer_log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-            log_path = os.path.join(dst_dir, log_filename)
-            with open(log_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(self.log_lines))
+        # 关闭日志文件，方便后续查看
+        if log_path:
             self.threadsafe_log(f"日志已保存至: {log_path}")
-        except Exception as e:
-            self.threadsafe_log(f"日志保存失败: {e}")
+            try:
+                self.log_sink.close_file()
+            except Exception as e:
+                self.threadsafe_log(f"日志保存失败: {e}")
 
         # 更新状态，启用按钮，弹窗提示完成
         self.status_var.set("整理完成")